@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Arquivo binário compacto de puzzles, lido por mmap com acesso aleatório.
+
+Formato (little-endian):
+
+    cabeçalho   b'SLKA' + versão (uint32)
+    registros   um por puzzle, de tamanho fixo para cada tamanho de tabuleiro:
+                  lin, col (uint16), dificuldade (uint8),
+                  dicas   -- 3 bits por célula (valor+1, 0 = sem dica),
+                  solução -- 1 bit por aresta (ids do Solver)
+    índice      offset (uint64) de cada registro
+    rodapé      b'SLKI' + offset do índice (uint64) + nº de registros (uint64)
+
+Um puzzle 15x15 ocupa 132 bytes (mais 8 do índice): um milhão cabe em
+~140 MB. O leitor mapeia o arquivo e decodifica só o registro pedido; abrir
+é ler o rodapé e enxergar o índice direto no mapa, sem copiar nada.
+
+Gravar acrescenta registros no lugar do índice antigo e reescreve índice e
+rodapé no fim. Se o processo morre no meio, o rodapé fica inválido e a
+próxima gravação (ou leitura) reconstrói o índice varrendo os registros,
+que carregam o próprio tamanho.
+"""
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+import gerador as ger
+import main as sl
+import solver as sv
+
+
+_MAGICO = b'SLKA'
+_VERSAO = 1
+_CABECALHO = struct.Struct('<4sI')
+_RODAPE = struct.Struct('<4sQQ')
+_REGISTRO = struct.Struct('<HHB')
+
+_DIFICULDADES = (None, 'facil', 'medio', 'dificil', 'nenhuma')
+_CODIGO = {d: i for i, d in enumerate(_DIFICULDADES)}
+
+
+def tamanho_registro(lin, col):
+    """Bytes de um registro lin x col (sem a entrada do índice)."""
+    return (_REGISTRO.size + (3*(lin-1)*(col-1) + 7) // 8
+            + (sv.topologia(lin, col).nE + 7) // 8)
+
+
+# =============================================================================
+# Codificação de um registro
+# =============================================================================
+def codifica(lin, col, puzzle, solucao, dificuldade=None):
+    """
+    Registro binário de um puzzle.
+
+    Parameters
+    ----------
+    lin, col : int
+        Tamanho do tabuleiro (em vértices).
+    puzzle : array
+        Matriz (lin-1)x(col-1) de dicas, -1 nas células sem dica.
+    solucao : iterável
+        Ids das arestas do laço (formato de solver.arestas_do_tabuleiro).
+    dificuldade : str, optional
+        'facil', 'medio', 'dificil', 'nenhuma' ou None.
+    """
+    x = (np.ravel(puzzle) + 1).astype(np.uint8)
+    bits_dicas = (x[:, None] >> np.arange(3, dtype=np.uint8)) & 1
+    bits_sol = np.zeros(sv.topologia(lin, col).nE, dtype=np.uint8)
+    bits_sol[list(solucao)] = 1
+    return (_REGISTRO.pack(lin, col, _CODIGO[dificuldade])
+            + np.packbits(bits_dicas.ravel(), bitorder='little').tobytes()
+            + np.packbits(bits_sol, bitorder='little').tobytes())
+
+
+def decodifica(buf, offset=0):
+    """
+    Inverso de codifica: dict com lin, col, dificuldade, dicas (matriz com
+    -1 nas células sem dica) e solucao (frozenset de ids de aresta). `buf`
+    pode ser o mapa inteiro; só os bytes do registro em `offset` são lidos.
+    """
+    lin, col, cod = _REGISTRO.unpack_from(buf, offset)
+    n = (lin-1)*(col-1)
+    nE = sv.topologia(lin, col).nE
+    ini = offset + _REGISTRO.size
+    nd = (3*n + 7) // 8
+    bits = np.unpackbits(np.frombuffer(buf, np.uint8, nd, ini)
+                         ,count=3*n, bitorder='little').reshape(n, 3)
+    dicas = (bits @ np.array([1, 2, 4])).reshape(lin-1, col-1) - 1
+    sol = np.unpackbits(np.frombuffer(buf, np.uint8, (nE + 7) // 8, ini + nd)
+                        ,count=nE, bitorder='little')
+    return {'lin': lin
+            ,'col': col
+            ,'dificuldade': _DIFICULDADES[cod]
+            ,'dicas': dicas
+            ,'solucao': frozenset(np.flatnonzero(sol).tolist())}
+
+
+def de_gera_puzzle(tabuleiro, puzzle, dificuldade):
+    """Registro binário da saída [tabuleiro, puzzle, dificuldade] do
+    gera_Puzzle."""
+    return codifica(tabuleiro.lin, tabuleiro.col, puzzle
+                    ,sv.arestas_do_tabuleiro(tabuleiro), dificuldade)
+
+
+def para_gera_puzzle(registro):
+    """
+    Reconstrói a saída do gera_Puzzle a partir de um registro decodificado
+    (ver decodifica): [tabuleiro, puzzle, dificuldade], com o laço aplicado
+    no tabuleiro e tabuleiro.dicas com o mapa completo.
+    """
+    lin, col = registro['lin'], registro['col']
+    tabuleiro = sl.Tabuleiro(lin, col)
+    h, v = sv.planos_de_solucao(lin, col, registro['solucao'])
+    ger._monta_caminho_de_planos(tabuleiro, h, v)
+    tabuleiro.preenche_dicas()
+    return [tabuleiro, registro['dicas'], registro['dificuldade']]
+
+
+# =============================================================================
+# Índice
+# =============================================================================
+def _le_indice(buf):
+    """Offsets dos registros: do rodapé, se válido, senão varrendo o
+    arquivo. Devolve (offsets, fim dos registros)."""
+    tam = len(buf)
+    if tam >= _CABECALHO.size + _RODAPE.size:
+        magico, ini, n = _RODAPE.unpack_from(buf, tam - _RODAPE.size)
+        if magico == b'SLKI' and ini + 8*n + _RODAPE.size == tam:
+            return np.frombuffer(buf, '<u8', n, ini), ini
+    # Rodapé inválido (gravação interrompida): varre os registros
+    offsets = []
+    pos = _CABECALHO.size
+    while pos + _REGISTRO.size <= tam:
+        lin, col, cod = _REGISTRO.unpack_from(buf, pos)
+        if lin < 2 or col < 2 or cod >= len(_DIFICULDADES):
+            break
+        fim = pos + tamanho_registro(lin, col)
+        if fim > tam:
+            break
+        offsets.append(pos)
+        pos = fim
+    return np.array(offsets, dtype='<u8'), pos
+
+
+def grava_puzzles(caminho, puzzles):
+    """
+    Acrescenta puzzles ao arquivo (criado se não existe).
+
+    Parameters
+    ----------
+    caminho : str
+        Arquivo do acervo.
+    puzzles : iterável
+        Saídas [tabuleiro, puzzle, dificuldade] do gera_Puzzle, ou dicts
+        com lin, col, dicas, solucao e dificuldade (formato de
+        lote.le_lote, banco.BancoPuzzles.sorteia e decodifica).
+
+    Returns
+    -------
+    Número total de puzzles no arquivo.
+    """
+    if not os.path.exists(caminho) or os.path.getsize(caminho) == 0:
+        with open(caminho, 'wb') as f:
+            f.write(_CABECALHO.pack(_MAGICO, _VERSAO))
+    with open(caminho, 'r+b') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            if _CABECALHO.unpack_from(mapa)[0] != _MAGICO:
+                raise ValueError('{} não é um arquivo de puzzles'
+                                 .format(caminho))
+            offsets, pos = _le_indice(mapa)
+            offsets = offsets.tolist()
+        f.seek(pos)
+        f.truncate()
+        for p in puzzles:
+            if isinstance(p, dict):
+                reg = codifica(p['lin'], p['col'], p['dicas'], p['solucao']
+                               ,p['dificuldade'])
+            else:
+                reg = de_gera_puzzle(*p)
+            offsets.append(pos)
+            f.write(reg)
+            pos += len(reg)
+        f.write(np.array(offsets, dtype='<u8').tobytes())
+        f.write(_RODAPE.pack(b'SLKI', pos, len(offsets)))
+    return len(offsets)
+
+
+# =============================================================================
+# Leitura
+# =============================================================================
+class ArquivoPuzzles:
+    """
+    Leitor de um arquivo de puzzles por mmap: len(arq) puzzles, arq[i]
+    decodifica só o i-ésimo (dict de decodifica) e arq.gera_puzzle(i)
+    devolve-o no formato do gera_Puzzle.
+
+    Parameters
+    ----------
+    caminho : str
+        Arquivo escrito por grava_puzzles.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, 'rb') as f:
+            self._mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if _CABECALHO.unpack_from(self._mapa)[0] != _MAGICO:
+            self._mapa.close()
+            raise ValueError('{} não é um arquivo de puzzles'.format(caminho))
+        self.offsets, _ = _le_indice(self._mapa)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fecha()
+
+    def fecha(self):
+        # O índice é uma visão do mapa: solta-a antes de fechar
+        self.offsets = None
+        self._mapa.close()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        if not -len(self) <= i < len(self):
+            raise IndexError('puzzle {} fora do arquivo ({} puzzles)'
+                             .format(i, len(self)))
+        return decodifica(self._mapa, int(self.offsets[i]))
+
+    def gera_puzzle(self, i):
+        """O i-ésimo puzzle como [tabuleiro, puzzle, dificuldade]."""
+        return para_gera_puzzle(self[i])
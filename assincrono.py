@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+API asyncio para gerar e resolver puzzles sem travar o laço de eventos.
+
+gera_puzzle_async e conta_solucoes_async rodam gera_Puzzle e
+Solver.conta_solucoes num pool de processos (ExecutorAssincrono) e
+aguardam o resultado. Cada tarefa ocupa um slot de um array em memória
+compartilhada: a marca de cancelamento, escrita pelo processo principal,
+e o progresso da tarefa (os campos de solver.Progresso), escrito pelo
+trabalhador.
+
+Cancelar a tarefa asyncio (task.cancel(), asyncio.wait_for, ...) liga a
+marca; o trabalhador a confere pelo solver.Controle da tarefa (a cada
+troca de fase, a cada chamada do oráculo, a cada Controle.intervalo nós da
+busca e durante o CP-SAT) e larga o trabalho com solver.Cancelado -- o
+processo fica livre para a próxima tarefa sem esperar a geração terminar.
+
+Exemplo::
+
+    async def serve():
+        puzzle = await gera_puzzle_async(lin=15, col=15, dificuldade='medio'
+                                         ,ao_progresso=print)
+"""
+
+import asyncio
+import concurrent.futures
+import inspect
+import multiprocessing
+import os
+import threading
+
+import gerador as ger
+import solver as sv
+
+
+# =============================================================================
+# Lado do trabalhador
+# =============================================================================
+# Campos de um slot: cancela, fase, dicas, chamadas, nos, decorrido (ms)
+_CAMPOS = 6
+_FASES = (None, 'tabuleiro', 'mapa', 'adicao', 'minimizacao', 'binaria')
+_CODIGO_FASE = {f: i for i, f in enumerate(_FASES)}
+
+_estado = None           # RawArray com _CAMPOS inteiros por slot
+
+
+def _inicia_trabalhador(estado):
+    global _estado
+    _estado = estado
+
+
+class _ControleDoSlot(sv.Controle):
+    """Controle de uma tarefa no trabalhador: o cancelamento é lido do
+    slot e o progresso é escrito nele."""
+
+    def __init__(self, slot):
+        super().__init__(ao_progresso=self._publica)
+        self._i = _CAMPOS*slot
+
+    def interrompido(self):
+        if _estado[self._i]:
+            self.cancelado = True
+        return super().interrompido()
+
+    def _publica(self, p):
+        _estado[self._i + 1:self._i + _CAMPOS] = [
+            _CODIGO_FASE[p.fase], -1 if p.dicas is None else p.dicas
+            ,p.chamadas, p.nos, int(p.decorrido*1000)]
+
+
+def _progresso(campos):
+    fase, dicas, chamadas, nos, ms = campos
+    return sv.Progresso(_FASES[fase], None if dicas < 0 else dicas
+                        ,chamadas, nos, ms / 1000)
+
+
+def _gera(slot, kwargs):
+    return ger.gera_Puzzle(controle=_ControleDoSlot(slot), **kwargs)
+
+
+def _conta(slot, lin, col, dicas, limite, max_nos):
+    s = sv.Solver(lin, col, dicas, max_nos=max_nos
+                  ,controle=_ControleDoSlot(slot))
+    n, solucoes = s.conta_solucoes(limite)
+    return n, solucoes, s.completa
+
+
+# =============================================================================
+# Lado asyncio
+# =============================================================================
+class ExecutorAssincrono:
+    """
+    Pool de processos para as chamadas assíncronas.
+
+    Parameters
+    ----------
+    processos : int, optional
+        Processos trabalhadores. Padrão os.cpu_count()
+    n_slots : int, optional
+        Tarefas aceitas ao mesmo tempo (rodando ou na fila do pool); as
+        seguintes esperam um slot. Padrão 4*processos
+    intervalo : float, optional
+        Segundos entre as leituras do progresso enquanto uma tarefa roda.
+        Padrão 0.05
+    """
+
+    def __init__(self, processos=None, n_slots=None, intervalo=0.05):
+        processos = processos or os.cpu_count() or 1
+        n_slots = n_slots or 4*processos
+        self.intervalo = intervalo
+        self._estado = multiprocessing.RawArray('q', _CAMPOS*n_slots)
+        self._livres = list(range(n_slots))
+        self._trava = threading.Lock()
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            processos, initializer=_inicia_trabalhador
+            ,initargs=(self._estado,))
+
+    def fecha(self):
+        """Cancela as tarefas em andamento e encerra o pool."""
+        for i in range(0, len(self._estado), _CAMPOS):
+            self._estado[i] = 1
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    async def _reserva(self):
+        while True:
+            with self._trava:
+                if self._livres:
+                    return self._livres.pop()
+            await asyncio.sleep(self.intervalo)
+
+    def _libera(self, slot):
+        with self._trava:
+            self._livres.append(slot)
+
+    async def _executa(self, ao_progresso, funcao, *args):
+        slot = await self._reserva()
+        i = _CAMPOS*slot
+        self._estado[i:i + _CAMPOS] = visto = [0, 0, -1, 0, 0, 0]
+        try:
+            futuro = self._pool.submit(funcao, slot, *args)
+        except BaseException:
+            self._libera(slot)
+            raise
+        # O slot só volta para a fila quando o trabalhador larga a tarefa
+        futuro.add_done_callback(lambda f: self._libera(slot))
+        espera = asyncio.wrap_future(futuro)
+        try:
+            while True:
+                await asyncio.wait({espera}, timeout=self.intervalo)
+                atual = self._estado[i:i + _CAMPOS]
+                if ao_progresso is not None and atual != visto:
+                    visto = atual
+                    r = ao_progresso(_progresso(atual[1:]))
+                    if inspect.isawaitable(r):
+                        await r
+                if espera.done():
+                    return espera.result()
+        except BaseException:
+            # Cancelada (ou o callback falhou): o trabalhador para na
+            # próxima conferência do Controle
+            self._estado[i] = 1
+            espera.cancel()
+            raise
+
+    async def gera_puzzle(self, ao_progresso=None, **kwargs):
+        """Ver gera_puzzle_async."""
+        return await self._executa(ao_progresso, _gera, kwargs)
+
+    async def conta_solucoes(self, lin, col, dicas, limite=2, max_nos=60000,
+                             ao_progresso=None):
+        """Ver conta_solucoes_async."""
+        return await self._executa(ao_progresso, _conta, lin, col, dicas
+                                   ,limite, max_nos)
+
+
+_padrao = None
+
+
+def executor_padrao():
+    """ExecutorAssincrono compartilhado pelas funções do módulo (criado na
+    primeira chamada)."""
+    global _padrao
+    if _padrao is None:
+        _padrao = ExecutorAssincrono()
+    return _padrao
+
+
+async def gera_puzzle_async(ao_progresso=None, executor=None, **kwargs):
+    """
+    gera_Puzzle num processo trabalhador, sem bloquear o laço de eventos.
+
+    Parameters
+    ----------
+    ao_progresso : callable, optional
+        Chamada (ou corrotina) com um solver.Progresso (fase, dicas,
+        chamadas, nos, decorrido) sempre que o progresso muda. Padrão None
+    executor : ExecutorAssincrono, optional
+        Pool a usar. Padrão None (executor_padrao())
+    **kwargs :
+        Parâmetros do gera_Puzzle (lin, col, dificuldade, seed, ...).
+
+    Returns
+    -------
+    [tabuleiro, puzzle, dificuldade], como gera_Puzzle. Cancelar a tarefa
+    interrompe a geração no trabalhador.
+    """
+    executor = executor or executor_padrao()
+    return await executor.gera_puzzle(ao_progresso, **kwargs)
+
+
+async def conta_solucoes_async(lin, col, dicas, limite=2, max_nos=60000,
+                               ao_progresso=None, executor=None):
+    """
+    Solver(lin, col, dicas, max_nos).conta_solucoes(limite) num processo
+    trabalhador. ao_progresso recebe os nós da busca (ver
+    gera_puzzle_async).
+
+    Returns
+    -------
+    Tupla (n, solucoes, completa): a saída do conta_solucoes e se a busca
+    terminou dentro de max_nos. Cancelar a tarefa interrompe a busca.
+    """
+    executor = executor or executor_padrao()
+    return await executor.conta_solucoes(lin, col, dicas, limite, max_nos
+                                         ,ao_progresso)
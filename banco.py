@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Banco local de puzzles em SQLite: guarda a saída do gera_Puzzle (ou de um
+lote do gera_lote) de forma compacta e indexada, para servir puzzles de um
+estoque pronto em vez de gerar a cada pedido.
+
+Dicas e solução ficam em blobs: as dicas com 4 bits por célula (valor+1,
+de 0 a 4) e a solução como bitset das arestas na enumeração do Solver
+(solver.topologia). Cada linha recebe um número aleatório `sorteio` na
+inserção, que ordena o índice parcial dos puzzles ainda não servidos;
+sortear um deles conta os candidatos nesse índice e pula um número
+sorteado deles (OFFSET), de modo que a escolha é uniforme e não lê blobs
+nem ordena a tabela como ORDER BY RANDOM().
+"""
+
+import sqlite3
+import threading
+
+import numpy as np
+
+import lote
+import main as sl
+import solver as sv
+
+
+_NIVEL = {'nenhuma': 0, 'facil': 0, 'medio': 1, 'dificil': 2}
+
+_ESQUEMA = '''
+CREATE TABLE IF NOT EXISTS puzzles(
+    id          INTEGER PRIMARY KEY,
+    lin         INTEGER NOT NULL,
+    col         INTEGER NOT NULL,
+    dificuldade TEXT    NOT NULL,
+    n_dicas     INTEGER NOT NULL,
+    pontuacao   REAL    NOT NULL,
+    densidade   REAL    NOT NULL,
+    dicas       BLOB    NOT NULL,
+    solucao     BLOB    NOT NULL,
+    sorteio     REAL    NOT NULL,
+    servido     INTEGER NOT NULL DEFAULT 0,
+    UNIQUE(lin, col, dicas));
+CREATE INDEX IF NOT EXISTS idx_dicas
+    ON puzzles(lin, col, dificuldade, n_dicas);
+CREATE INDEX IF NOT EXISTS idx_pontuacao ON puzzles(lin, col, pontuacao);
+CREATE INDEX IF NOT EXISTS idx_densidade ON puzzles(lin, col, densidade);
+CREATE INDEX IF NOT EXISTS idx_livres
+    ON puzzles(lin, col, dificuldade, sorteio) WHERE servido = 0;
+CREATE INDEX IF NOT EXISTS idx_livres_tamanho
+    ON puzzles(lin, col, sorteio) WHERE servido = 0;
+'''
+
+
+# =============================================================================
+# Blobs compactos
+# =============================================================================
+def empacota_dicas(puzzle):
+    """Matriz de dicas (-1 sem dica) em 4 bits por célula."""
+    n = np.size(puzzle)
+    x = np.zeros(n + n % 2, dtype=np.uint8)    # completa um número par
+    x[:n] = np.ravel(puzzle) + 1
+    return (x[0::2] | (x[1::2] << 4)).tobytes()
+
+
+def desempacota_dicas(blob, lin, col):
+    """Inverso de empacota_dicas para um tabuleiro lin x col."""
+    b = np.frombuffer(blob, dtype=np.uint8)
+    x = np.empty(2*len(b), dtype=np.int64)
+    x[0::2] = b & 0xF
+    x[1::2] = b >> 4
+    return x[:(lin-1)*(col-1)].reshape(lin-1, col-1) - 1
+
+
+def empacota_solucao(lin, col, solucao):
+    """Bitset (1 bit por aresta, ids do Solver) do conjunto de arestas."""
+    bits = np.zeros(sv.topologia(lin, col).nE, dtype=bool)
+    bits[list(solucao)] = True
+    return np.packbits(bits, bitorder='little').tobytes()
+
+
+def desempacota_solucao(blob, lin, col):
+    """Inverso de empacota_solucao: frozenset de ids de aresta."""
+    bits = np.unpackbits(np.frombuffer(blob, dtype=np.uint8)
+                         ,count=sv.topologia(lin, col).nE, bitorder='little')
+    return frozenset(np.flatnonzero(bits).tolist())
+
+
+def pontuacao_dificuldade(lin, col, puzzle, dificuldade):
+    """
+    Nota numérica da dificuldade: o nível do avalia_dificuldade (0 fácil,
+    1 médio, 2 difícil) mais a fração de células SEM dica, que desempata
+    dentro do nível (menos dicas, mais difícil).
+    """
+    n_dicas = int((np.asarray(puzzle) >= 0).sum())
+    return _NIVEL[dificuldade] + 1 - n_dicas / ((lin-1)*(col-1))
+
+
+# =============================================================================
+# Banco
+# =============================================================================
+class BancoPuzzles:
+    """
+    Estoque de puzzles em um arquivo SQLite (modo WAL: leitores não
+    bloqueiam a escrita, e vários processos podem servir do mesmo banco).
+
+    A conexão é compartilhada entre threads; uma trava serializa as
+    transações, de modo que várias threads podem sortear e inserir no
+    mesmo objeto.
+
+    Parameters
+    ----------
+    caminho : str, optional
+        Arquivo do banco (criado se não existe). Padrão 'puzzles.db'
+    tamanho_transacao : int, optional
+        Linhas por transação nas inserções em massa. Padrão 10000
+    rng : optional
+        Gerador dos números de sorteio (ver main.normaliza_rng). Padrão None
+    """
+
+    def __init__(self, caminho='puzzles.db', tamanho_transacao=10000,
+                 rng=None):
+        self.caminho = caminho
+        self.tamanho_transacao = tamanho_transacao
+        self.rng = sl.normaliza_rng(rng)
+        self._trava = threading.Lock()
+        # Autocommit: as transações são abertas explicitamente (BEGIN)
+        self.con = sqlite3.connect(caminho, isolation_level=None
+                                   ,check_same_thread=False)
+        self.con.execute('PRAGMA journal_mode=WAL')
+        self.con.execute('PRAGMA synchronous=NORMAL')
+        self.con.execute('PRAGMA busy_timeout=10000')
+        self.con.executescript(_ESQUEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fecha()
+
+    def fecha(self):
+        with self._trava:
+            self.con.close()
+
+    # -------------------------------------------------------------------------
+    # Inserção
+    # -------------------------------------------------------------------------
+    def _linha(self, lin, col, puzzle, solucao, dificuldade):
+        puzzle = np.asarray(puzzle)
+        return (lin, col, dificuldade, int((puzzle >= 0).sum())
+                ,pontuacao_dificuldade(lin, col, puzzle, dificuldade)
+                ,len(solucao) / (lin*col)
+                ,empacota_dicas(puzzle), empacota_solucao(lin, col, solucao))
+
+    def _insere_linhas(self, linhas):
+        """Insere em transações de tamanho_transacao; devolve quantas
+        linhas entraram (puzzles repetidos são ignorados)."""
+        novas = 0
+        bloco = []
+        for linha in linhas:
+            bloco.append(linha)
+            if len(bloco) >= self.tamanho_transacao:
+                novas += self._grava(bloco)
+                bloco = []
+        if bloco:
+            novas += self._grava(bloco)
+        return novas
+
+    def _grava(self, bloco):
+        """Uma transação de inserção; devolve quantas linhas entraram."""
+        with self._trava:
+            sorteios = self.rng.random_sample(len(bloco)).tolist()
+            antes = self.con.total_changes
+            self.con.execute('BEGIN')
+            try:
+                self.con.executemany(
+                    'INSERT OR IGNORE INTO puzzles(lin, col, dificuldade,'
+                    ' n_dicas, pontuacao, densidade, dicas, solucao, sorteio)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+                    ,[linha + (s,) for linha, s in zip(bloco, sorteios)])
+            except BaseException:
+                self.con.execute('ROLLBACK')
+                raise
+            self.con.execute('COMMIT')
+            return self.con.total_changes - antes
+
+    def insere(self, puzzles):
+        """
+        Insere puzzles no formato de saída do gera_Puzzle.
+
+        Parameters
+        ----------
+        puzzles : iterável
+            Listas [tabuleiro, puzzle, dificuldade] do gera_Puzzle.
+
+        Returns
+        -------
+        Número de puzzles novos inseridos.
+        """
+        return self._insere_linhas(
+            self._linha(tab.lin, tab.col, puzzle, sv.arestas_do_tabuleiro(tab)
+                        ,dif)
+            for tab, puzzle, dif in puzzles)
+
+    def importa_lote(self, caminho):
+        """Insere todos os puzzles de um arquivo do gera_lote (ver
+        lote.le_lote). Devolve o número de puzzles novos."""
+        return self._insere_linhas(
+            self._linha(r['lin'], r['col'], r['dicas'], r['solucao']
+                        ,r['dificuldade'])
+            for r in lote.le_lote(caminho))
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _filtros(lin, col, dificuldade, n_dicas, pontuacao, densidade,
+                 servidos):
+        where = ['lin = ?', 'col = ?']
+        args = [lin, col]
+        if dificuldade is not None:
+            where.append('dificuldade = ?')
+            args.append(dificuldade)
+        for nome, faixa in (('n_dicas', n_dicas), ('pontuacao', pontuacao)
+                            ,('densidade', densidade)):
+            if faixa is not None:
+                where.append('{} BETWEEN ? AND ?'.format(nome))
+                args.extend(faixa)
+        if not servidos:
+            where.append('servido = 0')
+        return ' AND '.join(where), args
+
+    def conta(self, lin, col, dificuldade=None, n_dicas=None, pontuacao=None,
+              densidade=None, servidos=False):
+        """Número de puzzles que passam nos filtros (ver sorteia);
+        servidos=True conta também os já servidos."""
+        where, args = self._filtros(lin, col, dificuldade, n_dicas
+                                    ,pontuacao, densidade, servidos)
+        with self._trava:
+            return self.con.execute('SELECT COUNT(*) FROM puzzles WHERE '
+                                    + where, args).fetchone()[0]
+
+    def sorteia(self, lin, col, dificuldade=None, n_dicas=None,
+                pontuacao=None, densidade=None, marca=True):
+        """
+        Sorteia um puzzle ainda não servido que passa nos filtros.
+
+        A escolha é uniforme entre os candidatos: conta quantos passam nos
+        filtros e pega o k-ésimo, com k sorteado, na ordem do índice de
+        livres. O custo cresce com o número de candidatos, mas percorre só
+        o índice (sem ler os blobs); 60 mil candidatos levam ~10 ms.
+
+        Parameters
+        ----------
+        lin, col : int
+            Tamanho do tabuleiro (em vértices).
+        dificuldade : str, optional
+            'facil', 'medio', 'dificil' ou 'nenhuma'. Padrão None (qualquer)
+        n_dicas, pontuacao, densidade : tuple, optional
+            Faixas (mínimo, máximo), inclusivas. Padrão None (qualquer)
+        marca : bool, optional
+            Se True, o puzzle sai do estoque (servido = 1) na mesma
+            transação, de modo que dois processos nunca servem o mesmo
+            puzzle. Padrão True
+
+        Returns
+        -------
+        dict com id, lin, col, dificuldade, n_dicas, pontuacao, densidade,
+        dicas (matriz com -1 nas células sem dica) e solucao (frozenset de
+        ids de aresta), ou None se nenhum puzzle passa nos filtros.
+        """
+        where, args = self._filtros(lin, col, dificuldade, n_dicas
+                                    ,pontuacao, densidade, False)
+        consulta = ('SELECT id, dificuldade, n_dicas, pontuacao, densidade,'
+                    ' dicas, solucao FROM puzzles WHERE ' + where
+                    + ' ORDER BY sorteio LIMIT 1 OFFSET ?')
+        with self._trava:
+            self.con.execute('BEGIN IMMEDIATE')
+            try:
+                # Contagem e escolha na mesma transação: outro processo não
+                # serve nenhum candidato entre as duas
+                n = self.con.execute('SELECT COUNT(*) FROM puzzles WHERE '
+                                     + where, args).fetchone()[0]
+                linha = None
+                if n:
+                    k = int(self.rng.randint(n))
+                    linha = self.con.execute(consulta, args + [k]).fetchone()
+                if linha is not None and marca:
+                    self.con.execute('UPDATE puzzles SET servido = 1'
+                                     ' WHERE id = ?', (linha[0],))
+            except BaseException:
+                self.con.execute('ROLLBACK')
+                raise
+            self.con.execute('COMMIT')
+        if linha is None:
+            return None
+        ident, dif, n_dicas, pontuacao, densidade, dicas, solucao = linha
+        return {'id': ident
+                ,'lin': lin
+                ,'col': col
+                ,'dificuldade': dif
+                ,'n_dicas': n_dicas
+                ,'pontuacao': pontuacao
+                ,'densidade': densidade
+                ,'dicas': desempacota_dicas(dicas, lin, col)
+                ,'solucao': desempacota_solucao(solucao, lin, col)}
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Memória compartilhada para os oráculos de unicidade em vários processos.
+
+Num pool de redução, todos os trabalhadores resolvem tabuleiros do mesmo
+tamanho. Em vez de cada processo montar a própria topologia e de cada
+tarefa levar a matriz de dicas em pickle, o processo principal põe em
+multiprocessing.shared_memory:
+
+  - TopologiaCompartilhada: os arrays estáticos de solver.topologia, que
+    cada trabalhador enxerga sem cópia e registra no próprio processo
+    (solver.registra_topologia);
+  - AnelDicas: um anel de `n_slots` matrizes de dicas (int8); a tarefa
+    enviada ao trabalhador é só o índice do slot.
+
+PoolUnicidade junta as duas coisas num pool de conta_solucoes(limite=2).
+Os blocos são criados (e apagados em fecha()) pelo processo principal; os
+trabalhadores apenas se anexam a eles.
+"""
+
+import concurrent.futures
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import gerador as ger
+import solver as sv
+
+
+_ARRAYS = ('vertices_aresta', 'arestas_vertice', 'grau', 'arestas_celula'
+           ,'cortes_verticais', 'cortes_horizontais')
+
+_anexados = []           # blocos abertos neste processo (vivos com as visões)
+
+
+def _anexa(nome):
+    try:
+        bloco = shared_memory.SharedMemory(name=nome, track=False)
+    except TypeError:    # Python < 3.13: o rastreador é o do processo pai
+        bloco = shared_memory.SharedMemory(name=nome)
+    _anexados.append(bloco)
+    return bloco
+
+
+def _visao(bloco, forma, tipo, inicio=0, escrita=False):
+    a = np.ndarray(forma, dtype=tipo, buffer=bloco.buf, offset=inicio)
+    a.flags.writeable = escrita
+    return a
+
+
+# =============================================================================
+# Topologia
+# =============================================================================
+class TopologiaCompartilhada:
+    """
+    Os arrays de solver.topologia(lin, col) num bloco de memória
+    compartilhada.
+
+    Parameters
+    ----------
+    lin, col : int
+        Tamanho do tabuleiro (em vértices).
+
+    Attributes
+    ----------
+    descritor : tuple
+        O que um trabalhador precisa para se anexar (ver anexa_topologia):
+        nome do bloco, lin, col e (nome, forma, dtype, offset) de cada array.
+    """
+
+    def __init__(self, lin, col):
+        topo = sv.topologia(lin, col)
+        arrays = [getattr(topo, nome) for nome in _ARRAYS]
+        self._bloco = shared_memory.SharedMemory(
+            create=True, size=sum(a.nbytes for a in arrays))
+        layout = []
+        inicio = 0
+        for nome, a in zip(_ARRAYS, arrays):
+            _visao(self._bloco, a.shape, a.dtype, inicio, escrita=True)[...] = a
+            layout.append((nome, a.shape, a.dtype.str, inicio))
+            inicio += a.nbytes
+        self.descritor = (self._bloco.name, lin, col, tuple(layout))
+
+    def fecha(self):
+        """Fecha e apaga o bloco (os trabalhadores já devem ter saído)."""
+        self._bloco.close()
+        self._bloco.unlink()
+
+
+def anexa_topologia(descritor):
+    """
+    Anexa este processo à topologia de um TopologiaCompartilhada e a
+    registra em solver.topologia: daí em diante Solver e SolverCpSat deste
+    tamanho usam os arrays compartilhados (somente leitura).
+
+    Returns
+    -------
+    A solver.Topologia registrada.
+    """
+    nome, lin, col, layout = descritor
+    bloco = _anexa(nome)
+    arrays = {a: _visao(bloco, forma, tipo, inicio)
+              for a, forma, tipo, inicio in layout}
+    nH = lin*(col-1)
+    topo = sv.Topologia(lin, col, nH, nH + (lin-1)*col, lin*col
+                        ,*(arrays[a] for a in _ARRAYS))
+    sv.registra_topologia(topo)
+    return topo
+
+
+# =============================================================================
+# Anel de dicas
+# =============================================================================
+class AnelDicas:
+    """
+    Anel de `n_slots` matrizes de dicas (lin-1)x(col-1) em memória
+    compartilhada.
+
+    O processo principal reserva um slot livre, grava o puzzle nele e manda
+    ao trabalhador só o índice; quando a tarefa termina, libera o slot.
+    reserva() bloqueia enquanto o anel está cheio, o que limita as tarefas
+    em voo ao número de slots.
+
+    Parameters
+    ----------
+    lin, col : int
+        Tamanho do tabuleiro (em vértices).
+    n_slots : int
+        Número de slots.
+
+    Attributes
+    ----------
+    descritor : tuple
+        O que um trabalhador precisa para se anexar (ver anexa_anel).
+    """
+
+    def __init__(self, lin, col, n_slots):
+        forma = (n_slots, lin-1, col-1)
+        self._bloco = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(forma)))
+        self.slots = _visao(self._bloco, forma, np.int8, escrita=True)
+        self.descritor = (self._bloco.name, forma)
+        self._livres = list(range(n_slots))
+        self._cond = threading.Condition()
+
+    def reserva(self):
+        """Índice de um slot livre (espera se não há nenhum)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._livres)
+            return self._livres.pop()
+
+    def libera(self, slot):
+        with self._cond:
+            self._livres.append(slot)
+            self._cond.notify()
+
+    def grava(self, slot, puzzle):
+        self.slots[slot] = puzzle
+
+    def fecha(self):
+        """Fecha e apaga o bloco (os trabalhadores já devem ter saído)."""
+        self.slots = None
+        self._bloco.close()
+        self._bloco.unlink()
+
+
+def anexa_anel(descritor):
+    """Visão somente leitura (n_slots, lin-1, col-1) de um AnelDicas."""
+    nome, forma = descritor
+    return _visao(_anexa(nome), forma, np.int8)
+
+
+# =============================================================================
+# Pool de oráculos
+# =============================================================================
+_anel = None             # visão do AnelDicas no processo trabalhador
+
+
+def _inicia_trabalhador(topologia, anel):
+    global _anel
+    anexa_topologia(topologia)
+    _anel = anexa_anel(anel)
+
+
+def _conta_slot(slot, max_nos, motor):
+    """conta_solucoes(limite=2) do puzzle no slot: (n, completa)."""
+    _, lin, col = _anel.shape
+    s = ger._novo_oraculo(lin + 1, col + 1, _anel[slot], max_nos, motor)
+    n, _ = s.conta_solucoes(limite=2)
+    return n, s.completa
+
+
+class PoolUnicidade:
+    """
+    Pool de processos que testa a unicidade de puzzles lin x col, com a
+    topologia e as dicas em memória compartilhada.
+
+    Parameters
+    ----------
+    lin, col : int
+        Tamanho dos tabuleiros (em vértices).
+    processos : int, optional
+        Processos trabalhadores. Padrão 2
+    n_slots : int, optional
+        Slots do anel de dicas, isto é, o máximo de tarefas em voo.
+        Padrão 4*processos
+    max_nos : int, optional
+        Limite de nós da busca de cada oráculo. Padrão 60000
+    motor : str, optional
+        'auto', 'python' ou 'cpsat' (ver gerador.gera_Puzzle). Padrão 'auto'
+    """
+
+    def __init__(self, lin, col, processos=2, n_slots=None, max_nos=60000,
+                 motor='auto'):
+        self.lin = lin
+        self.col = col
+        self.max_nos = max_nos
+        self.motor = motor
+        self._topologia = TopologiaCompartilhada(lin, col)
+        self._anel = AnelDicas(lin, col, n_slots or 4*processos)
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            processos, initializer=_inicia_trabalhador
+            ,initargs=(self._topologia.descritor, self._anel.descritor))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fecha()
+
+    def fecha(self):
+        """Espera as tarefas, encerra o pool e apaga os blocos."""
+        self._pool.shutdown(wait=True)
+        self._anel.fecha()
+        self._topologia.fecha()
+
+    def submete(self, puzzle):
+        """
+        Manda um puzzle ao pool (espera um slot livre se o anel está
+        cheio).
+
+        Returns
+        -------
+        Future de (n, completa): n é 0, 1 ou 2 (2 = mais de uma solução) e
+        completa diz se a busca terminou dentro de max_nos.
+        """
+        slot = self._anel.reserva()
+        try:
+            self._anel.grava(slot, puzzle)
+            futuro = self._pool.submit(_conta_slot, slot, self.max_nos
+                                       ,self.motor)
+        except BaseException:
+            self._anel.libera(slot)
+            raise
+        futuro.add_done_callback(lambda f: self._anel.libera(slot))
+        return futuro
+
+    def conta(self, puzzle):
+        """(n, completa) de um puzzle (ver submete)."""
+        return self.submete(puzzle).result()
+
+    def conta_varios(self, puzzles):
+        """(n, completa) de cada puzzle, na ordem dada."""
+        return [f.result() for f in [self.submete(p) for p in puzzles]]
@@ -5,8 +5,17 @@ Created on Sun May 28 08:35:11 2023
 @author: lucas
 """
 
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+
 import numpy as np
-import networkx as nx
 from tqdm import tqdm
 import main as sl
 import solver as sv
@@ -57,6 +66,187 @@ def testa_vertice(tabuleiro         : sl.Tabuleiro
 
 
 
+# =============================================================================
+# Motor do passeio aleatório sobre arrays planos
+# =============================================================================
+class _FluxoAleatorio:
+    """
+    Fluxo de números aleatórios sorteados em bloco, que reproduz exatamente
+    as chamadas do numpy.random legado usadas pelo passeio original.
+
+    RandomState.choice sobre uma lista de k elementos e a permutação de
+    choice(replace=False) consomem o mesmo fluxo de inteiros de 32 bits:
+    cada sorteio em [0, m] usa o próximo inteiro & máscara (a menor
+    2^b - 1 >= m), rejeitando valores > m, e m = 0 não consome nada. O
+    fluxo é sorteado em blocos (um único randint vetorizado) e consumido
+    em Python puro; ao final (devolve), o gerador é reposicionado
+    exatamente após o último inteiro usado -- quem usar o numpy.random
+    depois vê o mesmo estado que veria com o passeio original.
+    """
+
+    def __init__(self, rs=np.random, bloco=4096):
+        self.rs = rs
+        self.bloco = bloco
+        self.estado = rs.get_state(legacy=False)
+        self.fluxo = []
+        self.pos = 0
+        self.usados = 0
+
+    def intervalo(self, maximo):
+        """Inteiro uniforme em [0, maximo]."""
+        if maximo == 0:
+            return 0
+        mascara = (1 << maximo.bit_length()) - 1
+        while True:
+            if self.pos == len(self.fluxo):
+                self.usados += self.pos
+                self.fluxo = self.rs.randint(0, 2**32, size=self.bloco
+                                             ,dtype=np.uint32).tolist()
+                self.pos = 0
+            x = self.fluxo[self.pos] & mascara
+            self.pos += 1
+            if x <= maximo:
+                return x
+
+    def primeiro_da_permutacao(self, n):
+        """Primeiro elemento de choice(n, size=n, replace=False)."""
+        # Embaralhamento de Fisher-Yates do numpy, guardando só as posições
+        # já trocadas
+        trocados = {}
+        for i in range(n - 1, 0, -1):
+            j = self.intervalo(i)
+            vi = trocados.get(i, i)
+            trocados[i] = trocados.get(j, j)
+            trocados[j] = vi
+        return trocados.get(0, 0)
+
+    def devolve(self):
+        """Reposiciona o gerador logo após o último número consumido."""
+        self.rs.set_state(self.estado)
+        usados = self.usados + self.pos
+        while usados > 0:
+            k = min(usados, 1 << 20)
+            self.rs.randint(0, 2**32, size=k, dtype=np.uint32)
+            usados -= k
+
+
+class _MotorPasseio:
+    """
+    Passeio aleatório de passeio_aleatorio() sobre arrays planos: vizinhos
+    pré-calculados por vértice (na ordem acima, abaixo, direita, esquerda
+    de Tabuleiro.sorteia_proximo_vertice), marcas de visitado num
+    bytearray e o caminho como pilha de inteiros. Cada passo custa O(1) e
+    recomeçar uma tentativa custa só zerar o bytearray -- nenhum Tabuleiro
+    ou Vertice é criado. Com o mesmo estado do numpy.random, produz o mesmo
+    passeio que o algoritmo original (ver _FluxoAleatorio).
+    """
+
+    def __init__(self, lin, col):
+        self.lin = lin
+        self.col = col
+        self.numero_vertices = lin * col
+        self.vizinhos = []
+        for l in range(lin):
+            for c in range(col):
+                n = l*col + c
+                viz = []
+                if l > 0:
+                    viz.append(n - col)
+                if l < lin - 1:
+                    viz.append(n + col)
+                if c < col - 1:
+                    viz.append(n + 1)
+                if c > 0:
+                    viz.append(n - 1)
+                self.vizinhos.append(tuple(viz))
+
+    def passeio(self, fluxo, origem=None, destino=None, teste1=False
+                ,teste2=False, limite_iteracoes=100, caminho_minimo=5):
+        """
+        Executa um passeio (ver passeio_aleatorio). origem/destino são
+        números de vértices (None: origem sorteada, destino = origem).
+
+        Returns
+        -------
+        Tupla (passeio, caminho, visitados, fechado): passeio no formato
+        [(n,±1), ...]; caminho, a lista de vértices do caminho final (com
+        o destino acrescentado no fim se o caminho fechou -- como em
+        Tabuleiro.caminho); visitados, o bytearray com as marcas; fechado,
+        se o passeio atingiu o destino.
+        """
+        vizinhos = self.vizinhos
+        visitados = bytearray(self.numero_vertices)
+        if origem is None:
+            origem = fluxo.primeiro_da_permutacao(self.numero_vertices)
+        if destino is None:
+            destino = origem
+        visitados[origem] = 1
+        visitados[destino] = 1
+        caminho = [origem]
+        passeio = [(origem, 1)]
+
+        def fecha(v):
+            # testa_vertice: o destino é vizinho da ponta v e a aresta
+            # v-destino ainda não está no caminho (só a última aresta
+            # toca a ponta)
+            return (len(caminho) >= caminho_minimo and destino in vizinhos[v]
+                    and caminho[-2] != destino)
+
+        v = origem
+        sem_mov = 0
+        while True:
+            sem_mov += 1
+            if sem_mov > limite_iteracoes:
+                break
+
+            # Avança por vértices não visitados
+            while True:
+                livres = [w for w in vizinhos[v] if not visitados[w]]
+                if not livres:
+                    break
+                w = livres[fluxo.intervalo(len(livres) - 1)]
+                visitados[w] = 1
+                caminho.append(w)
+                passeio.append((w, 1))
+                sem_mov = 0
+                v = w
+                if teste1 and fecha(v):
+                    break
+
+            if fecha(v):
+                caminho.append(destino)
+                return passeio, caminho, visitados, True
+
+            # Backtracking até um vértice com passo possível
+            while len(caminho) >= 2:
+                v1 = caminho.pop()
+                v2 = caminho[-1]
+                sem_mov = 0
+                passeio.append((v1, -1))
+                if teste2 and fecha(v2):
+                    v = v2
+                    break
+                livres = [w for w in vizinhos[v2] if not visitados[w]]
+                if livres:
+                    # sorteia_proximo_vertice(v2) do original: o vértice
+                    # sorteado é descartado, mas o sorteio consome o fluxo
+                    fluxo.intervalo(len(livres) - 1)
+                    v = v2
+                    break
+
+        return passeio, caminho, visitados, False
+
+
+def _aplica_passeio(tabuleiro, caminho, visitados, fechado):
+    """Aplica ao tabuleiro (vazio) o resultado de _MotorPasseio.passeio."""
+    tabuleiro.visitado[:] = np.frombuffer(visitados, dtype=np.int8)
+    percorridos = caminho[:-1] if fechado else caminho
+    tabuleiro.ordem[percorridos] = np.arange(1, len(percorridos) + 1)
+    for a, b in zip(caminho, caminho[1:]):
+        tabuleiro.G.add_edge(a, b)
+    tabuleiro.caminho = [tabuleiro.get_verticeN(n) for n in caminho]
+
+
 # =============================================================================
 # Geração de caminho via passeio aleatório
 # =============================================================================
@@ -119,107 +309,109 @@ def passeio_aleatorio(tabuleiro         : sl.Tabuleiro
     Os elementos da lista são (v,+1), indicando inclusão do vértice ou
     (v,-1) indicando a exclusão do vértice.
 
+    Notes
+    -----
+    O passeio é executado pelo _MotorPasseio (arrays planos, O(1) por
+    passo) e depois aplicado ao tabuleiro; o resultado é idêntico ao do
+    algoritmo original com o mesmo estado do gerador do tabuleiro
+    (tabuleiro.rng).
     """
-    # Sorteia um ponto de partida, se não foi passado como parâmetro
-    if vertice_origem is None:
-        vertice_origem = tabuleiro.sorteia_vertice()
-    else:
-        vertice_origem = tabuleiro.get_verticeXY(vertice_origem[1]
-                                                 ,vertice_origem[0])
-    
-    # Se o vértice destino não foi passado como parâmetro, assume
-    # que é o mesmo que o vértice origem
-    if vertice_destino is None:
-        vertice_destino = vertice_origem
-    else:
-        vertice_destino = tabuleiro.get_verticeXY(vertice_destino[1]
-                                                  ,vertice_destino[0])
-    
-    vertice_origem.visitado = 1
-    vertice_origem.ordem = 1
-    v = vertice_origem
-    tabuleiro.caminho = [vertice_origem]
+    origem = vertice_destino_n = None
+    if vertice_origem is not None:
+        origem = tabuleiro.xy_para_n(vertice_origem[1], vertice_origem[0])
+    if vertice_destino is not None:
+        vertice_destino_n = tabuleiro.xy_para_n(vertice_destino[1]
+                                                ,vertice_destino[0])
+
+    fluxo = _FluxoAleatorio(tabuleiro.rng)
+    passeio, caminho, visitados, fechado = _MotorPasseio(
+        tabuleiro.lin, tabuleiro.col).passeio(fluxo, origem, vertice_destino_n
+                                              ,teste1, teste2
+                                              ,limite_iteracoes)
+    fluxo.devolve()
+    _aplica_passeio(tabuleiro, caminho, visitados, fechado)
+    return passeio
 
-    # Marca vértice destino como visitado (necessário para o teste
-    # de finalização do algoritmo)
-    vertice_destino.visitado = 1
 
-    # Contagem de iterações sem movimento, para critério de parada
-    iteracoes_sem_mov = 0
-    
-    # Flag para parada do algoritmo        
-    finalizado = False
+# =============================================================================
+# Tentativas do gera_Tabuleiro em paralelo
+# =============================================================================
+_motores = {}            # _MotorPasseio por (lin, col), um por processo
+_primeiro_sucesso = None # multiprocessing.Value compartilhado entre os workers
 
-    passeio = [(vertice_origem.n,1)]
 
-    while not finalizado:
-        
-        iteracoes_sem_mov += 1    
-        if iteracoes_sem_mov > limite_iteracoes:
-            break
+def _inicia_worker(primeiro_sucesso):
+    global _primeiro_sucesso
+    _primeiro_sucesso = primeiro_sucesso
 
-        # Busca uma solução com um passeio aleatório em
-        # vértices não visitados
-        while (True):
-            prox_vertice = tabuleiro.sorteia_proximo_vertice(v)
-            
-            if prox_vertice is None:
-                break
-        
-            # Marca vértice como visitado e atribui ordem
-            prox_vertice.visitado = 1
-            prox_vertice.ordem = v.ordem + 1
-            iteracoes_sem_mov = 0
-
-            tabuleiro.caminho.append(prox_vertice)
-            tabuleiro.G.add_edge(v, prox_vertice)
-            passeio.append((prox_vertice.n,1))
-
-            v = prox_vertice
-            
-            # Valida condições de finalização, dentro do algoritmo
-            # de avanço do passeio aleatório
-            if testa_vertice(tabuleiro,v,vertice_destino) and teste1:
-                break
-
-
-        # Valida condições de finalização
-        if testa_vertice(tabuleiro,v,vertice_destino):
-            tabuleiro.G.add_edge(v,vertice_destino)
-            tabuleiro.caminho.append(vertice_destino)
-            finalizado = True
-            break
 
-        # Faz o backtracking até encontrar um vértice viável 
-        # para continuar o passeio aleatório
-        backtracking = True 
-        while backtracking:
-            if len(tabuleiro.caminho) < 2:
-                backtracking = False
-                break
-            
-            v1 = tabuleiro.caminho[-1] # A ser removido
-            v2 = tabuleiro.caminho[-2] # Testar existência de caminho viável
+def _tentativa(lin, col, rs, origem, destino):
+    """Uma tentativa do gera_Tabuleiro: o passeio sorteado com `rs`."""
+    motor = _motores.get((lin, col))
+    if motor is None:
+        motor = _motores[(lin, col)] = _MotorPasseio(lin, col)
+    fluxo = _FluxoAleatorio(rs)
+    resultado = motor.passeio(fluxo, origem, destino)
+    fluxo.devolve()
+    return resultado
 
-            v1.ordem = -1
-            tabuleiro.G.remove_edge(v1,v2)
-            tabuleiro.caminho.pop()
-            iteracoes_sem_mov = 0
-            passeio.append((v1.n,-1))
 
+def _bloco_de_tentativas(lin, col, seed, inicio, fim, origem, destino,
+                         densidade):
+    """
+    Roda as tentativas `inicio..fim-1` (sementes seed+i) e devolve a lista
+    de densidades obtidas. Para na primeira que atinge `densidade` ou assim
+    que outro worker registra sucesso numa tentativa anterior.
+    """
+    densidades = []
+    for i in range(inicio, fim):
+        if _primeiro_sucesso.value < i:
+            break                 # já existe resultado melhor: cancela
+        resultado = _tentativa(lin, col, np.random.RandomState(seed + i),
+                               origem, destino)
+        densidades.append(len(resultado[1]) / (lin*col))
+        if densidades[-1] >= densidade:
+            with _primeiro_sucesso.get_lock():
+                if i < _primeiro_sucesso.value:
+                    _primeiro_sucesso.value = i
+            break
+    return densidades
 
-            # Valida condições de finalização, segundo teste,
-            # dentro do backtracking. Após o pop, a ponta do caminho é v2
-            if testa_vertice(tabuleiro,v2,vertice_destino) and teste2:
-                v = v2
-                break
-            
-            # Checa se existe caminho viável
-            if tabuleiro.sorteia_proximo_vertice(v2) is not None:
-                backtracking = False
-                v = v2
 
-    return passeio
+def _tentativas_paralelas(lin, col, seed, max_tentativas, origem, destino,
+                          densidade, processos, barra_progresso):
+    """
+    Distribui as tentativas do gera_Tabuleiro entre `processos` workers e
+    devolve o índice da tentativa que o laço serial escolheria: a primeira
+    que atinge `densidade` ou, se nenhuma atinge, a primeira de densidade
+    máxima. As tentativas anteriores à vencedora sempre rodam até o fim,
+    por isso o resultado não depende da ordem de término dos workers.
+    """
+    primeiro_sucesso = multiprocessing.Value('q', max_tentativas)
+    tam_bloco = max(1, min(16, max_tentativas // (4*processos)))
+    densidades = np.zeros(max_tentativas)
+    with concurrent.futures.ProcessPoolExecutor(
+            processos, initializer=_inicia_worker,
+            initargs=(primeiro_sucesso,)) as pool:
+        futuros = {}
+        for inicio in range(0, max_tentativas, tam_bloco):
+            fim = min(inicio + tam_bloco, max_tentativas)
+            futuros[pool.submit(_bloco_de_tentativas, lin, col, seed, inicio,
+                                fim, origem, destino, densidade)] = inicio
+        for futuro in concurrent.futures.as_completed(futuros):
+            if futuro.cancelled():
+                continue
+            inicio = futuros[futuro]
+            obtidas = futuro.result()
+            densidades[inicio:inicio + len(obtidas)] = obtidas
+            barra_progresso.update(len(obtidas))
+            if obtidas and obtidas[-1] >= densidade:
+                for f, i in futuros.items():
+                    if i > inicio:
+                        f.cancel()
+    if primeiro_sucesso.value < max_tentativas:
+        return primeiro_sucesso.value
+    return int(np.argmax(densidades))
 
 
 # =============================================================================
@@ -232,6 +424,8 @@ def gera_Tabuleiro(densidade            : float = 0.3
                    ,max_tentativas      : int   = 1000
                    ,seed                : int   = None
                    ,verbose             : bool  = False
+                   ,processos           : int   = 1
+                   ,rng                         = None
                    ,**kwargs):
     """
     Tenta gerar um tabuleiro com caminho aleatório com a densidade 
@@ -248,10 +442,19 @@ def gera_Tabuleiro(densidade            : float = 0.3
     seed: int, optional
         Seed para gerador do número aleatório do numpy.random. Para cada tabuleiro, soma
         1 no seed para variar os tabuleiros gerados nas tentativas. Esse valor
-        é o mesmo passado para o construtor do Taubuleiro. 
-        Não é um parâmetro thread safe
+        é o mesmo passado para o construtor do Taubuleiro. Cada tentativa
+        usa um RandomState próprio: o estado global não é tocado
     dicas: bool, optional
         Indica se as dicas do tabuleiro devem ser preenchidas
+    processos: int, optional
+        Número de processos para rodar as tentativas em paralelo. A tentativa
+        i usa sempre o seed seed+i; a primeira a atingir a densidade cancela
+        as posteriores. Com seed fixo o tabuleiro é o mesmo do caminho
+        serial; sem seed, a semente base é sorteada de rng e fica
+        registrada em tabuleiro.seed. Padrão é 1 (serial)
+    rng: optional
+        Gerador usado quando seed é None (ver main.normaliza_rng). Padrão
+        None: o estado global do numpy.random
     **kwargs :
         Variáveis para criação do tabuleiro. Consultar documentação da classe
         Tabuleiro()
@@ -284,30 +487,57 @@ def gera_Tabuleiro(densidade            : float = 0.3
                            ,leave=True
                            ,desc="Densidade máxima obtida = 0 ")
     
-    for conta_iteracao in barra_progresso:
-        
-        tabuleiro = sl.Tabuleiro(lin=lin
-                                 ,col=col
-                                 ,seed=seed)
-
-        caminho = passeio_aleatorio(tabuleiro
-                                    ,vertice_origem
-                                    ,vertice_destino)
-        if seed is not None:
-            seed += 1
-
-        densidade_obtida = tabuleiro.get_densidade_caminho()
-
-        if densidade_obtida > max_densidade:
-            max_densidade = densidade_obtida
-            max_tabuleiro = tabuleiro
-            max_caminho = caminho
-            if verbose:
-                barra_progresso.set_description_str("Densidade máx obtida {:0.4f} de {:0.4f}".format(max_densidade,densidade))
+    # As tentativas rodam no motor de arrays planos; só a melhor vira um
+    # Tabuleiro no final
+    origem = destino = None
+    if vertice_origem is not None:
+        origem = vertice_origem[1]*col + vertice_origem[0]
+    if vertice_destino is not None:
+        destino = vertice_destino[1]*col + vertice_destino[0]
+    max_resultado, max_seed = None, None
+    rs = sl.normaliza_rng(rng)
+
+    if processos > 1 and max_tentativas > 1:
+        if seed is None:
+            seed = int(rs.randint(0, 2**32 - max_tentativas))
+        vencedora = _tentativas_paralelas(lin, col, seed, max_tentativas,
+                                          origem, destino, densidade,
+                                          processos, barra_progresso)
+        barra_progresso.close()
+        # Refaz a vencedora aqui: só o índice volta dos workers
+        max_seed = seed + vencedora
+        max_rs = np.random.RandomState(max_seed)
+        max_resultado = _tentativa(lin, col, max_rs, origem, destino)
+        max_densidade = len(max_resultado[1]) / (lin*col)
+        max_caminho = max_resultado[0]
+        if max_densidade >= densidade:
+            tqdm.write('\nObtido na {} tentativa'.format(vencedora))
+    else:
+        for conta_iteracao in barra_progresso:
+
+            rs_tentativa = rs if seed is None else np.random.RandomState(seed)
+            resultado = _tentativa(lin, col, rs_tentativa, origem, destino)
+            seed_tentativa = seed
+            if seed is not None:
+                seed += 1
+
+            densidade_obtida = len(resultado[1]) / (lin*col)
+
+            if densidade_obtida > max_densidade:
+                max_densidade = densidade_obtida
+                max_resultado, max_seed = resultado, seed_tentativa
+                max_rs = rs_tentativa
+                max_caminho = resultado[0]
+                if verbose:
+                    barra_progresso.set_description_str("Densidade máx obtida {:0.4f} de {:0.4f}".format(max_densidade,densidade))
         
-        if densidade_obtida >= densidade:
-            tqdm.write('\nObtido na {} tentativa'.format(conta_iteracao))
-            break
+            if densidade_obtida >= densidade:
+                tqdm.write('\nObtido na {} tentativa'.format(conta_iteracao))
+                break
+
+    max_tabuleiro = sl.Tabuleiro(lin=lin, col=col, rng=max_rs)
+    max_tabuleiro.seed = max_seed
+    _aplica_passeio(max_tabuleiro, *max_resultado[1:])
 
     if dicas:
         max_tabuleiro.preenche_dicas()
@@ -316,60 +546,179 @@ def gera_Tabuleiro(densidade            : float = 0.3
 
 
 # =============================================================================
-# Constrói o caminho do tabuleiro a partir de um conjunto de arestas
-# que formam um único ciclo simples
+# Constrói o caminho do tabuleiro a partir dos planos de arestas de um
+# único ciclo simples
 # =============================================================================
-def _monta_caminho_de_arestas(tabuleiro, arestas):
+def _ordem_do_ciclo(h, v):
+    """
+    Ordem de percurso (array de números de vértices) do ciclo simples dado
+    pelos planos de arestas (h, v), no formato de Tabuleiro.arestas_h /
+    arestas_v. Parte do menor vértice do ciclo.
     """
-    Ordena um conjunto de arestas que formam um único ciclo simples e aplica
-    o resultado ao tabuleiro: preenche tabuleiro.caminho, inclui as arestas
-    em tabuleiro.G e marca os vértices como visitados.
+    lin, col = v.shape[0] + 1, h.shape[1] + 1
+    lh, ch = np.nonzero(h)
+    lv, cv = np.nonzero(v)
+    a = np.concatenate([lh*col + ch, lv*col + cv])
+    b = np.concatenate([lh*col + ch + 1, (lv+1)*col + cv])
+    origem = np.concatenate([a, b])
+    destino = np.concatenate([b, a])
+    idx = np.lexsort((destino, origem))
+    origem, destino = origem[idx], destino[idx]
+    # Cada vértice do ciclo tem grau 2: seus vizinhos são pares consecutivos
+    prox0 = np.full(lin*col, -1, dtype=np.int64)
+    prox1 = np.full(lin*col, -1, dtype=np.int64)
+    prox0[origem[0::2]] = destino[0::2]
+    prox1[origem[1::2]] = destino[1::2]
+    return np.fromiter(_percorre(prox0.tolist(), prox1.tolist(),
+                                 int(origem[0]), len(a)),
+                       dtype=np.int64, count=len(a))
+
+
+def _percorre(prox0, prox1, inicio, k):
+    """Gera os k vértices do ciclo a partir de `inicio`, um a um."""
+    anterior, atual = -1, inicio
+    for _ in range(k):
+        yield atual
+        proximo = prox0[atual]
+        if proximo == anterior:
+            proximo = prox1[atual]
+        anterior, atual = atual, proximo
+
+
+def _monta_caminho_de_planos(tabuleiro, h, v):
+    """
+    Ordena o ciclo simples dado pelos planos de arestas (h, v) e aplica o
+    resultado ao tabuleiro (Tabuleiro.aplica_ciclo): caminho, arestas e
+    vértices visitados.
 
     Parameters
     ----------
     tabuleiro : Tabuleiro
         Tabuleiro (assumido vazio) onde o ciclo será aplicado
-    arestas : set
-        Conjunto de tuplas ((l1,c1),(l2,c2)) representando as arestas do ciclo
+    h, v : np.ndarray
+        Planos booleanos das arestas do ciclo, no formato de
+        Tabuleiro.arestas_h / arestas_v
 
     Returns
     -------
     Lista no formato de passeio [(n,+1), ...] com os vértices do ciclo
     em ordem de percurso.
     """
-    adjacencia = {}
-    for a, b in arestas:
-        adjacencia.setdefault(a, []).append(b)
-        adjacencia.setdefault(b, []).append(a)
+    ordem = _ordem_do_ciclo(h, v)
+    tabuleiro.aplica_ciclo(ordem)
+    return [(n, 1) for n in ordem.tolist()]
 
-    # Percorre o ciclo a partir de um vértice qualquer
-    inicio = next(iter(adjacencia))
-    caminho_coords = [inicio]
-    anterior, atual = None, inicio
-    while True:
-        vizinhos = adjacencia[atual]
-        proximo = vizinhos[0] if vizinhos[0] != anterior else vizinhos[1]
-        if proximo == inicio:
-            break
-        caminho_coords.append(proximo)
-        anterior, atual = atual, proximo
 
-    tabuleiro.caminho = []
-    passeio = []
-    v_anterior = None
-    for i, (l, c) in enumerate(caminho_coords):
-        v = tabuleiro.get_verticeXY(l, c)
-        v.visitado = 1
-        v.ordem = i + 1
-        tabuleiro.caminho.append(v)
-        if v_anterior is not None:
-            tabuleiro.G.add_edge(v_anterior, v)
-        passeio.append((v.n, 1))
-        v_anterior = v
-
-    # Fecha o ciclo
-    tabuleiro.G.add_edge(v_anterior, tabuleiro.caminho[0])
-    return passeio
+def _grupos_no_anel(bits, valor):
+    """
+    Número de trechos consecutivos do anel (8 posições, ordem circular N,
+    NE, L, SE, S, SO, O, NO) com bits == valor que contêm uma ortogonal.
+    """
+    if valor not in bits:
+        return 0
+    if all(x == valor for x in bits):
+        return 1
+    inicio = [x == valor for x in bits].index(False)
+    grupos = 0
+    aberto = com_ortogonal = False
+    for k in range(inicio + 1, inicio + 9):
+        b = k % 8
+        if bits[b] != valor:
+            grupos += aberto and com_ortogonal
+            aberto = com_ortogonal = False
+        else:
+            aberto = True
+            com_ortogonal = com_ortogonal or b % 2 == 0
+    return grupos
+
+
+def _tabela_viabilidade_regiao():
+    """
+    Tabela de 256 entradas do gera_caminho_regiao: para a máscara da
+    vizinhança-8 de uma célula (bit b ligado se a posição b do anel N, NE,
+    L, SE, S, SO, O, NO está dentro da região), diz se a célula pode entrar
+    na região sem quebrar os invariantes:
+
+      1. sem toque de canto: toda diagonal dentro precisa de uma das duas
+         ortogonais vizinhas a ela também dentro;
+      2. sem buraco: as vizinhas de fora formam no máximo um grupo local
+         (trecho do anel fora da região que contém uma ortogonal). Dois
+         grupos só aparecem quando as ortogonais opostas estão dentro; como
+         a região é conexa, elas já estão ligadas por um caminho de células
+         da região, que com a nova célula fecha um ciclo em volta de um dos
+         grupos -- esse lado vira buraco.
+    """
+    tabela = bytearray(256)
+    for m in range(256):
+        bits = [(m >> b) & 1 for b in range(8)]
+        if any(bits[b] and not (bits[b-1] or bits[(b+1) % 8])
+               for b in (1, 3, 5, 7)):
+            continue
+        tabela[m] = _grupos_no_anel(bits, 0) <= 1
+    return tabela
+
+
+_VIAVEL_REGIAO = _tabela_viabilidade_regiao()
+
+
+def _tabela_celulas_simples():
+    """
+    Tabela 2 x 256 do gera_caminho_markov: para o estado da célula (0 fora,
+    1 dentro da região) e a máscara da sua vizinhança-8 (como em
+    _tabela_viabilidade_regiao), diz se trocar o estado da célula mantém o
+    contorno um único ciclo simples. A célula precisa ser um ponto simples
+    -- exatamente um grupo local dentro e um fora, o que preserva a região
+    conexa e sem buracos -- e a troca não pode criar vértice de grau 4 (os
+    quatro cantos da célula são os únicos vértices afetados).
+    """
+    # Cantos da célula: (ortogonal, diagonal, ortogonal) em posições do anel
+    cantos = ((0, 1, 2), (2, 3, 4), (4, 5, 6), (6, 7, 0))
+    tabela = np.zeros((2, 256), dtype=bool)
+    for m in range(256):
+        bits = [(m >> b) & 1 for b in range(8)]
+        if _grupos_no_anel(bits, 1) != 1 or _grupos_no_anel(bits, 0) != 1:
+            continue
+        for estado in (0, 1):
+            novo = 1 - estado
+            tabela[estado, m] = not any(
+                bits[d] == novo and bits[o1] == bits[o2] != novo
+                for o1, d, o2 in cantos)
+    return tabela
+
+
+_SIMPLES = _tabela_celulas_simples()
+
+
+class _ConjuntoIndexado:
+    """Conjunto com inserção, remoção e sorteio uniforme em O(1)."""
+
+    __slots__ = ('itens', 'posicao')
+
+    def __init__(self):
+        self.itens = []
+        self.posicao = {}
+
+    def __len__(self):
+        return len(self.itens)
+
+    def __contains__(self, x):
+        return x in self.posicao
+
+    def adiciona(self, x):
+        if x not in self.posicao:
+            self.posicao[x] = len(self.itens)
+            self.itens.append(x)
+
+    def remove(self, x):
+        i = self.posicao.pop(x)
+        ultimo = self.itens.pop()
+        if i < len(self.itens):
+            self.itens[i] = ultimo
+            self.posicao[ultimo] = i
+
+    def sorteia(self, u):
+        """Elemento na posição dada por u, uniforme em [0, 1)."""
+        return self.itens[int(u * len(self.itens))]
 
 
 # =============================================================================
@@ -392,10 +741,11 @@ def gera_caminho_hamiltoniano(tabuleiro: sl.Tabuleiro):
         ao longo desse lado.
 
     Como a árvore é conexa e acíclica, o resultado é sempre um único ciclo
-    simples cobrindo os lin*col vértices. Complexidade O(lin*col*log(lin*col)),
-    dominada pela árvore geradora mínima.
+    simples cobrindo os lin*col vértices. Árvore e contorno são operações em
+    arrays (gera_planos_hamiltoniano); só o percurso do ciclo é sequencial.
 
-    A aleatoriedade vem do numpy.random (controlável pela seed do Tabuleiro).
+    A aleatoriedade vem do gerador do tabuleiro (tabuleiro.rng, controlável
+    pela seed ou pelo rng do Tabuleiro).
 
     Parameters
     ----------
@@ -409,57 +759,114 @@ def gera_caminho_hamiltoniano(tabuleiro: sl.Tabuleiro):
     Lista no formato de passeio [(n,+1), ...] com os vértices do ciclo
     em ordem de percurso.
     """
-    lin, col = tabuleiro.lin, tabuleiro.col
-    if lin % 2 != 0 or col % 2 != 0:
-        raise ValueError('lin e col devem ser pares: um tabuleiro com número '
-                         'ímpar de vértices não admite ciclo hamiltoniano')
+    h, v = gera_planos_hamiltoniano(tabuleiro.lin, tabuleiro.col,
+                                    rng=tabuleiro.rng)
+    return _monta_caminho_de_planos(tabuleiro, h, v)
 
-    # Árvore geradora aleatória do grafo das supercélulas
-    H = nx.grid_2d_graph(lin // 2, col // 2)
-    pesos = {e: np.random.random() for e in H.edges}
-    nx.set_edge_attributes(H, pesos, 'weight')
-    T = nx.minimum_spanning_tree(H)
-
-    arestas = set()
-    def adiciona(a, b):
-        arestas.add(tuple(sorted((a, b))))
-
-    for I in range(lin // 2):
-        for J in range(col // 2):
-            l, c = 2 * I, 2 * J
-            # Vértices do bloco 2x2 da supercélula (I,J)
-            tl, tr = (l, c), (l, c + 1)
-            bl, br = (l + 1, c), (l + 1, c + 1)
-
-            # Lado de cima
-            if T.has_edge((I, J), (I - 1, J)):
-                adiciona(tl, (l - 1, c))
-                adiciona(tr, (l - 1, c + 1))
-            else:
-                adiciona(tl, tr)
 
-            # Lado de baixo
-            if T.has_edge((I, J), (I + 1, J)):
-                adiciona(bl, (l + 2, c))
-                adiciona(br, (l + 2, c + 1))
-            else:
-                adiciona(bl, br)
+def _arvore_geradora_aleatoria(nl, nc, rs=np.random):
+    """
+    Árvore geradora aleatória do grafo grade nl x nc: a árvore geradora
+    mínima com pesos uniformes sorteados de `rs`, pelo algoritmo de
+    Borůvka vetorizado (cada componente escolhe sua aresta de saída mais
+    leve; O(log(nl*nc)) rodadas de operações em arrays).
 
-            # Lado esquerdo
-            if T.has_edge((I, J), (I, J - 1)):
-                adiciona(tl, (l, c - 1))
-                adiciona(bl, (l + 1, c - 1))
-            else:
-                adiciona(tl, bl)
+    Returns
+    -------
+    Planos booleanos (th, tv): th[I,J] indica a aresta (I,J)-(I,J+1), matriz
+    nl x (nc-1), e tv[I,J] a aresta (I,J)-(I+1,J), matriz (nl-1) x nc.
+    """
+    n = nl * nc
+    ids = np.arange(n).reshape(nl, nc)
+    u = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    w = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    m = len(u)
+    # Posto de cada aresta na ordem dos pesos: chaves inteiras distintas
+    ordem = np.argsort(rs.random_sample(m), kind='stable')
+    posto = np.empty(m, dtype=np.int64)
+    posto[ordem] = np.arange(m)
+
+    na_arvore = np.zeros(m, dtype=bool)
+    comp = np.arange(n)
+    restantes = np.arange(m)
+    while True:
+        cu, cw = comp[u[restantes]], comp[w[restantes]]
+        externas = cu != cw
+        restantes, cu, cw = restantes[externas], cu[externas], cw[externas]
+        if not len(restantes):
+            break
+        # Aresta mais leve saindo de cada componente
+        melhor = np.full(n, m, dtype=np.int64)
+        np.minimum.at(melhor, cu, posto[restantes])
+        np.minimum.at(melhor, cw, posto[restantes])
+        cs = np.flatnonzero(melhor < m)
+        escolhidas = ordem[melhor[cs]]
+        na_arvore[escolhidas] = True
+        # Cada componente aponta para o vizinho pela aresta escolhida; os
+        # pares que escolheram a mesma aresta viram raiz no menor rótulo
+        a, b = comp[u[escolhidas]], comp[w[escolhidas]]
+        pai = np.arange(n)
+        pai[cs] = np.where(a == cs, b, a)
+        mutuos = (pai[pai[cs]] == cs) & (cs < pai[cs])
+        pai[cs[mutuos]] = cs[mutuos]
+        while True:
+            avo = pai[pai]
+            if np.array_equal(avo, pai):
+                break
+            pai = avo
+        comp = pai[comp]
 
-            # Lado direito
-            if T.has_edge((I, J), (I, J + 1)):
-                adiciona(tr, (l, c + 2))
-                adiciona(br, (l + 1, c + 2))
-            else:
-                adiciona(tr, br)
+    nh = nl * (nc - 1)
+    return na_arvore[:nh].reshape(nl, nc - 1), na_arvore[nh:].reshape(nl - 1, nc)
 
-    return _monta_caminho_de_arestas(tabuleiro, arestas)
+
+def gera_planos_hamiltoniano(lin, col, rng=None):
+    """
+    Planos de arestas (h, v) de um ciclo hamiltoniano aleatório lin x col,
+    sem montar o tabuleiro: o contorno da árvore geradora das supercélulas
+    2x2 "engrossada" (ver gera_caminho_hamiltoniano), calculado com
+    operações em arrays. Serve para tabuleiros muito grandes (testes de
+    carga, pôsteres).
+
+    Parameters
+    ----------
+    lin, col : int
+        Dimensões do tabuleiro, ambas pares.
+    rng : optional
+        Gerador dos pesos da árvore (ver main.normaliza_rng). Padrão None:
+        o estado global do numpy.random
+
+    Returns
+    -------
+    Tupla (h, v) no formato de Tabuleiro.arestas_h / arestas_v.
+    """
+    if lin % 2 != 0 or col % 2 != 0:
+        raise ValueError('lin e col devem ser pares: um tabuleiro com número '
+                         'ímpar de vértices não admite ciclo hamiltoniano')
+    nl, nc = lin // 2, col // 2
+    th, tv = _arvore_geradora_aleatoria(nl, nc, sl.normaliza_rng(rng))
+
+    # Lados de cada supercélula cruzados pela árvore
+    cima = np.zeros((nl, nc), dtype=bool)
+    baixo = np.zeros((nl, nc), dtype=bool)
+    esq = np.zeros((nl, nc), dtype=bool)
+    dir_ = np.zeros((nl, nc), dtype=bool)
+    cima[1:], baixo[:-1] = tv, tv
+    esq[:, 1:], dir_[:, :-1] = th, th
+
+    # Lado cruzado: as duas arestas paralelas que atravessam o lado;
+    # lado não cruzado: a aresta interna do bloco 2x2 ao longo dele
+    h = np.zeros((lin, col - 1), dtype=bool)
+    v = np.zeros((lin - 1, col), dtype=bool)
+    h[0::2, 0::2] = ~cima
+    h[1::2, 0::2] = ~baixo
+    h[0::2, 1::2] = th
+    h[1::2, 1::2] = th
+    v[0::2, 0::2] = ~esq
+    v[0::2, 1::2] = ~dir_
+    v[1::2, 0::2] = tv
+    v[1::2, 1::2] = tv
+    return h, v
 
 
 # =============================================================================
@@ -486,6 +893,10 @@ def gera_caminho_regiao(tabuleiro: sl.Tabuleiro
     O crescimento para quando o perímetro atinge densidade*lin*col vértices ou
     quando não há mais células viáveis para adicionar.
 
+    Os dois invariantes são testados só na vizinhança-8 da célula, e a
+    fronteira fica em baldes pelo ganho de perímetro, atualizados apenas nas
+    vizinhas da célula adicionada: cada passo custa O(1) amortizado.
+
     Parameters
     ----------
     tabuleiro : Tabuleiro
@@ -509,106 +920,221 @@ def gera_caminho_regiao(tabuleiro: sl.Tabuleiro
     n_cel_l, n_cel_c = lin - 1, col - 1
     alvo = densidade * lin * col
 
-    dentro = np.zeros((n_cel_l, n_cel_c), dtype=bool)
-
-    def valida(l, c):
-        return 0 <= l < n_cel_l and 0 <= c < n_cel_c
-
-    def vizinhos_dentro(l, c):
-        return sum(1 for vl, vc in ((l-1,c),(l+1,c),(l,c-1),(l,c+1))
-                   if valida(vl, vc) and dentro[vl, vc])
-
-    def sem_toque_de_canto(l, c):
-        # Toda célula diagonal dentro da região precisa compartilhar com
-        # (l,c) uma célula ortogonal que também esteja dentro da região
-        for dl, dc in ((-1,-1),(-1,1),(1,-1),(1,1)):
-            ld, cd = l + dl, c + dc
-            if valida(ld, cd) and dentro[ld, cd]:
-                ok1 = valida(l + dl, c) and dentro[l + dl, c]
-                ok2 = valida(l, c + dc) and dentro[l, c + dc]
-                if not (ok1 or ok2):
-                    return False
-        return True
-
-    def sem_buraco(l, c):
-        # Com (l,c) incluída, todas as células fora da região precisam
-        # continuar alcançáveis a partir da borda do tabuleiro (flood fill)
-        dentro[l, c] = True
-        fora_total = n_cel_l * n_cel_c - int(dentro.sum())
-        if fora_total == 0:
-            dentro[l, c] = False
-            return True
-
-        visitada = np.zeros_like(dentro)
-        pilha = [(bl, bc) for bl in range(n_cel_l) for bc in range(n_cel_c)
-                 if (bl in (0, n_cel_l-1) or bc in (0, n_cel_c-1))
-                 and not dentro[bl, bc]]
-        for celula in pilha:
-            visitada[celula] = True
-        while pilha:
-            pl, pc = pilha.pop()
-            for vl, vc in ((pl-1,pc),(pl+1,pc),(pl,pc-1),(pl,pc+1)):
-                if valida(vl, vc) and not dentro[vl, vc] and not visitada[vl, vc]:
-                    visitada[vl, vc] = True
-                    pilha.append((vl, vc))
-        dentro[l, c] = False
-        return int(visitada.sum()) == fora_total
+    # Células em arrays planos com uma moldura de células fora da região em
+    # volta do tabuleiro: a célula (l,c) fica na posição (l+1)*larg + c+1
+    larg = n_cel_c + 2
+    moldura = np.ones((n_cel_l + 2, larg), dtype=np.uint8)
+    moldura[1:-1, 1:-1] = 0
+    moldura = bytearray(moldura.tobytes())
+    dentro = bytearray(len(moldura))
+    vizinhos = bytearray(len(moldura))  # vizinhas ortogonais dentro
+    ortogonais = (-larg, larg, -1, 1)
+    # Vizinhança-8 em ordem circular: N, NE, L, SE, S, SO, O, NO
+    anel = (-larg, -larg+1, 1, larg+1, larg, larg-1, -1, -larg-1)
+    viavel = _VIAVEL_REGIAO
+
+    def mascara(i):
+        # bit b ligado se a posição anel[b] está dentro da região
+        n, s = i - larg, i + larg
+        return (dentro[n] | dentro[n+1] << 1 | dentro[i+1] << 2
+                | dentro[s+1] << 3 | dentro[s] << 4 | dentro[s-1] << 5
+                | dentro[i-1] << 6 | dentro[n-1] << 7)
+
+    # Fronteira em baldes pelo número k de vizinhas ortogonais dentro da
+    # região: adicionar a célula muda o perímetro em 4-2k, então o balde 1
+    # guarda as células de ganho máximo. Células que falham os invariantes
+    # ficam dormentes; como os testes só dependem da vizinhança-8, elas só
+    # voltam à fronteira quando uma vizinha-8 entra na região
+    baldes = [None] + [_ConjuntoIndexado() for _ in range(4)]
+    ativas = _ConjuntoIndexado()
+    dormentes = set()
+
+    def adiciona(i):
+        nonlocal perimetro
+        perimetro += 4 - 2*vizinhos[i]
+        dentro[i] = 1
+        if i in ativas:
+            ativas.remove(i)
+            baldes[vizinhos[i]].remove(i)
+        for o in ortogonais:
+            j = i + o
+            if moldura[j] or dentro[j]:
+                continue
+            k = vizinhos[j]
+            vizinhos[j] = k + 1
+            if j in ativas:
+                baldes[k].remove(j)
+                baldes[k+1].adiciona(j)
+            elif k == 0:
+                ativas.adiciona(j)
+                baldes[1].adiciona(j)
+        for o in anel:
+            j = i + o
+            if j in dormentes:
+                dormentes.remove(j)
+                ativas.adiciona(j)
+                baldes[vizinhos[j]].adiciona(j)
+
+    # Uniformes em [0, 1) sorteados em blocos do gerador do tabuleiro
+    rs = tabuleiro.rng
+    sorteios = []
+
+    def uniforme():
+        if not sorteios:
+            sorteios.extend(rs.random_sample(4096).tolist())
+        return sorteios.pop()
 
     # Célula inicial sorteada
-    l0 = np.random.randint(n_cel_l)
-    c0 = np.random.randint(n_cel_c)
-    dentro[l0, c0] = True
-    perimetro = 4
-    fronteira = {(vl, vc) for vl, vc in ((l0-1,c0),(l0+1,c0),(l0,c0-1),(l0,c0+1))
-                 if valida(vl, vc)}
-
-    while perimetro < alvo and fronteira:
-        # Adicionar uma célula com k vizinhos dentro da região altera o
-        # perímetro em 4-2k: células com 1 vizinho aumentam o perímetro
-        ganho_maximo = max(4 - 2*vizinhos_dentro(*cel) for cel in fronteira)
-        if np.random.random() < ganancia and ganho_maximo > 0:
-            candidatas = [cel for cel in fronteira
-                          if 4 - 2*vizinhos_dentro(*cel) == ganho_maximo]
+    l0 = rs.randint(n_cel_l)
+    c0 = rs.randint(n_cel_c)
+    perimetro = 0
+    adiciona((l0+1)*larg + c0+1)
+
+    while perimetro < alvo and ativas:
+        # Com probabilidade `ganancia` sorteia entre as células de ganho
+        # máximo (se houver); senão, entre todas as da fronteira
+        if uniforme() < ganancia and baldes[1]:
+            i = baldes[1].sorteia(uniforme())
         else:
-            candidatas = list(fronteira)
-
-        # Tenta as candidatas em ordem aleatória até achar uma viável;
-        # se nenhuma célula da fronteira for viável, para o crescimento
-        np.random.shuffle(candidatas)
-        candidatas += [cel for cel in fronteira if cel not in candidatas]
-        escolhida = None
-        for cel in candidatas:
-            if sem_toque_de_canto(*cel) and sem_buraco(*cel):
-                escolhida = cel
-                break
-        if escolhida is None:
-            break
-
-        el, ec = escolhida
-        perimetro += 4 - 2*vizinhos_dentro(el, ec)
-        dentro[el, ec] = True
-        fronteira.discard(escolhida)
-        for vl, vc in ((el-1,ec),(el+1,ec),(el,ec-1),(el,ec+1)):
-            if valida(vl, vc) and not dentro[vl, vc]:
-                fronteira.add((vl, vc))
+            i = ativas.sorteia(uniforme())
+        if viavel[mascara(i)]:
+            adiciona(i)
+        else:
+            ativas.remove(i)
+            baldes[vizinhos[i]].remove(i)
+            dormentes.add(i)
 
     # O contorno da região são as arestas entre uma célula dentro e uma
-    # célula fora da região (ou a borda do tabuleiro)
-    arestas = set()
-    for l in range(n_cel_l):
-        for c in range(n_cel_c):
-            if not dentro[l, c]:
-                continue
-            if not (valida(l-1, c) and dentro[l-1, c]):
-                arestas.add(((l, c), (l, c+1)))
-            if not (valida(l+1, c) and dentro[l+1, c]):
-                arestas.add(((l+1, c), (l+1, c+1)))
-            if not (valida(l, c-1) and dentro[l, c-1]):
-                arestas.add(((l, c), (l+1, c)))
-            if not (valida(l, c+1) and dentro[l, c+1]):
-                arestas.add(((l, c+1), (l+1, c+1)))
+    # célula fora da região (ou a moldura)
+    d = np.frombuffer(dentro, dtype=np.uint8).reshape(n_cel_l + 2, larg)
+    h = d[:-1, 1:-1] != d[1:, 1:-1]
+    v = d[1:-1, :-1] != d[1:-1, 1:]
+    return _monta_caminho_de_planos(tabuleiro, h, v)
 
-    return _monta_caminho_de_arestas(tabuleiro, arestas)
+
+# =============================================================================
+# Cadeia de Markov de trocas de células: caminhos com formas variadas
+# =============================================================================
+def gera_caminho_markov(tabuleiro : sl.Tabuleiro
+                        ,densidade : float = 0.5
+                        ,varreduras: int   = 20
+                        ,partida   : sl.Tabuleiro = None
+                        ,rigidez   : float = 1.0):
+    """
+    Gera um caminho fechado por uma cadeia de Markov sobre a região interna
+    do caminho: a partir de um caminho inicial, cada passo troca uma célula
+    de dentro para fora da região (ou o contrário) quando a troca mantém o
+    contorno um único ciclo simples. Os geradores construtivos têm viés de
+    forma (serpentes do crescimento de região, corredores 2x2 alinhados do
+    hamiltoniano); algumas varreduras da cadeia desfazem esse viés.
+
+    A troca é decidida só pela vizinhança-8 da célula (tabela _SIMPLES), e
+    células com o mesmo (l mod 3, c mod 3) não compartilham vizinhança, então
+    cada uma das 9 classes é atualizada de uma vez com operações em arrays.
+    Uma varredura passa pelas 9 classes. O perímetro (número de vértices do
+    ciclo) varia de -2, 0 ou +2 por troca; trocas que afastam o perímetro do
+    alvo são aceitas com probabilidade exp(-rigidez*afastamento), e no fim a
+    cadeia só aceita trocas em direção ao alvo até atingi-lo. Com densidade
+    1.0 só seriam aceitas trocas que mantêm o perímetro, mas num ciclo
+    hamiltoniano toda troca de célula descobre um vértice ou cria um de
+    grau 4: o ciclo de partida volta inalterado.
+
+    Parameters
+    ----------
+    tabuleiro : Tabuleiro
+        Tabuleiro vazio onde o caminho será gerado
+    densidade : float, optional
+        Densidade alvo (fração dos vértices visitados pelo caminho).
+        Padrão 0.5
+    varreduras : int, optional
+        Número de varreduras da cadeia. Padrão 20
+    partida : Tabuleiro, optional
+        Tabuleiro do mesmo tamanho com o caminho inicial (por exemplo, o de
+        gera_Tabuleiro2). Padrão: contorno de gera_caminho_regiao com a
+        densidade alvo
+    rigidez : float, optional
+        Quanto a cadeia penaliza afastar o perímetro do alvo. Padrão 1.0
+
+    Returns
+    -------
+    Lista no formato de passeio [(n,+1), ...] com os vértices do ciclo
+    em ordem de percurso.
+    """
+    lin, col = tabuleiro.lin, tabuleiro.col
+    n_cel_l, n_cel_c = lin - 1, col - 1
+    alvo = densidade * lin * col
+    rs = tabuleiro.rng
+
+    if partida is None:
+        partida = sl.Tabuleiro(lin=lin, col=col, rng=rs)
+        gera_caminho_regiao(partida, densidade=densidade)
+
+    # Região interna: a célula (l,c) está dentro se há um número ímpar de
+    # arestas verticais do caminho à sua esquerda. Moldura fora, como no
+    # gera_caminho_regiao
+    d = np.zeros((n_cel_l + 2, n_cel_c + 2), dtype=np.uint8)
+    d[1:-1, 1:-1] = np.logical_xor.accumulate(partida.arestas_v[:, :-1],
+                                              axis=1)
+    perimetro = partida.numero_arestas()
+
+    anel = ((-1,0),(-1,1),(0,1),(1,1),(1,0),(1,-1),(0,-1),(-1,-1))
+
+    def fatia(a, b, dl, dc):
+        # Células da classe (a, b), deslocadas de (dl, dc), na matriz d
+        return d[a+1+dl : n_cel_l+1+dl : 3, b+1+dc : n_cel_c+1+dc : 3]
+
+    def atualiza_classe(a, b, beta):
+        nonlocal perimetro
+        centro = fatia(a, b, 0, 0)
+        if not centro.size:
+            return
+        mascara = np.zeros(centro.shape, dtype=np.intp)
+        for bit, (dl, dc) in enumerate(anel):
+            mascara |= fatia(a, b, dl, dc).astype(np.intp) << bit
+        # Vizinhas ortogonais dentro: bits 0, 2, 4 e 6
+        k = sum((mascara >> bit) & 1 for bit in (0, 2, 4, 6))
+        delta = np.where(centro == 1, 2*k - 4, 4 - 2*k)
+
+        afasta = np.abs(perimetro + delta - alvo) - abs(perimetro - alvo)
+        with np.errstate(invalid='ignore', over='ignore'):
+            p_aceita = np.where(afasta <= 0, 1.0, np.exp(-beta * afasta))
+        u = rs.random_sample((2,) + centro.shape)
+        troca = _SIMPLES[centro, mascara] & (u[0] < 0.5) & (u[1] < p_aceita)
+
+        # Todas as trocas da classe foram avaliadas com o mesmo perímetro:
+        # se juntas passam do alvo, descarta as sobrando em direção a ele
+        total = int(delta[troca].sum())
+        sentido = 1 if perimetro < alvo else -1
+        excesso = sentido * (perimetro + total - alvo)
+        if perimetro != alvo and excesso >= 2:
+            rumo = np.flatnonzero((troca & (delta == 2*sentido)).ravel())
+            sobra = rs.choice(rumo, min(int(excesso // 2), len(rumo)),
+                                     replace=False)
+            troca.ravel()[sobra] = False
+            total = int(delta[troca].sum())
+
+        centro[troca] ^= 1
+        perimetro += total
+
+    # Com densidade 1.0 não há para onde crescer: só trocas neutras
+    beta = np.inf if densidade >= 1.0 else rigidez
+    classes = [(a, b) for a in range(3) for b in range(3)]
+    for _ in range(varreduras):
+        for a, b in classes:
+            atualiza_classe(a, b, beta)
+
+    # Ajuste final: só trocas em direção ao alvo, até chegar a menos de um
+    # passo dele ou uma varredura inteira não mudar nada
+    while abs(perimetro - alvo) >= 2:
+        antes = perimetro
+        for a, b in classes:
+            atualiza_classe(a, b, np.inf)
+        if perimetro == antes:
+            break
+
+    h = d[:-1, 1:-1] != d[1:, 1:-1]
+    v = d[1:-1, :-1] != d[1:-1, 1:]
+    return _monta_caminho_de_planos(tabuleiro, h, v)
 
 
 # =============================================================================
@@ -617,6 +1143,8 @@ def gera_caminho_regiao(tabuleiro: sl.Tabuleiro
 def gera_Tabuleiro2(densidade : float = 0.3
                     ,dicas    : bool  = True
                     ,seed     : int   = None
+                    ,varreduras : int = 0
+                    ,rng               = None
                     ,**kwargs):
     """
     Versão construtiva de gera_Tabuleiro: gera o caminho fechado em uma
@@ -637,7 +1165,14 @@ def gera_Tabuleiro2(densidade : float = 0.3
     dicas : bool, optional
         Indica se as dicas do tabuleiro devem ser preenchidas. Padrão True
     seed : int, optional
-        Seed do numpy.random, passada ao construtor do Tabuleiro
+        Seed do gerador do tabuleiro, passada ao construtor do Tabuleiro
+    rng : optional
+        Gerador explícito, passado ao construtor do Tabuleiro (ver
+        main.normaliza_rng). Tem precedência sobre seed. Padrão None
+    varreduras : int, optional
+        Se maior que zero, o caminho construído é só o ponto de partida de
+        gera_caminho_markov, que roda esse número de varreduras para variar
+        a forma. Padrão 0
     **kwargs :
         Variáveis para criação do tabuleiro (lin, col). Consultar a
         documentação da classe Tabuleiro()
@@ -652,12 +1187,19 @@ def gera_Tabuleiro2(densidade : float = 0.3
     lin = kwargs['lin'] if 'lin' in kwargs else tab_aux.lin
     col = kwargs['col'] if 'col' in kwargs else tab_aux.col
 
-    tabuleiro = sl.Tabuleiro(lin=lin, col=col, seed=seed)
+    tabuleiro = sl.Tabuleiro(lin=lin, col=col, seed=seed, rng=rng)
+    partida = tabuleiro
+    if varreduras > 0:
+        partida = sl.Tabuleiro(lin=lin, col=col, rng=tabuleiro.rng)
 
     if densidade >= 1.0:
-        passeio = gera_caminho_hamiltoniano(tabuleiro)
+        passeio = gera_caminho_hamiltoniano(partida)
     else:
-        passeio = gera_caminho_regiao(tabuleiro, densidade=densidade)
+        passeio = gera_caminho_regiao(partida, densidade=densidade)
+
+    if varreduras > 0:
+        passeio = gera_caminho_markov(tabuleiro, min(densidade, 1.0),
+                                      varreduras, partida=partida)
 
     if dicas:
         tabuleiro.preenche_dicas()
@@ -668,7 +1210,67 @@ def gera_Tabuleiro2(densidade : float = 0.3
 # =============================================================================
 # Fábrica do oráculo de unicidade (CP-SAT se disponível, senão puro-Python)
 # =============================================================================
-def _novo_oraculo(lin, col, dicas, max_nos, motor, solucao_hint=None):
+_NOS_ATALHO = 200   # orçamento de nós da busca curta antes do CP-SAT (0: só
+                    # a propagação)
+
+
+class _OraculoComAtalho:
+    """
+    Frente do oráculo CP-SAT com a interface conta_solucoes/completa.
+
+    Antes de montar o modelo do CP-SAT, tenta decidir o puzzle com o solver
+    puro-Python: propagação + padrões fixos (Solver.decide_por_propagacao)
+    e, se ela empacar, uma busca curta de até `max_nos` nós (padrão
+    _NOS_ATALHO; 0 pula a busca). Boa parte das remoções testadas pelos
+    redutores se decide assim em poucos milissegundos, contra dezenas a
+    centenas de milissegundos de uma chamada ao CP-SAT. O CP-SAT (criado
+    por `fabrica`) só é montado e chamado quando a busca curta é
+    inconclusiva; fica em self.oraculo (None se o atalho decidiu).
+
+    A propagação sozinha decide pouco nos redutores: tirada meia dúzia de
+    dicas ela empaca, e quase toda chamada iria ao CP-SAT. A busca curta
+    custa poucos milissegundos mesmo quando é jogada fora (teste_puzzle,
+    seção 10, compara as duas opções).
+
+    Com canonico=True (modo determinístico do CP-SAT), só o veredito de
+    unicidade do atalho é aceito: contraexemplos sempre vêm do CP-SAT, que
+    os devolve na ordem canônica.
+    """
+
+    def __init__(self, lin, col, dicas, fabrica, max_nos=None,
+                 canonico=False, controle=None):
+        self.lin = lin
+        self.col = col
+        self.dicas = dicas
+        self.fabrica = fabrica
+        self.max_nos = _NOS_ATALHO if max_nos is None else max_nos
+        self.canonico = canonico
+        self.controle = controle
+        self.oraculo = None
+        self.num_solucoes = 0
+        self.solucoes = []
+        self.completa = True
+
+    def conta_solucoes(self, limite=2):
+        # conta_solucoes do puro-Python já propaga antes de buscar: se a
+        # propagação decide, nem a busca curta é feita
+        s = sv.Solver(self.lin, self.col, self.dicas, max_nos=self.max_nos
+                      ,controle=self.controle)
+        if self.max_nos > 0:
+            s.conta_solucoes(limite)
+        elif not s.decide_por_propagacao():
+            s.completa = False
+        if not s.completa or (self.canonico and s.num_solucoes > 1):
+            s = self.oraculo = self.fabrica()
+            s.conta_solucoes(limite)
+        self.num_solucoes = s.num_solucoes
+        self.solucoes = s.solucoes
+        self.completa = s.completa
+        return self.num_solucoes, self.solucoes
+
+
+def _novo_oraculo(lin, col, dicas, max_nos, motor, solucao_hint=None,
+                  deterministico=False, controle=None):
     """
     Retorna um solver com a interface conta_solucoes/completa. motor:
     'auto' escolhe pelo tamanho do tabuleiro (em tabuleiros pequenos o
@@ -676,17 +1278,448 @@ def _novo_oraculo(lin, col, dicas, max_nos, motor, solucao_hint=None):
     instalado, com fallback para o puro-Python); 'cpsat' exige OR-Tools;
     'python' força o solver puro-Python. solucao_hint é a solução
     conhecida do puzzle, repassada ao CP-SAT como palpite inicial.
+    deterministico liga o modo canônico do CP-SAT (soluções alternativas
+    reprodutíveis em qualquer número de núcleos); o puro-Python já é
+    determinístico.
+
+    O CP-SAT vem atrás de _OraculoComAtalho: só é montado se a propagação
+    e uma busca curta do puro-Python não decidirem o puzzle.
+
+    controle (solver.Controle) registra a chamada (e levanta
+    solver.Cancelado se o trabalho foi interrompido) e segue para o
+    oráculo, que o confere durante a busca.
     """
+    if controle is not None:
+        controle.chamada(dicas)
     usa_cpsat = (motor == 'cpsat'
                  or (motor == 'auto' and lin*col > 150))
     if usa_cpsat:
         try:
             import solver_cpsat as sc
-            return sc.SolverCpSat(lin, col, dicas, solucao_hint=solucao_hint)
+            return _OraculoComAtalho(lin, col, dicas, functools.partial(
+                sc.SolverCpSat, lin, col, dicas, solucao_hint=solucao_hint
+                ,deterministico=deterministico, controle=controle)
+                ,canonico=deterministico, controle=controle)
         except ImportError:
             if motor == 'cpsat':
                 raise
-    return sv.Solver(lin, col, dicas, max_nos=max_nos)
+    return sv.Solver(lin, col, dicas, max_nos=max_nos, controle=controle)
+
+
+def _fase(controle, fase):
+    """Anota a fase no controle (se houver) e o confere."""
+    if controle is not None:
+        controle.muda_fase(fase)
+
+
+def _nova_reducao(controle):
+    """Desliga `truncado` no começo de uma redução: o mesmo controle pode
+    ter passado por chamadas anteriores, e o flag diz respeito só a esta."""
+    if controle is not None:
+        controle.truncado = False
+
+
+# =============================================================================
+# Memória dos vereditos de unicidade (compartilhada entre os redutores)
+# =============================================================================
+class MemoUnicidade:
+    """
+    Memória LRU dos vereditos do oráculo, com inferência por monotonicidade.
+
+    A chave de um tabuleiro é um hash (blake2b) de (lin, col, laço alvo,
+    orçamento do oráculo); um puzzle desse tabuleiro é só a máscara das
+    células com dica (as dicas de um redutor são sempre as do alvo),
+    guardada como inteiro Python. Para cada tabuleiro ficam os conjuntos de
+    dicas já provados únicos e os já provados ambíguos, e a monotonicidade
+    responde sem chamar motor algum:
+
+      - superconjunto de um conjunto único é único (dicas só restringem);
+      - subconjunto de um conjunto ambíguo é ambíguo (a alternativa continua
+        satisfazendo todas as dicas que sobraram).
+
+    Só guarda vereditos concluídos (inconclusivos não entram). Cada lista
+    mantém apenas os extremos úteis (únicos minimais, ambíguos maximais),
+    limitada a `max_conjuntos`; no máximo `max_tabuleiros` tabuleiros ficam
+    na memória (LRU). As listas são tuplas trocadas a cada registro, nunca
+    alteradas: exporta() devolve as próprias tuplas, sem copiar. Protegida
+    por trava, pode ser usada entre threads.
+
+    Cada chamada de redutor (e do gera_Puzzle) cria a sua memória, de modo
+    que uma redução semeada dá sempre o mesmo puzzle, não importa o que
+    rodou antes no processo. Passar a mesma instância em `memo` a várias
+    chamadas (ex.: o mesmo tabuleiro em várias dificuldades) reaproveita os
+    vereditos entre elas -- opcional, porque um veredito herdado pode
+    decidir uma consulta que o oráculo desta chamada deixaria inconclusiva,
+    e então o resultado passa a depender das chamadas anteriores. O
+    `orcamento` (max_nos, motor) entra na chave: vereditos obtidos com
+    outro orçamento não se misturam.
+    """
+
+    def __init__(self, max_tabuleiros=32, max_conjuntos=1024):
+        self.max_tabuleiros = max_tabuleiros
+        self.max_conjuntos = max_conjuntos
+        self._tabuleiros = collections.OrderedDict()
+        self._trava = threading.Lock()
+        self.consultas = 0
+        self.acertos = 0
+
+    @staticmethod
+    def _chave(lin, col, solucao, orcamento):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(np.array([lin, col] + sorted(solucao), dtype=np.int64)
+                 .tobytes())
+        h.update(repr(orcamento).encode())
+        return h.digest()
+
+    @staticmethod
+    def _mascara(puzzle):
+        bits = np.packbits(np.asarray(puzzle).ravel() >= 0, bitorder='little')
+        return int.from_bytes(bits.tobytes(), 'little')
+
+    def consulta(self, lin, col, solucao, puzzle, orcamento=None):
+        """True (único), False (ambíguo) ou None (desconhecido)."""
+        chave = self._chave(lin, col, solucao, orcamento)
+        m = self._mascara(puzzle)
+        with self._trava:
+            self.consultas += 1
+            entrada = self._tabuleiros.get(chave)
+            if entrada is None:
+                return None
+            self._tabuleiros.move_to_end(chave)
+            unicos, ambiguos = entrada
+            if any(u & ~m == 0 for u in unicos):
+                self.acertos += 1
+                return True
+            if any(m & ~a == 0 for a in ambiguos):
+                self.acertos += 1
+                return False
+        return None
+
+    def registra(self, lin, col, solucao, puzzle, unico, orcamento=None):
+        chave = self._chave(lin, col, solucao, orcamento)
+        m = self._mascara(puzzle)
+        with self._trava:
+            unicos, ambiguos = self._tabuleiros.get(chave, ((), ()))
+            if unico:
+                unicos = (tuple(u for u in unicos if m & ~u != 0)
+                          + (m,))[-self.max_conjuntos:]
+            else:
+                ambiguos = (tuple(a for a in ambiguos if a & ~m != 0)
+                            + (m,))[-self.max_conjuntos:]
+            self._tabuleiros[chave] = (unicos, ambiguos)
+            self._tabuleiros.move_to_end(chave)
+            if len(self._tabuleiros) > self.max_tabuleiros:
+                self._tabuleiros.popitem(last=False)
+
+    def registra_contagem(self, lin, col, solucao, puzzle, oraculo,
+                          orcamento=None):
+        """Registra o resultado de oraculo.conta_solucoes (se concluído)."""
+        if oraculo.num_solucoes > 1:
+            self.registra(lin, col, solucao, puzzle, False, orcamento)
+        elif oraculo.num_solucoes == 1 and oraculo.completa:
+            self.registra(lin, col, solucao, puzzle, True, orcamento)
+
+    def exporta(self, lin, col, solucao, orcamento=None):
+        """As tuplas (unicos, ambiguos) de máscaras de um tabuleiro (vazias
+        se ele não está na memória). Registros posteriores não as alteram."""
+        with self._trava:
+            return self._tabuleiros.get(
+                self._chave(lin, col, solucao, orcamento), ((), ()))
+
+    def importa(self, lin, col, solucao, unicos, ambiguos, orcamento=None):
+        """Troca as entradas de um tabuleiro pelas máscaras dadas (formato
+        de exporta)."""
+        chave = self._chave(lin, col, solucao, orcamento)
+        with self._trava:
+            self._tabuleiros[chave] = (tuple(unicos), tuple(ambiguos))
+            self._tabuleiros.move_to_end(chave)
+            if len(self._tabuleiros) > self.max_tabuleiros:
+                self._tabuleiros.popitem(last=False)
+
+    def limpa(self):
+        with self._trava:
+            self._tabuleiros.clear()
+            self.consultas = 0
+            self.acertos = 0
+
+
+def _conta_com_memo(lin, col, puzzle, solucao, max_nos, motor, controle=None,
+                    memo=None):
+    """(n, completa) do teste de unicidade, consultando `memo`
+    (MemoUnicidade; None: sem memória) antes do oráculo (um veredito
+    inferido conta como n=1 ou n=2)."""
+    veredito = (None if memo is None
+                else memo.consulta(lin, col, solucao, puzzle, (max_nos, motor)))
+    if veredito is not None:
+        return (1 if veredito else 2), True
+    s = _novo_oraculo(lin, col, puzzle, max_nos, motor, solucao
+                      ,controle=controle)
+    n, _ = s.conta_solucoes(limite=2)
+    if memo is not None:
+        memo.registra_contagem(lin, col, solucao, puzzle, s, (max_nos, motor))
+    return n, s.completa
+
+
+# =============================================================================
+# Pré-teste local da unicidade do mapa completo de dicas
+# =============================================================================
+def _tabela_trocas_vertice():
+    """
+    Tabela 3 x 3 x 5 x 2 do _arestas_trocaveis: para um vértice com `k`
+    arestas do laço já fora de D, `a` arestas do laço e `b` arestas fora do
+    laço ainda livres, diz se alguma aresta livre do laço ([..., 0]) ou
+    fora dele ([..., 1]) pode estar em D. D passa pelo vértice com grau par
+    e o grau do vértice depois da troca precisa continuar 0 ou 2.
+    """
+    tabela = np.zeros((3, 3, 5, 2), dtype=bool)
+    for k in range(3):
+        for a in range(3 - k):
+            if k + a not in (0, 2):
+                continue
+            for b in range(5 - k - a):
+                for da in range(a + 1):
+                    for db in range(b + 1):
+                        if da + db == 0 or (da + db) % 2:
+                            continue
+                        if k + a - da + db in (0, 2):
+                            tabela[k, a, b, 0] |= da > 0
+                            tabela[k, a, b, 1] |= db > 0
+    return tabela
+
+
+_TROCAS_VERTICE = _tabela_trocas_vertice()
+
+
+def _arestas_trocaveis(h, v):
+    """
+    Arestas que ainda podem estar na diferença simétrica D entre o laço dos
+    planos (h, v) e outro laço com o mesmo mapa COMPLETO de dicas.
+
+    Com todas as células com dica, D obedece a regras locais: em cada
+    célula, D troca tantas arestas do laço quanto de fora dele (a contagem
+    não muda); em cada vértice, D tem grau par e o grau do laço continua 0
+    ou 2. As duas regras são aplicadas em janelas vetorizadas sobre os
+    planos até um ponto fixo, descartando as arestas que não podem estar
+    em D -- uma célula cujas arestas livres estão todas dentro (ou todas
+    fora) do laço, por exemplo, não tem como se equilibrar.
+
+    Consequência das regras: a linha mais alta tocada por D precisa ser a
+    borda do tabuleiro (a célula acima de uma aresta horizontal de D no
+    topo teria uma única aresta trocada), e o mesmo vale para os outros
+    três lados. Não há troca local de dicas num mapa completo (blocos 2x2
+    trocáveis, etc.): toda ambiguidade atravessa o tabuleiro inteiro.
+
+    Returns
+    -------
+    Planos booleanos (livre_h, livre_v) no formato de (h, v). Se os dois
+    são todos False, o laço é a única solução do mapa completo.
+    """
+    h = np.asarray(h, dtype=bool)
+    v = np.asarray(v, dtype=bool)
+    lin, col = h.shape[0], v.shape[1]
+
+    def nos_vertices(ph, pv):
+        # (4, lin, col): aresta à esquerda, à direita, acima e abaixo
+        o = np.zeros((4, lin, col), dtype=bool)
+        o[0, :, 1:] = ph
+        o[1, :, :-1] = ph
+        o[2, 1:] = pv
+        o[3, :-1] = pv
+        return o
+
+    no_laco = nos_vertices(h, v)
+    lados = (h[:-1], h[1:], v[:, :-1], v[:, 1:])
+    livre_h = np.ones_like(h)
+    livre_v = np.ones_like(v)
+    livres = (livre_h[:-1], livre_h[1:], livre_v[:, :-1], livre_v[:, 1:])
+    while True:
+        antes = np.count_nonzero(livre_h) + np.count_nonzero(livre_v)
+        # Células: D precisa de ao menos uma aresta livre de cada lado
+        dentro = sum((l & e).view(np.uint8) for l, e in zip(livres, lados))
+        fora = sum((l & ~e).view(np.uint8) for l, e in zip(livres, lados))
+        travada = (dentro == 0) | (fora == 0)
+        for l in livres:
+            l &= ~travada
+        # Vértices: consulta a tabela pelo estado das quatro incidentes
+        livre = nos_vertices(livre_h, livre_v)
+        k = (no_laco & ~livre).sum(axis=0)
+        a = (no_laco & livre).sum(axis=0)
+        b = (~no_laco & livre).sum(axis=0)
+        pode = _TROCAS_VERTICE[k, a, b]
+        ok = np.where(no_laco, pode[..., 0], pode[..., 1])
+        livre_h &= ok[0, :, 1:] & ok[1, :, :-1]
+        livre_v &= ok[2, 1:] & ok[3, :-1]
+        if np.count_nonzero(livre_h) + np.count_nonzero(livre_v) == antes:
+            return livre_h, livre_v
+
+
+def certifica_mapa_completo(tabuleiro: sl.Tabuleiro):
+    """
+    Pré-teste barato da unicidade do mapa completo de dicas do tabuleiro:
+    True quando as regras locais de _arestas_trocaveis já eliminam toda
+    troca possível -- o laço é a única solução, sem chamar o solver. False
+    não prova ambiguidade (só que o teste local não decide); o oráculo
+    continua necessário nesse caso.
+
+    Decide quase todos os laços de regiões e da cadeia de Markov; nos
+    hamiltonianos (todo vértice com grau 2) costuma ficar indeciso.
+    """
+    livre_h, livre_v = _arestas_trocaveis(tabuleiro.arestas_h
+                                          ,tabuleiro.arestas_v)
+    return not (livre_h.any() or livre_v.any())
+
+
+def _confere_mapa_completo(tabuleiro, alvo, solucao, max_nos, motor,
+                           controle=None, memo=None):
+    """Número de soluções (1 ou mais) do mapa completo de dicas `alvo`:
+    certifica_mapa_completo primeiro, o oráculo só se ele não decidir."""
+    lin, col = tabuleiro.lin, tabuleiro.col
+    _fase(controle, 'mapa')
+    if certifica_mapa_completo(tabuleiro):
+        if memo is not None:
+            memo.registra(lin, col, solucao, alvo, True, (max_nos, motor))
+        return 1
+    n, _ = _conta_com_memo(lin, col, alvo, solucao, max_nos, motor, controle
+                           ,memo)
+    return n
+
+
+# =============================================================================
+# Checkpoints das reduções longas
+# =============================================================================
+def _estado_rng(estado):
+    """Estado do gerador (get_state(legacy=False) de um RandomState ou do
+    módulo np.random) em JSON."""
+    return json.dumps(estado, default=lambda a: np.asarray(a).tolist())
+
+
+def _restaura_rng(rs, texto):
+    """Põe em `rs` o estado de _estado_rng; se o BitGenerator é outro,
+    devolve um RandomState novo com aquele estado."""
+    estado = json.loads(texto)
+    if rs.get_state(legacy=False)['bit_generator'] != estado['bit_generator']:
+        rs = np.random.RandomState(getattr(np.random
+                                           ,estado['bit_generator'])())
+    rs.set_state(estado)
+    return rs
+
+
+class _Checkpoint:
+    """
+    Ponto de retomada de uma redução longa (reduz_dicas, reduz_guloso) num
+    arquivo .npz comprimido.
+
+    O redutor chama marca() no topo de cada passo do laço com o estado que
+    basta para continuar dali: dicas atuais, posição na ordem sorteada das
+    células, cache de contraexemplos, estado do gerador e as entradas do
+    MemoUnicidade deste tabuleiro (que também decidem vereditos). A marca
+    guarda só referências baratas -- o tamanho das listas que só crescem
+    (cache, removidas), as tuplas imutáveis do memo e o estado cru do
+    gerador -- e o retrato completo é montado em grava(). Ela vai para o
+    disco a cada `intervalo` segundos (gravação atômica: arquivo
+    temporário + os.replace) e, de novo, se a redução é interrompida por
+    solver.Cancelado (inclusive o prazo) ou KeyboardInterrupt. Terminada a
+    redução sem corte, o arquivo é apagado.
+
+    Com caminho None, tudo vira no-op.
+    """
+
+    def __init__(self, caminho, intervalo, parametros, alvo, solucao, memo,
+                 controle=None):
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self.parametros = parametros
+        self.alvo = np.asarray(alvo)
+        self.solucao = frozenset(solucao)
+        self.memo = memo
+        self.orcamento = (parametros['max_nos'], parametros['motor'])
+        self.controle = controle
+        self.estado = None
+        self._marca = None
+        self._ultima = time.monotonic()
+        if caminho is not None and os.path.exists(caminho):
+            self.estado = self._le()
+
+    def _le(self):
+        with np.load(self.caminho) as f:
+            dados = {k: f[k] for k in f.files}
+        outro = json.loads(str(dados['parametros']))
+        if (outro != json.loads(json.dumps(self.parametros))
+                or not np.array_equal(dados['alvo'], self.alvo)
+                or frozenset(dados['solucao'].tolist()) != self.solucao):
+            raise ValueError('{} é o checkpoint de outra redução ({})'
+                             .format(self.caminho, outro))
+        lin, col = self.parametros['lin'], self.parametros['col']
+        self.memo.importa(
+            lin, col, self.solucao
+            ,*([int.from_bytes(m.tobytes(), 'little') for m in dados[k]]
+               for k in ('memo_unicos', 'memo_ambiguos'))
+            ,orcamento=self.orcamento)
+        return dados
+
+    def marca(self, rs, **estado):
+        """Guarda o estado do começo de um passo (e grava se já deu o
+        intervalo). cache e removidas são listas que só crescem; ordem não
+        muda depois de sorteada."""
+        if self.caminho is None:
+            return
+        lin, col = self.parametros['lin'], self.parametros['col']
+        estado.setdefault('cache', [])
+        for k in ('cache', 'removidas'):
+            if k in estado:
+                estado[k] = (estado[k], len(estado[k]))
+        estado['puzzle'] = estado['puzzle'].copy()
+        estado['rng'] = rs.get_state(legacy=False)
+        estado['memo'] = self.memo.exporta(lin, col, self.solucao
+                                           ,self.orcamento)
+        self._marca = estado
+        if time.monotonic() - self._ultima >= self.intervalo:
+            self.grava()
+
+    def grava(self):
+        if self.caminho is None or self._marca is None:
+            return
+        lin, col = self.parametros['lin'], self.parametros['col']
+        n_bytes = ((lin-1)*(col-1) + 7) // 8
+        marca = dict(self._marca)
+        unicos, ambiguos = marca.pop('memo')
+        for k in ('cache', 'removidas'):
+            if k in marca:
+                lista, n = marca[k]
+                marca[k] = lista[:n]
+        cache = marca.pop('cache')
+        dados = {'parametros': np.array(json.dumps(self.parametros))
+                 ,'alvo': self.alvo.astype(np.int8)
+                 ,'solucao': np.array(sorted(self.solucao), dtype=np.int64)
+                 ,'rng': np.array(_estado_rng(marca.pop('rng')))
+                 ,'puzzle': marca.pop('puzzle').astype(np.int8)
+                 ,'cache': np.array(cache, dtype=np.int8)
+                 .reshape(len(cache), lin-1, col-1)}
+        for k, mascaras in (('memo_unicos', unicos)
+                            ,('memo_ambiguos', ambiguos)):
+            dados[k] = np.frombuffer(
+                b''.join(m.to_bytes(n_bytes, 'little') for m in mascaras)
+                ,dtype=np.uint8).reshape(len(mascaras), n_bytes)
+        for k, v in marca.items():   # fase, posicao, ordem, removidas
+            dados[k] = np.array(v, dtype=np.int32)
+        temporario = self.caminho + '.tmp'
+        with open(temporario, 'wb') as f:
+            np.savez_compressed(f, **dados)
+        os.replace(temporario, self.caminho)
+        self._ultima = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, erro, tb):
+        if self.caminho is None:
+            return
+        truncado = self.controle is not None and self.controle.truncado
+        if tipo is None and not truncado:
+            if os.path.exists(self.caminho):
+                os.remove(self.caminho)
+        elif truncado or issubclass(tipo, (sv.Cancelado, KeyboardInterrupt)):
+            self.grava()
 
 
 # =============================================================================
@@ -698,7 +1731,14 @@ def reduz_dicas(tabuleiro
                 ,semente  : float = 0.5
                 ,max_nos  : int   = 15000
                 ,motor    : str   = 'auto'
-                ,verbose  : bool  = False):
+                ,verbose  : bool  = False
+                ,deterministico : bool = False
+                ,ordem    : str   = 'aleatoria'
+                ,rng               = None
+                ,controle          = None
+                ,checkpoint        = None
+                ,intervalo_checkpoint : float = 60.0
+                ,memo              = None):
     """
     Calcula um subconjunto pequeno das dicas do tabuleiro que ainda define
     o caminho gerado como ÚNICA solução do puzzle.
@@ -756,6 +1796,39 @@ def reduz_dicas(tabuleiro
         senão o solver puro-Python), 'cpsat' ou 'python'. Padrão 'auto'
     verbose : bool, optional
         Se True, imprime o progresso. Padrão False
+    deterministico : bool, optional
+        Se True, o CP-SAT devolve contraexemplos canônicos (ver
+        solver_cpsat.SolverCpSat), de modo que a mesma seed gera o mesmo
+        puzzle em qualquer número de núcleos. Padrão False
+    ordem : str, optional
+        Ordem da minimização: 'aleatoria' ou 'forca' (dicas com mais cara
+        de redundantes primeiro; ver _ordena_celulas). Padrão 'aleatoria'
+    rng : optional
+        Gerador dos sorteios (ver main.normaliza_rng). Padrão None: o
+        gerador do tabuleiro (tabuleiro.rng)
+    controle : solver.Controle, optional
+        Ficha de cancelamento, prazo e progresso, conferida a cada troca
+        de fase, a cada chamada do oráculo e durante a busca (inclusive
+        dentro do CP-SAT). Interrompido, levanta solver.Cancelado.
+        Padrão None
+    checkpoint : str, optional
+        Arquivo .npz onde o estado da redução é salvo periodicamente
+        (dicas, fase, posição na ordem da minimização, cache de
+        contraexemplos, estado do gerador e os vereditos da memória deste
+        tabuleiro) e também quando ela é interrompida. Se o arquivo
+        já existe, a redução continua de onde ele parou, pulando o teste do
+        mapa completo e os sorteios já feitos; com oráculo determinístico
+        (motor='python' ou deterministico=True) o resultado é idêntico ao
+        de uma execução sem interrupção. Um checkpoint de outro tabuleiro ou
+        com outros parâmetros (inclusive outra seed inteira em `rng`) dá
+        ValueError. Apagado ao terminar (mantido
+        se o prazo cortou a redução). Ver também retoma_reducao().
+        Padrão None
+    intervalo_checkpoint : float, optional
+        Segundos entre as gravações do checkpoint. Padrão 60
+    memo : MemoUnicidade, optional
+        Memória de vereditos a usar (e completar). Padrão None: uma memória
+        nova só para esta chamada (ver MemoUnicidade)
 
     Returns
     -------
@@ -763,27 +1836,46 @@ def reduz_dicas(tabuleiro
     células com dica e -1 nas células sem dica.
     """
     lin, col = tabuleiro.lin, tabuleiro.col
-    if len(tabuleiro.caminho) == 0:
+    if tabuleiro.get_comprimento_caminho() == 0:
         raise ValueError('o tabuleiro não tem caminho gerado')
 
+    rs = tabuleiro.rng if rng is None else sl.normaliza_rng(rng)
     tabuleiro.preenche_dicas()
     alvo = tabuleiro.dicas.astype(int)
     alvo_solucao = sv.arestas_do_tabuleiro(tabuleiro)
+    memo = MemoUnicidade() if memo is None else memo
+    _nova_reducao(controle)
+    orcamento = (max_nos, motor)
+    ponto = _Checkpoint(checkpoint, intervalo_checkpoint
+                        ,dict(metodo='dicas', lin=lin, col=col
+                              ,simetria=simetria, minimiza=minimiza
+                              ,semente=semente, max_nos=max_nos, motor=motor
+                              ,deterministico=deterministico, ordem=ordem
+                              ,rng=_seed_do_checkpoint(rng))
+                        ,alvo, alvo_solucao, memo, controle)
+    retomada = ponto.estado
+
+    if retomada is None:
+        # Sanidade: o mapa completo de dicas precisa ter solução única
+        n = _confere_mapa_completo(tabuleiro, alvo, alvo_solucao, max_nos
+                                   ,motor, controle, memo)
+        if n != 1:
+            raise ValueError('o mapa completo de dicas não tem solução única '
+                             '({} soluções encontradas)'.format(n))
 
-    # Sanidade: o mapa completo de dicas precisa ter solução única
-    n, _ = _novo_oraculo(lin, col, alvo, max_nos, motor
-                         ,alvo_solucao).conta_solucoes(limite=2)
-    if n != 1:
-        raise ValueError('o mapa completo de dicas não tem solução única '
-                         '({} soluções encontradas)'.format(n))
-
-    # Subconjunto inicial aleatório de dicas (ver Notes sobre a semente)
-    puzzle = np.where(np.random.random((lin-1, col-1)) < semente, alvo, -1)
-    if simetria:
-        m = (puzzle >= 0) | (puzzle[::-1, ::-1] >= 0)
-        puzzle = np.where(m, alvo, -1)
-
-    cache = []   # matrizes de dicas das soluções alternativas já vistas
+        # Subconjunto inicial aleatório de dicas (ver Notes sobre a semente)
+        puzzle = np.where(rs.random_sample((lin-1, col-1)) < semente
+                          ,alvo, -1)
+        if simetria:
+            m = (puzzle >= 0) | (puzzle[::-1, ::-1] >= 0)
+            puzzle = np.where(m, alvo, -1)
+        cache = []   # matrizes de dicas das soluções alternativas já vistas
+        fase = 1
+    else:
+        rs = _restaura_rng(rs, str(retomada['rng']))
+        puzzle = retomada['puzzle'].astype(int)
+        cache = list(retomada['cache'].astype(int))
+        fase = int(retomada['fase'])
 
     def consistente(contagens):
         m = puzzle >= 0
@@ -802,8 +1894,12 @@ def reduz_dicas(tabuleiro
         for contagens in cache:
             if consistente(contagens):
                 return contagens
-        s = _novo_oraculo(lin, col, puzzle, max_nos, motor, alvo_solucao)
+        if memo.consulta(lin, col, alvo_solucao, puzzle, orcamento):
+            return None   # já provado único (por este ou outro redutor)
+        s = _novo_oraculo(lin, col, puzzle, max_nos, motor, alvo_solucao
+                          ,deterministico, controle)
         n, solucoes = s.conta_solucoes(limite=2)
+        memo.registra_contagem(lin, col, alvo_solucao, puzzle, s, orcamento)
         alternativas = [x for x in solucoes if x != alvo_solucao]
         if alternativas:
             novas = [sv.dicas_de_solucao(lin, col, x) for x in alternativas]
@@ -814,67 +1910,110 @@ def reduz_dicas(tabuleiro
         # Busca inconclusiva (orçamento de nós estourado): adiciona uma
         # dica aleatória para apertar o puzzle e tenta de novo
         sem_dica = np.argwhere(puzzle < 0)
-        l, c = sem_dica[np.random.randint(len(sem_dica))]
+        l, c = sem_dica[rs.randint(len(sem_dica))]
         adiciona_dica(l, c)
         if verbose:
             print('solver inconclusivo, dica extra adicionada')
         return contraexemplo()
 
-    # Fase 1: adição de dicas guiada por contraexemplo
-    while True:
-        contagens = contraexemplo()
-        if contagens is None:
-            break
-        # Células sem dica onde o contraexemplo discorda do alvo: anotar
-        # a dica do alvo em qualquer uma delas elimina o contraexemplo.
-        # Escolhe a que elimina o maior número de contraexemplos do cache
-        difere = np.argwhere((contagens != alvo) & (puzzle < 0))
-        melhor, melhor_pontos = None, -1
-        for l, c in difere:
-            pontos = sum(1 for outro in cache
-                         if outro[l, c] != alvo[l, c] and consistente(outro))
-            if pontos > melhor_pontos:
-                melhor, melhor_pontos = (l, c), pontos
-        adiciona_dica(*melhor)
-        if verbose:
-            print('dicas: {:3d} | contraexemplos no cache: {}'.format(
-                int((puzzle >= 0).sum()), len(cache)))
-
-    # Fase 2: minimização gulosa (remove cada dica que ficou redundante)
-    if minimiza:
-        com_dica = [tuple(x) for x in np.argwhere(puzzle >= 0)]
-        for i in np.random.permutation(len(com_dica)):
-            l, c = com_dica[i]
-            if puzzle[l, c] < 0:
-                continue   # já removida como par simétrico
-            backup = puzzle[l, c]
-            puzzle[l, c] = -1
-            par = None
-            if simetria:
-                ls, cs = lin-2-l, col-2-c
-                if (ls, cs) != (l, c) and puzzle[ls, cs] >= 0:
-                    par = (ls, cs, puzzle[ls, cs])
-                    puzzle[ls, cs] = -1
-
-            unica = not any(consistente(ct) for ct in cache)
-            if unica:
-                s = _novo_oraculo(lin, col, puzzle, max_nos, motor
-                                  ,alvo_solucao)
-                n, solucoes = s.conta_solucoes(limite=2)
-                alternativas = [x for x in solucoes if x != alvo_solucao]
-                if alternativas:
-                    cache.extend(sv.dicas_de_solucao(lin, col, x)
-                                 for x in alternativas)
-                    unica = False
-                elif not s.completa:
-                    # Inconclusivo: mantém a dica por segurança
-                    unica = False
-            if not unica:
-                puzzle[l, c] = backup
-                if par is not None:
-                    puzzle[par[0], par[1]] = par[2]
-        if verbose:
-            print('após minimização: {} dicas'.format(int((puzzle >= 0).sum())))
+    with ponto:
+        # Fase 1: adição de dicas guiada por contraexemplo. Aqui o puzzle
+        # ainda não é único: se o prazo acabar, o único puzzle garantido é
+        # o mapa completo
+        try:
+            _fase(controle, 'adicao')
+            while fase == 1:
+                ponto.marca(rs, fase=1, puzzle=puzzle, cache=cache)
+                contagens = contraexemplo()
+                if contagens is None:
+                    break
+                # Células sem dica onde o contraexemplo discorda do alvo:
+                # anotar a dica do alvo em qualquer uma delas elimina o
+                # contraexemplo. Escolhe a que elimina o maior número de
+                # contraexemplos do cache
+                difere = np.argwhere((contagens != alvo) & (puzzle < 0))
+                melhor, melhor_pontos = None, -1
+                for l, c in difere:
+                    pontos = sum(1 for outro in cache
+                                 if outro[l, c] != alvo[l, c]
+                                 and consistente(outro))
+                    if pontos > melhor_pontos:
+                        melhor, melhor_pontos = (l, c), pontos
+                adiciona_dica(*melhor)
+                if verbose:
+                    print('dicas: {:3d} | contraexemplos no cache: {}'.format(
+                        int((puzzle >= 0).sum()), len(cache)))
+        except sv.PrazoEsgotado:
+            controle.truncado = True
+            return alvo.copy()
+
+        # Fase 2: minimização gulosa (remove cada dica que ficou
+        # redundante). Cada passo começa de um puzzle único: se o prazo
+        # acabar no meio de um teste, volta ao do começo do passo
+        if minimiza:
+            antes = puzzle.copy()
+            try:
+                _fase(controle, 'minimizacao')
+                if fase == 2:
+                    com_dica = [tuple(x) for x in retomada['ordem']]
+                    inicio = int(retomada['posicao'])
+                else:
+                    com_dica = [tuple(x) for x in np.argwhere(puzzle >= 0)]
+                    if ordem == 'forca':
+                        com_dica = _ordena_celulas(lin, col, puzzle, com_dica
+                                                   ,rs, ordem)
+                    else:
+                        com_dica = [com_dica[i]
+                                    for i in rs.permutation(len(com_dica))]
+                    inicio = 0
+                for i in range(inicio, len(com_dica)):
+                    l, c = com_dica[i]
+                    if puzzle[l, c] < 0:
+                        continue   # já removida como par simétrico
+                    ponto.marca(rs, fase=2, puzzle=puzzle, cache=cache
+                                ,ordem=com_dica, posicao=i)
+                    antes[...] = puzzle
+                    backup = puzzle[l, c]
+                    puzzle[l, c] = -1
+                    par = None
+                    if simetria:
+                        ls, cs = lin-2-l, col-2-c
+                        if (ls, cs) != (l, c) and puzzle[ls, cs] >= 0:
+                            par = (ls, cs, puzzle[ls, cs])
+                            puzzle[ls, cs] = -1
+
+                    unica = not any(consistente(ct) for ct in cache)
+                    veredito = (memo.consulta(lin, col, alvo_solucao, puzzle
+                                              ,orcamento)
+                                if unica else None)
+                    if veredito is not None:
+                        unica = veredito
+                    elif unica:
+                        s = _novo_oraculo(lin, col, puzzle, max_nos, motor
+                                          ,alvo_solucao, deterministico
+                                          ,controle)
+                        n, solucoes = s.conta_solucoes(limite=2)
+                        memo.registra_contagem(lin, col, alvo_solucao
+                                               ,puzzle, s, orcamento)
+                        alternativas = [x for x in solucoes
+                                        if x != alvo_solucao]
+                        if alternativas:
+                            cache.extend(sv.dicas_de_solucao(lin, col, x)
+                                         for x in alternativas)
+                            unica = False
+                        elif not s.completa:
+                            # Inconclusivo: mantém a dica por segurança
+                            unica = False
+                    if not unica:
+                        puzzle[l, c] = backup
+                        if par is not None:
+                            puzzle[par[0], par[1]] = par[2]
+            except sv.PrazoEsgotado:
+                controle.truncado = True
+                puzzle = antes
+            if verbose:
+                print('após minimização: {} dicas'
+                      .format(int((puzzle >= 0).sum())))
 
     return puzzle
 
@@ -902,86 +2041,228 @@ def _devolve_dicas(puzzle, alvo, removidas, rs, dificuldade):
     return puzzle
 
 
-def _unico(lin, col, puzzle, solucao, max_nos, motor):
+def _unico(lin, col, puzzle, solucao, max_nos, motor, controle=None,
+           memo=None):
     """True se `puzzle` tem solução única E o solver concluiu (completa).
-    Como remover dicas mantém o alvo como solução, count==1 ⇒ a única é o alvo."""
-    s = _novo_oraculo(lin, col, puzzle, max_nos, motor, solucao)
-    n, _ = s.conta_solucoes(limite=2)
-    return n == 1 and s.completa
+    Como remover dicas mantém o alvo como solução, count==1 ⇒ a única é o alvo.
+    Vereditos já conhecidos (ou inferidos) saem de `memo` (MemoUnicidade)."""
+    n, completa = _conta_com_memo(lin, col, puzzle, solucao, max_nos, motor
+                                  ,controle, memo)
+    return n == 1 and completa
+
+
+def _ordena_celulas(lin, col, puzzle, celulas, rs, ordem):
+    """
+    Ordem em que os redutores tentam remover as dicas de `celulas`.
+
+    'aleatoria' embaralha com `rs` (comportamento original). 'forca' põe
+    primeiro as dicas com mais cara de redundantes, por notas baratas
+    calculadas uma vez sobre `puzzle`, nesta prioridade:
+
+      1. re-derivável: sem ela, a propagação (com padrões fixos) ainda
+         decide as 4 arestas da célula. As células são testadas em 25
+         classes (l % 5, c % 5), removendo a classe inteira por vez --
+         25 propagações, independente do tamanho do tabuleiro;
+      2. dica fraca (1 ou 2) antes de forte (0 ou 3), que carrega mais
+         informação e costuma ser necessária;
+      3. mais dicas entre as 8 vizinhas antes de menos;
+      4. desempate aleatório com `rs`.
+
+    Tentar primeiro as prováveis redundantes reduz as chamadas do oráculo
+    que falham (as mais caras: provar ambiguidade exige achar outro laço).
+    As notas 1 a 3 vêm de _notas_celulas.
+    """
+    if ordem != 'forca':
+        celulas = list(celulas)
+        rs.shuffle(celulas)
+        return celulas
+    rederiva, forte, densidade = _notas_celulas(lin, col, puzzle)
+    l, c = np.asarray(celulas).reshape(-1, 2).T
+    idx = np.lexsort((rs.random_sample(len(celulas)), -densidade[l, c]
+                      ,forte[l, c], ~rederiva[l, c]))
+    return [tuple(celulas[i]) for i in idx]
+
+
+def _notas_celulas(lin, col, puzzle):
+    """
+    Notas de _ordena_celulas para cada célula de `puzzle`, como matrizes
+    (lin-1)x(col-1): rederiva (a propagação, sem a dica da célula e as da
+    sua classe (l % 5, c % 5), ainda decide as 4 arestas dela), forte (dica
+    0 ou 3) e densidade (número de vizinhas com dica, entre as 8).
+    """
+    R, C = lin - 1, col - 1
+    com = puzzle >= 0
+    viz = np.pad(com, 1).astype(int)
+    densidade = sum(viz[1+dl:1+dl+R, 1+dc:1+dc+C]
+                    for dl in (-1, 0, 1) for dc in (-1, 0, 1)) - com
+    forte = (puzzle == 0) | (puzzle == 3)
+
+    arestas_celula = sv.topologia(lin, col).arestas_celula
+    ls, cs = np.indices((R, C))
+    rederiva = np.zeros((R, C), dtype=bool)
+    for k in range(25):
+        classe = com & (ls % 5 == k // 5) & (cs % 5 == k % 5)
+        if not classe.any():
+            continue
+        s = sv.Solver(lin, col, np.where(classe, -1, puzzle))
+        s.decide_por_propagacao()
+        if s.num_solucoes:
+            rederiva |= classe   # a propagação fechou o laço
+            continue
+        estado = np.asarray(s.estado)[arestas_celula]
+        decidida = (estado != sv.DESCONHECIDA).all(axis=1).reshape(R, C)
+        rederiva |= classe & decidida
+    return rederiva, forte, densidade
+
+
+def _rs_da_seed(seed):
+    """
+    Gerador dos métodos de redução: seed None ou int dá um RandomState novo
+    (comportamento original); Generator, RandomState ou SeedSequence são
+    usados via main.normaliza_rng.
+    """
+    if seed is None or isinstance(seed, (int, np.integer)):
+        return np.random.RandomState(seed)
+    return sl.normaliza_rng(seed)
+
+
+def _seed_do_checkpoint(seed):
+    """A seed como vai para os parâmetros de um checkpoint: o inteiro, ou
+    None se não há seed ou ela é um gerador explícito (cujo estado o
+    próprio arquivo guarda)."""
+    return int(seed) if isinstance(seed, (int, np.integer)) else None
 
 
 def reduz_guloso(lin, col, alvo, solucao, dificuldade='medio',
-                 max_nos=40000, motor='python', seed=None):
+                 max_nos=40000, motor='python', seed=None, ordem='aleatoria',
+                 controle=None, checkpoint=None, intervalo_checkpoint=60.0,
+                 memo=None):
     """REDUÇÃO GULOSA (método padrão do site): tenta remover cada dica numa
-    ordem aleatória, mantendo a remoção se o puzzle continuar único; ao final
-    devolve uma fração das removidas conforme a dificuldade."""
-    rs = np.random.RandomState(seed)
+    ordem aleatória (ou por força da dica, com ordem='forca'; ver
+    _ordena_celulas), mantendo a remoção se o puzzle continuar único; ao final
+    devolve uma fração das removidas conforme a dificuldade. controle,
+    checkpoint, intervalo_checkpoint e memo: ver reduz_dicas() (aqui o
+    arquivo guarda a ordem das células, a posição nela e as dicas já
+    removidas)."""
+    rs = _rs_da_seed(seed)
     alvo = np.asarray(alvo).astype(int)
-    puzzle = alvo.copy()
-    celulas = [(l, c) for l in range(lin - 1) for c in range(col - 1)]
-    rs.shuffle(celulas)
-    removidas = []
-    for l, c in celulas:
-        if puzzle[l, c] < 0:
-            continue
-        bak = puzzle[l, c]
-        puzzle[l, c] = -1
-        if _unico(lin, col, puzzle, solucao, max_nos, motor):
-            removidas.append((l, c))
-        else:
-            puzzle[l, c] = bak
+    memo = MemoUnicidade() if memo is None else memo
+    _nova_reducao(controle)
+    ponto = _Checkpoint(checkpoint, intervalo_checkpoint
+                        ,dict(metodo='guloso', lin=lin, col=col
+                              ,dificuldade=dificuldade, max_nos=max_nos
+                              ,motor=motor, ordem=ordem
+                              ,seed=_seed_do_checkpoint(seed))
+                        ,alvo, solucao, memo, controle)
+    if ponto.estado is None:
+        puzzle = alvo.copy()
+        celulas = [(l, c) for l in range(lin - 1) for c in range(col - 1)]
+        celulas = _ordena_celulas(lin, col, puzzle, celulas, rs, ordem)
+        removidas = []
+        inicio = 0
+    else:
+        rs = _restaura_rng(rs, str(ponto.estado['rng']))
+        puzzle = ponto.estado['puzzle'].astype(int)
+        celulas = [tuple(x) for x in ponto.estado['ordem']]
+        removidas = [tuple(x) for x in
+                     ponto.estado['removidas'].reshape(-1, 2).tolist()]
+        inicio = int(ponto.estado['posicao'])
+    with ponto:
+        try:
+            _fase(controle, 'minimizacao')
+            for i in range(inicio, len(celulas)):
+                l, c = celulas[i]
+                if puzzle[l, c] < 0:
+                    continue
+                ponto.marca(rs, puzzle=puzzle, ordem=celulas, posicao=i
+                            ,removidas=removidas)
+                bak = puzzle[l, c]
+                puzzle[l, c] = -1
+                if _unico(lin, col, puzzle, solucao, max_nos, motor
+                          ,controle, memo):
+                    removidas.append((l, c))
+                else:
+                    puzzle[l, c] = bak
+        except sv.PrazoEsgotado:
+            # Prazo no meio de um teste: só as remoções já provadas ficam
+            controle.truncado = True
+            puzzle = alvo.copy()
+            for l, c in removidas:
+                puzzle[l, c] = -1
     return _devolve_dicas(puzzle, alvo, removidas, rs, dificuldade)
 
 
 def reduz_binaria(lin, col, alvo, solucao, dificuldade='medio',
-                  max_nos=40000, motor='python', seed=None):
+                  max_nos=40000, motor='python', seed=None, controle=None,
+                  memo=None):
     """REDUÇÃO POR BUSCA BINÁRIA (rápida): fixada uma ordem, P(k)='remover as k
     primeiras mantém único' é monótona, então acha-se o maior k por busca
     binária (O(log n) chamadas do solver). Reembaralha a cada rodada até nada
-    mais sair. Costuma deixar mais dicas que o guloso, mas é bem mais rápido."""
-    rs = np.random.RandomState(seed)
+    mais sair. Costuma deixar mais dicas que o guloso, mas é bem mais rápido.
+    controle e memo: ver reduz_dicas()."""
+    rs = _rs_da_seed(seed)
     alvo = np.asarray(alvo).astype(int)
+    memo = MemoUnicidade() if memo is None else memo
+    _nova_reducao(controle)
     puzzle = alvo.copy()
     removidas = []
-    progrediu = True
-    while progrediu:
-        progrediu = False
-        restantes = [(l, c) for l in range(lin - 1) for c in range(col - 1)
-                     if puzzle[l, c] >= 0]
-        rs.shuffle(restantes)
-
-        def unico_removendo(k):
-            p = puzzle.copy()
-            for i in range(k):
-                l, c = restantes[i]
-                p[l, c] = -1
-            return _unico(lin, col, p, solucao, max_nos, motor)
-
-        lo, hi = 0, len(restantes)
-        while lo < hi:
-            m = (lo + hi + 1) // 2          # teto
-            if unico_removendo(m):
-                lo = m
-            else:
-                hi = m - 1
-        if lo > 0:
-            for i in range(lo):
-                l, c = restantes[i]
-                puzzle[l, c] = -1
-                removidas.append((l, c))
-            progrediu = True
+    restantes, lo = [], 0
+    try:
+        _fase(controle, 'binaria')
+        progrediu = True
+        while progrediu:
+            progrediu = False
+            restantes = [(l, c) for l in range(lin - 1) for c in range(col - 1)
+                         if puzzle[l, c] >= 0]
+            rs.shuffle(restantes)
+
+            def unico_removendo(k):
+                p = puzzle.copy()
+                for i in range(k):
+                    l, c = restantes[i]
+                    p[l, c] = -1
+                return _unico(lin, col, p, solucao, max_nos, motor, controle
+                              ,memo)
+
+            lo, hi = 0, len(restantes)
+            while lo < hi:
+                m = (lo + hi + 1) // 2          # teto
+                if unico_removendo(m):
+                    lo = m
+                else:
+                    hi = m - 1
+            if lo > 0:
+                for i in range(lo):
+                    l, c = restantes[i]
+                    puzzle[l, c] = -1
+                    removidas.append((l, c))
+                progrediu = True
+    except sv.PrazoEsgotado:
+        # Os testes rodam em cópias: `puzzle` só tem remoções provadas, e
+        # as `lo` primeiras da rodada interrompida também já são seguras
+        controle.truncado = True
+        for l, c in restantes[:lo]:
+            puzzle[l, c] = -1
+            removidas.append((l, c))
     return _devolve_dicas(puzzle, alvo, removidas, rs, dificuldade)
 
 
 def reduz_cegar(lin, col, alvo, solucao, dificuldade='medio',
-                max_nos=40000, motor='python', seed=None, semente=0.5):
+                max_nos=40000, motor='python', seed=None, semente=0.5,
+                deterministico=False, ordem='aleatoria', controle=None,
+                memo=None):
     """REDUÇÃO POR CEGAR (bottom-up, guiada por contraexemplo): parte de poucas
     dicas (fração `semente`) e adiciona a dica verdadeira onde um contraexemplo
     diverge do alvo, até provar unicidade; pente-fino guloso final + devolve por
     dificuldade. Espelha core.js reduceCluesCEGAR (variante matriz-based, à parte
-    do reduz_dicas() original baseado em Tabuleiro)."""
-    rs = np.random.RandomState(seed)
+    do reduz_dicas() original baseado em Tabuleiro). deterministico,
+    controle e memo: ver reduz_dicas(); ordem (do pente-fino): ver
+    reduz_guloso()."""
+    rs = _rs_da_seed(seed)
     alvo = np.asarray(alvo).astype(int)
+    memo = MemoUnicidade() if memo is None else memo
+    _nova_reducao(controle)
+    orcamento = (max_nos, motor)
     alvo_sol = solucao if isinstance(solucao, frozenset) else frozenset(solucao)
     R, C = lin - 1, col - 1
     puzzle = np.where(rs.random_sample((R, C)) < semente, alvo, -1)
@@ -1004,8 +2285,12 @@ def reduz_cegar(lin, col, alvo, solucao, dificuldade='medio',
         for cts in cache:
             if consistente(cts):
                 return cts
-        s = _novo_oraculo(lin, col, puzzle, max_nos, motor, alvo_sol)
+        if memo.consulta(lin, col, alvo_sol, puzzle, orcamento):
+            return None
+        s = _novo_oraculo(lin, col, puzzle, max_nos, motor, alvo_sol
+                          ,deterministico, controle)
         _, solucoes = s.conta_solucoes(limite=2)
+        memo.registra_contagem(lin, col, alvo_sol, puzzle, s, orcamento)
         alts = [x for x in solucoes if x != alvo_sol]
         if alts:
             m = sv.dicas_de_solucao(lin, col, alts[0])
@@ -1020,42 +2305,131 @@ def reduz_cegar(lin, col, alvo, solucao, dificuldade='medio',
         puzzle[l, c] = alvo[l, c]
         return contraexemplo()
 
-    guard = 0
-    while guard < R * C * 4:
-        guard += 1
-        cts = contraexemplo()
-        if cts is None or not adiciona(cts):
-            break
+    try:
+        _fase(controle, 'adicao')
+        guard = 0
+        while guard < R * C * 4:
+            guard += 1
+            cts = contraexemplo()
+            if cts is None or not adiciona(cts):
+                break
+    except sv.PrazoEsgotado:
+        # Prazo antes de provar a unicidade: só o mapa completo é garantido
+        controle.truncado = True
+        return alvo.copy()
 
     celulas = [(l, c) for l in range(R) for c in range(C) if puzzle[l, c] >= 0]
-    rs.shuffle(celulas)
+    celulas = _ordena_celulas(lin, col, puzzle, celulas, rs, ordem)
+    inicio = puzzle.copy()
     removidas = []
-    for l, c in celulas:
-        bak = puzzle[l, c]
-        puzzle[l, c] = -1
-        if _unico(lin, col, puzzle, solucao, max_nos, motor):
-            removidas.append((l, c))
-        else:
-            puzzle[l, c] = bak
+    try:
+        _fase(controle, 'minimizacao')
+        for l, c in celulas:
+            bak = puzzle[l, c]
+            puzzle[l, c] = -1
+            if _unico(lin, col, puzzle, solucao, max_nos, motor, controle
+                      ,memo):
+                removidas.append((l, c))
+            else:
+                puzzle[l, c] = bak
+    except sv.PrazoEsgotado:
+        # Prazo no meio de um teste: só as remoções já provadas ficam
+        controle.truncado = True
+        puzzle = inicio
+        for l, c in removidas:
+            puzzle[l, c] = -1
     return _devolve_dicas(puzzle, alvo, removidas, rs, dificuldade)
 
 
 def reduz_dicas_metodo(metodo, lin, col, alvo, solucao, dificuldade='medio',
-                       max_nos=40000, motor='python', seed=None):
+                       max_nos=40000, motor='python', seed=None,
+                       deterministico=False, ordem='aleatoria', controle=None,
+                       memo=None):
     """Despacha para o método de redução do site: 'guloso' (padrão), 'binaria'
     ou 'cegar'. Recebe o mapa completo `alvo` (matriz (lin-1)x(col-1)) e a
     `solucao` (frozenset de ids de aresta) e devolve a matriz reduzida na
-    dificuldade pedida."""
+    dificuldade pedida. `deterministico` só afeta o 'cegar' (os outros dois
+    usam apenas o veredito do oráculo, que já é reprodutível). `ordem`
+    ('aleatoria' ou 'forca') vale para o 'guloso' e o pente-fino do 'cegar';
+    a 'binaria' depende da ordem aleatória (prefixos monótonos). `seed` pode
+    ser um int ou um gerador (Generator, RandomState ou SeedSequence).
+    `controle` (solver.Controle) e `memo` (MemoUnicidade) são repassados ao
+    método."""
     if metodo == 'binaria':
-        return reduz_binaria(lin, col, alvo, solucao, dificuldade, max_nos, motor, seed)
+        return reduz_binaria(lin, col, alvo, solucao, dificuldade, max_nos, motor, seed,
+                             controle=controle, memo=memo)
     if metodo == 'cegar':
-        return reduz_cegar(lin, col, alvo, solucao, dificuldade, max_nos, motor, seed)
-    return reduz_guloso(lin, col, alvo, solucao, dificuldade, max_nos, motor, seed)
+        return reduz_cegar(lin, col, alvo, solucao, dificuldade, max_nos, motor,
+                           seed, deterministico=deterministico, ordem=ordem,
+                           controle=controle, memo=memo)
+    return reduz_guloso(lin, col, alvo, solucao, dificuldade, max_nos, motor, seed,
+                        ordem=ordem, controle=controle, memo=memo)
+
+
+def retoma_reducao(checkpoint, controle=None, intervalo_checkpoint=60.0,
+                   verbose=False):
+    """
+    Continua uma redução (reduz_dicas ou reduz_guloso) a partir só do seu
+    arquivo de checkpoint -- por exemplo num processo novo, depois de uma
+    queda. Parâmetros, dicas completas e laço alvo saem do próprio arquivo;
+    o tabuleiro do reduz_dicas é remontado a partir do laço.
+
+    Parameters
+    ----------
+    checkpoint : str
+        Arquivo gravado por reduz_dicas(checkpoint=...) ou
+        reduz_guloso(checkpoint=...).
+    controle : solver.Controle, optional
+        Ver reduz_dicas(). Padrão None
+    intervalo_checkpoint : float, optional
+        Segundos entre as gravações do checkpoint daqui em diante.
+        Padrão 60
+    verbose : bool, optional
+        Repassado ao reduz_dicas. Padrão False
+
+    Returns
+    -------
+    A matriz de dicas que a redução original devolveria.
+    """
+    with np.load(checkpoint) as f:
+        parametros = json.loads(str(f['parametros']))
+        alvo = f['alvo'].astype(int)
+        solucao = frozenset(f['solucao'].tolist())
+    metodo = parametros.pop('metodo')
+    lin, col = parametros.pop('lin'), parametros.pop('col')
+    if metodo == 'guloso':
+        return reduz_guloso(lin, col, alvo, solucao, controle=controle
+                            ,checkpoint=checkpoint
+                            ,intervalo_checkpoint=intervalo_checkpoint
+                            ,**parametros)
+    tabuleiro = sl.Tabuleiro(lin, col)
+    h, v = sv.planos_de_solucao(lin, col, solucao)
+    _monta_caminho_de_planos(tabuleiro, h, v)
+    # O estado do gerador sai do arquivo; a seed só confere a identidade
+    rng = parametros.pop('rng')
+    return reduz_dicas(tabuleiro, verbose=verbose
+                       ,rng=np.random.RandomState() if rng is None else rng
+                       ,controle=controle
+                       ,checkpoint=checkpoint
+                       ,intervalo_checkpoint=intervalo_checkpoint
+                       ,**parametros)
 
 
 # =============================================================================
 # Gera um puzzle completo: tabuleiro + redução de dicas + dificuldade
 # =============================================================================
+class ResultadoPuzzle(list):
+    """
+    Saída do gera_Puzzle: a lista [tabuleiro, puzzle, dificuldade], com o
+    atributo `truncado` -- True se o tempo_max acabou durante a redução e
+    o puzzle (de solução única) não chegou a ser minimizado.
+    """
+
+    def __init__(self, itens, truncado=False):
+        super().__init__(itens)
+        self.truncado = truncado
+
+
 def gera_Puzzle(densidade : float = 0.3
                 ,simetria : bool  = False
                 ,minimiza : bool  = True
@@ -1065,6 +2439,12 @@ def gera_Puzzle(densidade : float = 0.3
                 ,dificuldade : str = None
                 ,metodo   : str   = 'guloso'
                 ,verbose  : bool  = False
+                ,deterministico : bool = False
+                ,ordem    : str   = 'aleatoria'
+                ,tempo_max: float = None
+                ,rng               = None
+                ,controle          = None
+                ,memo              = None
                 ,**kwargs):
     """
     Gera um puzzle de Slitherlink completo: tabuleiro com caminho fechado
@@ -1092,7 +2472,7 @@ def gera_Puzzle(densidade : float = 0.3
     motor : str, optional
         'auto' | 'cpsat' | 'python' (ver _novo_oraculo). Padrão 'auto'.
     seed : int, optional
-        Seed do numpy.random / dos métodos de redução.
+        Seed do tabuleiro / dos métodos de redução.
     dificuldade : str, optional
         None -> estima a dificuldade (modo original); 'facil'|'medio'|'dificil'
         -> alvo passado aos métodos do site; 'nenhuma'/'none' -> mapa COMPLETO
@@ -1100,71 +2480,136 @@ def gera_Puzzle(densidade : float = 0.3
     metodo : str, optional
         Método de redução quando `dificuldade` é dada: 'guloso' (padrão),
         'binaria' ou 'cegar'. Padrão 'guloso'.
+    deterministico : bool, optional
+        Contraexemplos canônicos no CP-SAT (ver reduz_dicas()): com seed
+        fixa, o puzzle gerado é idêntico em qualquer número de núcleos.
+        Padrão False.
+    ordem : str, optional
+        Ordem de remoção das dicas: 'aleatoria' ou 'forca' (ver
+        reduz_guloso). Não se aplica à 'binaria'. Padrão 'aleatoria'.
+    tempo_max : float, optional
+        Orçamento total, em segundos. Se ele acaba durante a redução, o
+        redutor para e devolve o melhor puzzle de solução única obtido até
+        ali (ver Returns); se acaba antes dela (geração do tabuleiro ou
+        teste do mapa completo), não há puzzle garantido e sai
+        solver.PrazoEsgotado. Padrão None (sem limite).
+    rng : optional
+        Gerador explícito para todo o processo, no lugar da seed (ver
+        main.normaliza_rng). Com um SeedSequence ou Generator por thread
+        (main.sementes_independentes), puzzles podem ser gerados em paralelo
+        de forma reprodutível. Padrão None.
+    controle : solver.Controle, optional
+        Ficha de cancelamento, prazo e progresso repassada até o oráculo
+        (ver reduz_dicas()): interrompida, a geração para com
+        solver.Cancelado (solver.PrazoEsgotado se foi o prazo). Padrão None.
+    memo : MemoUnicidade, optional
+        Memória de vereditos do oráculo compartilhada com outras chamadas
+        (ver MemoUnicidade). Padrão None: uma memória só desta chamada,
+        usada pelo teste do mapa completo e pela redução.
     **kwargs :
         Variáveis para criação do tabuleiro (lin, col)
 
     Returns
     -------
-    Lista [tabuleiro, puzzle, dificuldade]: o tabuleiro com o caminho solução
-    (tabuleiro.dicas mantém o mapa completo), a matriz de dicas do puzzle (-1
-    nas células sem dica) e a dificuldade -- estimada (modo None) ou a alvo
-    pedida.
+    Lista [tabuleiro, puzzle, dificuldade] (ResultadoPuzzle): o tabuleiro com
+    o caminho solução (tabuleiro.dicas mantém o mapa completo), a matriz de
+    dicas do puzzle (-1 nas células sem dica) e a dificuldade -- estimada
+    (modo None) ou a alvo pedida. O atributo `truncado` diz se a redução
+    foi cortada pelo tempo_max (o puzzle é único, mas pode ter dicas
+    redundantes).
 
     Notes
     -----
     Existem laços diferentes que produzem exatamente o mesmo mapa completo
     de dicas -- nesses tabuleiros nenhum subconjunto de dicas define o laço
     de forma única. Quando isso acontece, um novo tabuleiro é gerado
-    (até max_tentativas vezes, somando 1 na seed a cada tentativa).
+    (até max_tentativas vezes, somando 1 na seed a cada tentativa). Na
+    maioria dos laços a unicidade do mapa completo é provada pelo pré-teste
+    local certifica_mapa_completo, sem chamar o solver.
     """
     max_tentativas = 20
-    for tentativa in range(max_tentativas):
-        _, tabuleiro, _ = gera_Tabuleiro2(densidade=densidade
-                                          ,dicas=True
-                                          ,seed=seed
-                                          ,**kwargs)
-        lin, col = tabuleiro.lin, tabuleiro.col
-
-        if dificuldade is None:
-            # Modo original: redução minimal (CEGAR) + dificuldade estimada
-            try:
-                puzzle = reduz_dicas(tabuleiro
-                                     ,simetria=simetria
-                                     ,minimiza=minimiza
-                                     ,max_nos=max_nos
-                                     ,motor=motor
-                                     ,verbose=verbose)
-            except ValueError:
+    memo = MemoUnicidade() if memo is None else memo
+    if rng is not None:
+        rng = sl.normaliza_rng(rng)   # um só fluxo para todas as tentativas
+    _nova_reducao(controle)
+    if controle is None and tempo_max is not None:
+        controle = sv.Controle()
+    # O tempo_max vale só para esta chamada: o prazo do controle do
+    # chamador volta ao que era na saída
+    prazo_antes = None if controle is None else controle.prazo
+    if tempo_max is not None:
+        prazo = controle.decorrido() + tempo_max
+        controle.prazo = (prazo if prazo_antes is None
+                          else min(prazo_antes, prazo))
+    try:
+        for tentativa in range(max_tentativas):
+            _fase(controle, 'tabuleiro')
+            _, tabuleiro, _ = gera_Tabuleiro2(densidade=densidade
+                                              ,dicas=True
+                                              ,seed=seed
+                                              ,rng=rng
+                                              ,**kwargs)
+            lin, col = tabuleiro.lin, tabuleiro.col
+
+            if dificuldade is None:
+                # Modo original: redução minimal (CEGAR) + dificuldade
+                # estimada
+                try:
+                    puzzle = reduz_dicas(tabuleiro
+                                         ,simetria=simetria
+                                         ,minimiza=minimiza
+                                         ,max_nos=max_nos
+                                         ,motor=motor
+                                         ,verbose=verbose
+                                         ,deterministico=deterministico
+                                         ,ordem=ordem
+                                         ,controle=controle
+                                         ,memo=memo)
+                except ValueError:
+                    if seed is not None:
+                        seed += 1
+                    if verbose:
+                        print('mapa completo ambíguo, gerando outro '
+                              'tabuleiro')
+                    continue
+                dif = sv.avalia_dificuldade(lin, col, puzzle)
+                return ResultadoPuzzle([tabuleiro, puzzle, dif]
+                                       ,controle is not None
+                                       and controle.truncado)
+
+            # Modos 'nenhuma' (mapa completo) e dificuldade-alvo (guloso/
+            # binaria/cegar). Confere a unicidade do mapa completo (igual ao
+            # reduz_dicas).
+            alvo = tabuleiro.dicas.astype(int)
+            solucao = sv.arestas_do_tabuleiro(tabuleiro)
+            n = _confere_mapa_completo(tabuleiro, alvo, solucao, max_nos, motor
+                                       ,controle, memo)
+            if n != 1:
                 if seed is not None:
                     seed += 1
                 if verbose:
                     print('mapa completo ambíguo, gerando outro tabuleiro')
                 continue
-            dif = sv.avalia_dificuldade(lin, col, puzzle)
-            return [tabuleiro, puzzle, dif]
-
-        # Modos 'nenhuma' (mapa completo) e dificuldade-alvo (guloso/binaria/
-        # cegar). Confere a unicidade do mapa completo (igual ao reduz_dicas).
-        alvo = tabuleiro.dicas.astype(int)
-        solucao = sv.arestas_do_tabuleiro(tabuleiro)
-        n, _ = _novo_oraculo(lin, col, alvo, max_nos, motor,
-                             solucao).conta_solucoes(limite=2)
-        if n != 1:
-            if seed is not None:
-                seed += 1
-            if verbose:
-                print('mapa completo ambíguo, gerando outro tabuleiro')
-            continue
-        if dificuldade in ('nenhuma', 'none'):
-            return [tabuleiro, alvo, 'nenhuma']    # TODAS as dicas, sem reduzir
-        puzzle = reduz_dicas_metodo(metodo, lin, col, alvo, solucao
-                                    ,dificuldade=dificuldade
-                                    ,max_nos=max_nos
-                                    ,motor=motor
-                                    ,seed=seed)
-        return [tabuleiro, puzzle, dificuldade]
-
-    raise RuntimeError('não foi possível gerar um tabuleiro com mapa de '
-                       'dicas de solução única em {} tentativas'
-                       .format(max_tentativas))
+            if dificuldade in ('nenhuma', 'none'):
+                # TODAS as dicas, sem reduzir
+                return ResultadoPuzzle([tabuleiro, alvo, 'nenhuma'])
+            puzzle = reduz_dicas_metodo(metodo, lin, col, alvo, solucao
+                                        ,dificuldade=dificuldade
+                                        ,max_nos=max_nos
+                                        ,motor=motor
+                                        ,seed=(seed if rng is None
+                                               else tabuleiro.rng)
+                                        ,deterministico=deterministico
+                                        ,ordem=ordem
+                                        ,controle=controle
+                                        ,memo=memo)
+            return ResultadoPuzzle([tabuleiro, puzzle, dificuldade]
+                                   ,controle is not None and controle.truncado)
+
+        raise RuntimeError('não foi possível gerar um tabuleiro com mapa de '
+                           'dicas de solução única em {} tentativas'
+                           .format(max_tentativas))
+    finally:
+        if controle is not None:
+            controle.prazo = prazo_antes
 
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Geração de puzzles em lote: gera_Puzzle espalhado por um pool de processos,
+com as sementes derivadas de um único SeedSequence e os puzzles gravados em
+um arquivo JSONL (uma linha por puzzle) à medida que ficam prontos.
+
+O arquivo só cresce (append) e cada linha guarda o índice do puzzle no lote;
+rodar gera_lote de novo com o mesmo arquivo e a mesma seed retoma o lote,
+pulando os índices já gravados.
+"""
+
+import concurrent.futures
+import json
+import os
+import time
+
+import numpy as np
+from tqdm import tqdm
+
+import gerador as ger
+import main as sl
+import solver as sv
+
+
+# =============================================================================
+# Formato das linhas: dicas como strings por linha ('.' = célula sem dica) e
+# a solução como a lista ordenada de ids de aresta (ver solver.topologia)
+# =============================================================================
+def _dicas_em_texto(puzzle):
+    return [''.join('.' if d < 0 else str(d) for d in linha)
+            for linha in np.asarray(puzzle, dtype=int).tolist()]
+
+
+def _dicas_de_texto(linhas):
+    return np.array([[-1 if x == '.' else int(x) for x in linha]
+                     for linha in linhas], dtype=int)
+
+
+def le_lote(caminho):
+    """
+    Lê um arquivo de lote, um registro por vez.
+
+    Linhas incompletas (o processo morreu no meio da escrita) são ignoradas.
+
+    Parameters
+    ----------
+    caminho : str
+        Arquivo JSONL escrito por gera_lote.
+
+    Yields
+    ------
+    dict com as chaves gravadas por gera_lote; 'dicas' vem como matriz
+    (lin-1)x(col-1) com -1 nas células sem dica e 'solucao' como frozenset
+    de ids de aresta (o formato de solver.arestas_do_tabuleiro).
+    """
+    for registro in _registros(caminho):
+        registro['dicas'] = _dicas_de_texto(registro['dicas'])
+        registro['solucao'] = frozenset(registro['solucao'])
+        yield registro
+
+
+def _registros(caminho):
+    with open(caminho, 'rb') as f:
+        for linha in f:
+            if not linha.endswith(b'\n'):
+                break           # última linha cortada por uma queda
+            try:
+                yield json.loads(linha)
+            except ValueError:
+                continue
+
+
+_CHAVE_LOTE = ('seed', 'lin', 'col', 'densidade', 'alvo', 'metodo', 'opcoes')
+
+
+def _opcoes(kwargs):
+    """
+    As opções do gera_Puzzle, já no formato em que voltam do arquivo
+    (tuplas viram listas). Todas entram na identidade do lote, então
+    precisam caber em JSON: objetos (controle, memo, ...) são ValueError,
+    assim como `rng` -- o gerador de cada puzzle é o do lote.
+    """
+    if 'rng' in kwargs:
+        raise ValueError('rng não é opção do lote: cada puzzle usa o seu '
+                         'filho de SeedSequence(seed)')
+    opcoes = {}
+    for chave, valor in sorted(kwargs.items()):
+        try:
+            opcoes[chave] = json.loads(json.dumps(valor))
+        except (TypeError, ValueError):
+            raise ValueError('a opção {}={!r} não cabe em JSON e não pode '
+                             'identificar o lote'.format(chave, valor))
+    return opcoes
+
+
+def _prepara_saida(caminho, lote):
+    """Índices já gravados em `caminho` (corta uma linha final incompleta)."""
+    if not os.path.exists(caminho):
+        return set()
+    with open(caminho, 'rb+') as f:
+        dados = f.read()
+        fim = dados.rfind(b'\n') + 1
+        if fim < len(dados):
+            f.truncate(fim)
+    feitos = set()
+    for registro in _registros(caminho):
+        # Arquivos anteriores à chave 'opcoes' foram gerados sem opções
+        outro = {k: registro.get(k, {}) for k in _CHAVE_LOTE}
+        if outro != lote:
+            raise ValueError('{} já tem puzzles de outro lote ({})'
+                             .format(caminho, outro))
+        feitos.add(registro['indice'])
+    return feitos
+
+
+def _gera_registro(indice, semente, lote, kwargs):
+    """Um puzzle do lote (roda dentro do processo trabalhador)."""
+    t0 = time.perf_counter()
+    tabuleiro, puzzle, dif = ger.gera_Puzzle(densidade=lote['densidade']
+                                             ,dificuldade=lote['alvo']
+                                             ,metodo=lote['metodo'] or 'guloso'
+                                             ,rng=semente
+                                             ,lin=lote['lin']
+                                             ,col=lote['col']
+                                             ,**kwargs)
+    t1 = time.perf_counter()
+    return dict(indice=indice, **lote
+                ,dificuldade=dif
+                ,n_dicas=int((puzzle >= 0).sum())
+                ,dicas=_dicas_em_texto(puzzle)
+                ,solucao=sorted(sv.arestas_do_tabuleiro(tabuleiro))
+                ,tempo=round(t1 - t0, 4))
+
+
+# =============================================================================
+# Pipeline
+# =============================================================================
+def gera_lote(n           : int
+              ,lin        : int
+              ,col        : int
+              ,dificuldade: str   = None
+              ,metodo     : str   = 'guloso'
+              ,processos  : int   = 1
+              ,saida      : str   = 'lote.jsonl'
+              ,seed       : int   = 0
+              ,densidade  : float = 0.5
+              ,verbose    : bool  = False
+              ,**kwargs):
+    """
+    Gera `n` puzzles lin x col e grava cada um em `saida` assim que fica
+    pronto.
+
+    O puzzle de índice i usa o i-ésimo filho de SeedSequence(seed) como
+    gerador (main.sementes_independentes), de modo que ele não depende da
+    ordem em que os processos terminam nem de quantos processos há -- com
+    motor='python' ou deterministico=True, o mesmo índice dá sempre o mesmo
+    puzzle. As linhas saem na ordem de término; a chave 'indice' identifica
+    cada puzzle.
+
+    Retomada: se `saida` já existe, os índices gravados nela são pulados (e
+    uma linha final cortada por uma queda é descartada). O arquivo precisa
+    ser do mesmo lote (mesmos seed, lin, col, densidade, dificuldade,
+    metodo e opções do gera_Puzzle em `kwargs`), senão é ValueError; `n`
+    pode crescer para estender o lote.
+
+    Parameters
+    ----------
+    n : int
+        Número de puzzles do lote.
+    lin, col : int
+        Tamanho dos tabuleiros (em vértices).
+    dificuldade : str, optional
+        Repassada ao gera_Puzzle: None (redução minimal + dificuldade
+        estimada), 'facil', 'medio', 'dificil' ou 'nenhuma'. Padrão None
+    metodo : str, optional
+        Método de redução quando `dificuldade` é dada (ver gera_Puzzle).
+        Padrão 'guloso'
+    processos : int, optional
+        Número de processos trabalhadores; 1 gera no próprio processo.
+        Cada puzzle é independente, então a vazão cresce quase
+        linearmente com os núcleos. O CP-SAT (motor 'auto' em tabuleiros
+        grandes) já usa várias threads por chamada; com muitos processos,
+        motor='python' evita disputar os núcleos. Padrão 1
+    saida : str, optional
+        Arquivo JSONL de saída (criado ou continuado). Padrão 'lote.jsonl'
+    seed : int, optional
+        Entropia do SeedSequence do lote. Padrão 0
+    densidade : float, optional
+        Densidade alvo dos laços. Padrão 0.5
+    verbose : bool, optional
+        Se True, mostra uma barra de progresso. Padrão False
+    **kwargs :
+        Demais opções do gera_Puzzle (motor, max_nos, simetria, ordem,
+        deterministico, ...). Só valores que cabem em JSON, que entram na
+        identidade do lote; `rng` ou objetos como controle e memo são
+        ValueError.
+
+    Returns
+    -------
+    Número de puzzles gerados nesta chamada.
+
+    Notes
+    -----
+    Cada linha tem as chaves indice, seed, lin, col, densidade, alvo (a
+    dificuldade pedida), metodo, opcoes (as opções de `kwargs`),
+    dificuldade (a obtida), n_dicas, dicas (uma string por linha
+    do tabuleiro, '.' nas células sem dica), solucao (ids de aresta
+    ordenados) e tempo (segundos do gera_Puzzle). le_lote() devolve os
+    registros já convertidos.
+    """
+    lote = dict(seed=seed, lin=lin, col=col, densidade=densidade
+                ,alvo=dificuldade
+                ,metodo=None if dificuldade is None else metodo
+                ,opcoes=_opcoes(kwargs))
+    feitos = _prepara_saida(saida, lote)
+    sementes = sl.sementes_independentes(seed, n)
+    pendentes = [i for i in range(n) if i not in feitos]
+
+    barra_progresso = tqdm(total=n, initial=n - len(pendentes)
+                           ,disable=not verbose)
+    gerados = 0
+    with open(saida, 'a', encoding='utf-8') as f:
+        def grava(registro):
+            f.write(json.dumps(registro, separators=(',', ':')) + '\n')
+            f.flush()
+            barra_progresso.update()
+
+        if processos <= 1:
+            for i in pendentes:
+                grava(_gera_registro(i, sementes[i], lote, kwargs))
+                gerados += 1
+        else:
+            # Janela limitada de tarefas em voo: lotes enormes não viram
+            # milhões de futures na memória de uma vez
+            janela = 4 * processos
+            fila = iter(pendentes)
+            with concurrent.futures.ProcessPoolExecutor(processos) as ex:
+                em_voo = set()
+                while True:
+                    for i in fila:
+                        em_voo.add(ex.submit(_gera_registro, i, sementes[i]
+                                             ,lote, kwargs))
+                        if len(em_voo) >= janela:
+                            break
+                    if not em_voo:
+                        break
+                    prontos, em_voo = concurrent.futures.wait(
+                        em_voo, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for futuro in prontos:
+                        grava(futuro.result())
+                        gerados += 1
+    barra_progresso.close()
+    return gerados
@@ -1,4 +1,3 @@
-
 # -*- coding: utf-8 -*-
 """
 Created on Thu May 11 17:5:33 2023
@@ -6,20 +5,125 @@ Created on Thu May 11 17:5:33 2023
 @author: lucas
 """
 
+import struct
+from collections.abc import Mapping
+
 import numpy as np
 import networkx as nx
 
+from solver import dicas_de_planos
+
+
+def normaliza_rng(rng=None):
+    """
+    Converte `rng` num gerador com a interface do np.random.RandomState,
+    usado por Tabuleiro e pelos geradores do gerador.py.
+
+    Parameters
+    ----------
+    rng : None, int, np.random.SeedSequence, np.random.Generator ou
+          np.random.RandomState
+        - None: o estado global do numpy.random (comportamento original);
+        - int: RandomState novo, com a mesma sequência de np.random.seed(rng);
+        - SeedSequence: RandomState novo (MT19937) semeado por ela;
+        - Generator: RandomState sobre o mesmo BitGenerator (os dois
+          compartilham o fluxo);
+        - RandomState (ou o próprio módulo np.random): devolvido como está.
+
+    Returns
+    -------
+    Gerador com a interface do RandomState.
+    """
+    if rng is None:
+        return np.random
+    if isinstance(rng, (int, np.integer)):
+        return np.random.RandomState(rng)
+    if isinstance(rng, np.random.SeedSequence):
+        return np.random.RandomState(np.random.MT19937(rng))
+    if isinstance(rng, np.random.Generator):
+        return np.random.RandomState(rng.bit_generator)
+    return rng
+
+
+def sementes_independentes(seed, n):
+    """
+    Lista de n SeedSequence independentes derivadas de `seed` (int, None ou
+    SeedSequence), para dar a cada thread ou processo um fluxo próprio e
+    reprodutível. Cada uma pode ser passada como `rng` (ver normaliza_rng).
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return seed.spawn(n)
+
+
+class _AtributosVertices:
+    """
+    Atributos dos vértices guardados em arrays numpy (um elemento por
+    vértice). O Tabuleiro herda desta classe; um Vertice avulso (criado
+    fora de um tabuleiro) usa uma instância própria, de um único vértice.
+    """
+
+    def __init__(self, numero_vertices):
+        self.visitado = np.zeros(numero_vertices, dtype=np.int8)
+        self.ordem = np.full(numero_vertices, -1, dtype=np.int64)
+        self.cor = np.full(numero_vertices, -1, dtype=np.int64)
+        self.dica_vertice = np.zeros(numero_vertices, dtype=np.int8)
+
+
 class Vertice:
-    def __init__(self, l, c, n):
+    """
+    Vértice do tabuleiro. Guarda só as coordenadas: os atributos
+    (visitado, ordem, cor, dica) ficam nos arrays do Tabuleiro e são lidos
+    e escritos por propriedades -- criar um vértice é barato e o tabuleiro
+    só cria os que forem pedidos.
+    """
+    __slots__ = ('l', 'c', 'n', '_atrib', '_i')
+
+    def __init__(self, l, c, n, tabuleiro=None):
         self.l = l
         self.c = c
         self.n = n
-        self.pos = (self.c,self.l)
-        self.visitado = 0
-        self.ordem= -1
-        self.cor = -1
-        self.dica = 0
-        
+        if tabuleiro is None:
+            self._atrib, self._i = _AtributosVertices(1), 0
+        else:
+            self._atrib, self._i = tabuleiro, n
+
+    @property
+    def pos(self):
+        return (self.c, self.l)
+
+    @property
+    def visitado(self):
+        return int(self._atrib.visitado[self._i])
+
+    @visitado.setter
+    def visitado(self, valor):
+        self._atrib.visitado[self._i] = valor
+
+    @property
+    def ordem(self):
+        return int(self._atrib.ordem[self._i])
+
+    @ordem.setter
+    def ordem(self, valor):
+        self._atrib.ordem[self._i] = valor
+
+    @property
+    def cor(self):
+        return int(self._atrib.cor[self._i])
+
+    @cor.setter
+    def cor(self, valor):
+        self._atrib.cor[self._i] = valor
+
+    @property
+    def dica(self):
+        return int(self._atrib.dica_vertice[self._i])
+
+    @dica.setter
+    def dica(self, valor):
+        self._atrib.dica_vertice[self._i] = valor
+
     def __str__(self):
         t = "({},{})".format(self.c, self.l)
         return (t)
@@ -60,14 +164,139 @@ class Vertice:
         return dx+dy
 
 
+class _VisaoVertices(Mapping):
+    """Dicionário n -> Vertice do tabuleiro (vértices criados sob demanda)."""
+
+    def __init__(self, tabuleiro):
+        self._tab = tabuleiro
+
+    def __getitem__(self, n):
+        v = self._tab.get_verticeN(n)
+        if v is None:
+            raise KeyError(n)
+        return v
+
+    def __iter__(self):
+        return iter(range(self._tab.numero_vertices))
+
+    def __len__(self):
+        return self._tab.numero_vertices
+
+
+class _VisaoArestas:
+    """Arestas do caminho como pares de Vertice (como G.edges do networkx)."""
+
+    def __init__(self, tabuleiro):
+        self._tab = tabuleiro
+
+    def __call__(self):
+        return self
+
+    def __iter__(self):
+        tab = self._tab
+        for l, c in zip(*np.nonzero(tab.arestas_h)):
+            yield tab.get_verticeXY(l, c), tab.get_verticeXY(l, c+1)
+        for l, c in zip(*np.nonzero(tab.arestas_v)):
+            yield tab.get_verticeXY(l, c), tab.get_verticeXY(l+1, c)
+
+    def __len__(self):
+        return self._tab.numero_arestas()
+
+    def __contains__(self, par):
+        return self._tab.G.has_edge(*par)
+
+
+class _VisaoGrafo:
+    """
+    Visão de compatibilidade com a API de networkx.Graph usada pelo código
+    (add_edge, remove_edge, has_edge, edges, nodes, degree, subgraph,
+    number_of_edges), lendo e escrevendo os arrays de arestas do
+    tabuleiro. O que não estiver aqui cai num networkx.Graph montado na
+    hora (para_networkx), só para leitura.
+    """
+
+    def __init__(self, tabuleiro):
+        self._tab = tabuleiro
+
+    def _aresta(self, a, b):
+        """(array, índice) da aresta entre os vértices a e b."""
+        tab = self._tab
+        a, b = sorted((int(a), int(b)))
+        l, c = divmod(a, tab.col)
+        if b == a + 1 and c < tab.col - 1:
+            return tab.arestas_h, (l, c)
+        if b == a + tab.col:
+            return tab.arestas_v, (l, c)
+        raise nx.NetworkXError('os vértices {} e {} não são vizinhos'
+                               .format(a, b))
+
+    def add_edge(self, a, b):
+        arr, idx = self._aresta(a, b)
+        arr[idx] = True
+
+    def remove_edge(self, a, b):
+        arr, idx = self._aresta(a, b)
+        if not arr[idx]:
+            raise nx.NetworkXError('a aresta {}-{} não está no grafo'
+                                   .format(int(a), int(b)))
+        arr[idx] = False
+
+    def has_edge(self, a, b):
+        try:
+            arr, idx = self._aresta(a, b)
+        except nx.NetworkXError:
+            return False
+        return bool(arr[idx])
+
+    @property
+    def edges(self):
+        return _VisaoArestas(self._tab)
 
+    @property
+    def nodes(self):
+        return list(self._tab.vertices.values())
 
-class Tabuleiro:
+    def number_of_edges(self):
+        return self._tab.numero_arestas()
+
+    def number_of_nodes(self):
+        return self._tab.numero_vertices
+
+    def degree(self, v=None):
+        graus = self._tab.graus()
+        if v is None:
+            return [(u, int(graus[u.n])) for u in self.nodes]
+        return int(graus.ravel()[int(v)])
+
+    def subgraph(self, vertices):
+        return self.para_networkx().subgraph(vertices)
+
+    def para_networkx(self):
+        """networkx.Graph com todos os vértices e as arestas do caminho."""
+        G = nx.Graph()
+        G.add_nodes_from(self.nodes)
+        G.add_edges_from(self.edges)
+        return G
+
+    def __getattr__(self, nome):
+        if nome.startswith('__'):
+            # copy/pickle procuram __reduce_ex__, __setstate__, ... antes de
+            # _tab existir: não caem no grafo montado na hora
+            raise AttributeError(nome)
+        return getattr(self.para_networkx(), nome)
+
+
+_ESTADO = struct.Struct('<4sIIIB')
+_COM_DICAS, _COM_COR, _COM_DICA_VERTICE, _FECHADO = 1, 2, 4, 8
+
+
+class Tabuleiro(_AtributosVertices):
     
     def __init__(self
                  ,lin=20
                  ,col=20
-                 ,seed=None):
+                 ,seed=None
+                 ,rng=None):
         """
         Inicia um tabuleiro vazio (sem caminho definido), dadas as dimensões.
         As dimensões lin e col representam o número de vértives do grafo que
@@ -80,10 +309,15 @@ class Tabuleiro:
         col : int, optional
             Número de colunas do tabuleiro. Valor padrão são 20 colunas.
         seed : int, optional
-            Semente utilizada para iniciar o gerador de números aleatorios
-            do numpy.random. Valor padrão é None (semente aleatória escolhida).
-            Esse parâmetro impacta como o passeio aleatório gera o caminho
-            no tabuleiro.
+            Semente do gerador de números aleatórios do tabuleiro (self.rng),
+            com a mesma sequência de np.random.seed(seed). Valor padrão é None
+            (usa o estado global do numpy.random). Esse parâmetro impacta como
+            os geradores do gerador.py sorteiam o caminho no tabuleiro.
+        rng : optional
+            Gerador explícito (Generator, RandomState, SeedSequence ou int;
+            ver normaliza_rng). Tem precedência sobre seed e não toca no
+            estado global, então tabuleiros com geradores próprios podem ser
+            gerados em paralelo.
 
         Returns
         -------
@@ -93,23 +327,83 @@ class Tabuleiro:
         self.lin = lin
         self.col = col
         self.shape = (self.lin, self.col)
-        self.G = nx.Graph()
-        self.vertices = {}
         self.numero_vertices = self.lin * self.col
-        self.caminho = []
         self.seed = seed
         self.dicas = np.zeros((lin-1,col-1))
-        
-        if seed is not None:
-            np.random.seed(seed)
-        
-        # Inclui os vértices no grafo
-        for l in range(self.lin):
-            for c in range(self.col):
-                n = self.col*l+c
-                a = Vertice(l,c,n)
-                self.G.add_node(a)
-                self.vertices[a.n] = a # Cadastra vértice em dict pelo id
+
+        # Representação compacta: o caminho é guardado em dois arrays
+        # booleanos de arestas -- arestas_h[l,c] liga (l,c)-(l,c+1) e
+        # arestas_v[l,c] liga (l,c)-(l+1,c) -- e os atributos dos vértices
+        # em arrays numpy (_AtributosVertices). Objetos Vertice só são
+        # criados quando pedidos (get_verticeXY/N), e o networkx.Graph
+        # deu lugar à visão de compatibilidade self.G
+        _AtributosVertices.__init__(self, self.numero_vertices)
+        self.arestas_h = np.zeros((lin, col-1), dtype=bool)
+        self.arestas_v = np.zeros((lin-1, col), dtype=bool)
+        self._vertices = [None]*self.numero_vertices
+        self.vertices = _VisaoVertices(self)
+        self.G = _VisaoGrafo(self)
+
+        # O caminho (lista de Vertice) é montado sob demanda a partir da
+        # ordem dos vértices (ids), quando o ciclo vem de aplica_ciclo
+        self._caminho = []
+        self._caminho_ids = None
+
+        self.rng = normaliza_rng(seed if rng is None else rng)
+
+    @property
+    def caminho(self):
+        """Lista dos vértices do caminho, em ordem de percurso."""
+        if self._caminho is None:
+            self._caminho = [self.get_verticeN(n)
+                             for n in self._caminho_ids.tolist()]
+            self._caminho_ids = None
+        return self._caminho
+
+    @caminho.setter
+    def caminho(self, vertices):
+        self._caminho = vertices
+        self._caminho_ids = None
+
+    def aplica_ciclo(self, ordem):
+        """
+        Aplica ao tabuleiro (assumido vazio) o ciclo que visita os vértices
+        na ordem dada, fechando do último para o primeiro: marca as
+        arestas, visitado=1 e ordem=1..k. Vetorizado, sem criar objetos
+        Vertice (o caminho é materializado só se for acessado).
+
+        Parameters
+        ----------
+        ordem : sequência de int
+            Números dos vértices do ciclo, em ordem de percurso.
+        """
+        ordem = np.asarray(ordem, dtype=np.int64)
+        a, b = ordem, np.roll(ordem, -1)
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        l, c = np.divmod(lo, self.col)
+        horiz = (hi - lo == 1) & (c < self.col - 1)
+        vert = hi - lo == self.col
+        if not np.all(horiz | vert):
+            raise ValueError('vértices consecutivos do ciclo não são vizinhos')
+        self.arestas_h[l[horiz], c[horiz]] = True
+        self.arestas_v[l[vert], c[vert]] = True
+        self.visitado[ordem] = 1
+        self.ordem[ordem] = np.arange(1, len(ordem) + 1)
+        self._caminho = None
+        self._caminho_ids = ordem
+
+    def numero_arestas(self):
+        """Número de arestas do caminho."""
+        return int(self.arestas_h.sum() + self.arestas_v.sum())
+
+    def graus(self):
+        """Matriz lin x col com o grau de cada vértice no caminho."""
+        g = np.zeros(self.shape, dtype=np.int64)
+        g[:, :-1] += self.arestas_h
+        g[:, 1:] += self.arestas_h
+        g[:-1, :] += self.arestas_v
+        g[1:, :] += self.arestas_v
+        return g
 
     def par(self):
         return {'lin':self.lin
@@ -170,8 +464,7 @@ class Tabuleiro:
 
         """
         if lin >= 0 and lin < self.lin and col>= 0 and col < self.col:
-            n = self.xy_para_n(lin, col)
-            return self.vertices[n]
+            return self.get_verticeN(self.xy_para_n(lin, col))
         return None
         
     def get_verticeN(self,n):
@@ -189,7 +482,11 @@ class Tabuleiro:
 
         """
         if n >= 0 and n < self.numero_vertices:
-            return self.vertices[n]
+            v = self._vertices[n]
+            if v is None:
+                l, c = divmod(int(n), self.col)
+                v = self._vertices[n] = Vertice(l, c, int(n), self)
+            return v
         return None
         
     def sorteia_vertice(self):
@@ -201,14 +498,13 @@ class Tabuleiro:
         Vértice não visitado. None se não houver mais vértices não visitados
 
         """
-        lista = np.random.choice(a=self.numero_vertices
+        lista = self.rng.choice(a=self.numero_vertices
                                  ,size=self.numero_vertices
                                  ,replace=False)
-        for i in lista:
-            v = self.get_verticeN(i)
-            if v.visitado == 0:
-                return v
-        return None
+        livres = lista[self.visitado[lista] == 0]
+        if len(livres) == 0:
+            return None
+        return self.get_verticeN(livres[0])
 
     def get_vertice_direita(self,v):
         """
@@ -332,7 +628,7 @@ class Tabuleiro:
         if len(direcao_valida) == 0:
             return None
         else:
-            return np.random.choice(direcao_valida)
+            return self.rng.choice(direcao_valida)
        
    
     def testa_fim(self,v,vertice_destino,caminho_minimo=5):
@@ -384,7 +680,9 @@ class Tabuleiro:
             Quantidade de vértices visitados pelo caminho do tabuleiro
 
         """
-        return len(self.caminho)
+        if self._caminho is None:
+            return len(self._caminho_ids)
+        return len(self._caminho)
     
     
     def get_densidade_caminho(self):
@@ -399,7 +697,7 @@ class Tabuleiro:
             Retorna a densidade do caminho do tabuleiro
 
         """
-        return len(self.caminho)/self.numero_vertices
+        return self.get_comprimento_caminho()/self.numero_vertices
 
 
     def __eq__(self, o):
@@ -408,7 +706,8 @@ class Tabuleiro:
         
         condicao1 = (self.lin == o.lin)
         condicao2 = (self.col == o.col)
-        condicao3 = (nx.utils.graphs_equal(self.G, o.G))
+        condicao3 = (np.array_equal(self.arestas_h, o.arestas_h)
+                     and np.array_equal(self.arestas_v, o.arestas_v))
         
         if (condicao1 and condicao2 and condicao3):
             return True
@@ -433,37 +732,124 @@ class Tabuleiro:
         -------
         int, representando a quantidade de vértices ocupados
         """
-        dica = 0
-        
-        v00 = self.get_verticeXY(l  ,c  )
-        v10 = self.get_verticeXY(l+1,c  )
-        v01 = self.get_verticeXY(l  ,c+1)
-        v11 = self.get_verticeXY(l+1,c+1)
-        
-        dica += 1 if self.G.has_edge(v00,v10) else 0
-        dica += 1 if self.G.has_edge(v10,v11) else 0
-        dica += 1 if self.G.has_edge(v11,v01) else 0
-        dica += 1 if self.G.has_edge(v01,v00) else 0
-            
-        return dica
+        return (int(self.arestas_h[l, c]) + int(self.arestas_h[l+1, c])
+                + int(self.arestas_v[l, c]) + int(self.arestas_v[l, c+1]))
 
     def preenche_dicas(self):
         """
-        Preenche as dicas do tabuleiro a partir do caminho gerado.
+        Preenche as dicas do tabuleiro a partir do caminho gerado, de uma
+        vez, pelos planos de arestas (solver.dicas_de_planos).
 
         Returns
         -------
         None.
 
         """
-        self.dicas = np.zeros((self.lin-1,self.col-1))
-        for l in range(self.lin-1):
-            for c in range(self.col-1):
-                dica = self.get_dica(l,c)
-                self.dicas[l][c] = dica
-                self.get_verticeXY(l,c).dica = dica
+        dicas = dicas_de_planos(self.arestas_h, self.arestas_v)
+        self.dicas = dicas.astype(float)
+        self.dica_vertice.reshape(self.shape)[:-1, :-1] = dicas
+
 
 
+    def to_bytes(self):
+        """
+        Forma compacta do tabuleiro para gravar ou enviar a outro processo:
+        dimensões, bits das arestas, bits de visitado e a ordem dos
+        vértices do caminho (mais as dicas e os atributos cor/dica dos
+        vértices, só se tiverem sido preenchidos). Objetos Vertice, o
+        caminho como lista e o gerador aleatório não entram -- from_bytes
+        refaz o resto (o caminho, sob demanda, quando for acessado).
+
+        Returns
+        -------
+        bytes
+        """
+        if self._caminho is None:
+            ids = self._caminho_ids
+        else:
+            ids = np.array([v.n for v in self._caminho], dtype=np.int64)
+        ids = np.asarray(ids, dtype='<i4')
+        marcas = 0
+        partes = []
+        if np.any(self.dicas):
+            marcas |= _COM_DICAS
+            partes.append(np.asarray(self.dicas).astype(np.int8).tobytes())
+        if np.any(self.cor != -1):
+            marcas |= _COM_COR
+            partes.append(self.cor.astype('<i4').tobytes())
+        if np.any(self.dica_vertice):
+            marcas |= _COM_DICA_VERTICE
+            partes.append(self.dica_vertice.tobytes())
+        # Passeio fechado repete o primeiro vértice no fim do caminho
+        if len(ids) > 1 and ids[0] == ids[-1]:
+            marcas |= _FECHADO
+        bits = np.packbits(np.concatenate([self.arestas_h.ravel()
+                                           ,self.arestas_v.ravel()
+                                           ,self.visitado != 0]))
+        return b''.join([_ESTADO.pack(b'SLKT', self.lin, self.col, len(ids)
+                                      ,marcas)
+                         ,bits.tobytes(), ids.tobytes()] + partes)
+
+    @classmethod
+    def from_bytes(cls, dados, seed=None, rng=None):
+        """
+        Inverso de to_bytes.
+
+        Parameters
+        ----------
+        dados : bytes
+            Saída de to_bytes.
+        seed, rng : optional
+            Gerador do tabuleiro refeito, como no construtor.
+
+        Returns
+        -------
+        Tabuleiro
+        """
+        tabuleiro = cls.__new__(cls)
+        tabuleiro._restaura(dados, seed, rng)
+        return tabuleiro
+
+    def _restaura(self, dados, seed, rng):
+        magico, lin, col, k, marcas = _ESTADO.unpack_from(dados)
+        if magico != b'SLKT':
+            raise ValueError('dados não vêm de Tabuleiro.to_bytes')
+        Tabuleiro.__init__(self, lin, col, seed=seed, rng=rng)
+        nh, nv, n = lin*(col-1), (lin-1)*col, lin*col
+        pos = _ESTADO.size
+        bits = np.unpackbits(np.frombuffer(dados, np.uint8
+                                           ,(nh + nv + n + 7) // 8, pos)
+                             ,count=nh + nv + n).astype(bool)
+        pos += (nh + nv + n + 7) // 8
+        self.arestas_h[:] = bits[:nh].reshape(lin, col-1)
+        self.arestas_v[:] = bits[nh:nh+nv].reshape(lin-1, col)
+        self.visitado[:] = bits[nh+nv:]
+        ids = np.frombuffer(dados, '<i4', k, pos).astype(np.int64)
+        pos += 4*k
+        percorridos = ids[:-1] if marcas & _FECHADO else ids
+        self.ordem[percorridos] = np.arange(1, len(percorridos) + 1)
+        self._caminho = None if k else []
+        self._caminho_ids = ids if k else None
+        if marcas & _COM_DICAS:
+            m = (lin-1)*(col-1)
+            self.dicas = np.frombuffer(dados, np.int8, m, pos).reshape(
+                lin-1, col-1).astype(float)
+            pos += m
+        if marcas & _COM_COR:
+            self.cor[:] = np.frombuffer(dados, '<i4', n, pos)
+            pos += 4*n
+        if marcas & _COM_DICA_VERTICE:
+            self.dica_vertice[:] = np.frombuffer(dados, np.int8, n, pos)
+
+    def __getstate__(self):
+        # O gerador vai junto se for próprio; o estado global do
+        # numpy.random (módulo) não é serializável e fica no destino
+        rng = None if self.rng is np.random else self.rng
+        return self.to_bytes(), self.seed, rng
+
+    def __setstate__(self, estado):
+        dados, seed, rng = estado
+        self._restaura(dados, seed, np.random if rng is None else rng)
 
     def __copy__(self):
         """
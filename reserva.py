@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Reserva de puzzles prontos: mantém, para cada balde (lin, col, dificuldade,
+metodo), uma fila de puzzles já gerados e entrega um deles em O(1). Quando
+um balde cai abaixo do nível mínimo, novos puzzles são encomendados a um
+pool de processos em segundo plano, sem bloquear quem está retirando.
+
+Feita para ficar atrás de um servidor HTTP local: todos os métodos podem ser
+chamados de várias threads (ex.: http.server.ThreadingHTTPServer), e o
+caminho de uma requisição é só retira().
+"""
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+import numpy as np
+
+import gerador as ger
+import solver as sv
+
+
+_CHAVES_ITEM = ('lin', 'col', 'dificuldade', 'dicas', 'solucao')
+
+
+def _gera_item(lin, col, dificuldade, metodo, semente, kwargs):
+    """Um puzzle da reserva (roda dentro do processo trabalhador)."""
+    tabuleiro, puzzle, dif = ger.gera_Puzzle(dificuldade=dificuldade
+                                             ,metodo=metodo
+                                             ,rng=semente
+                                             ,lin=lin
+                                             ,col=col
+                                             ,**kwargs)
+    return {'lin': lin
+            ,'col': col
+            ,'dificuldade': dif
+            ,'dicas': puzzle
+            ,'solucao': sv.arestas_do_tabuleiro(tabuleiro)}
+
+
+class _Balde:
+    __slots__ = ('prontos', 'pendentes', 'erro')
+
+    def __init__(self):
+        self.prontos = collections.deque()
+        self.pendentes = 0
+        self.erro = None
+
+
+class ReservaPuzzles:
+    """
+    Reserva de puzzles prontos com reposição em segundo plano.
+
+    Parameters
+    ----------
+    alvo : int, optional
+        Puzzles prontos (somando os em produção) que cada balde busca ter
+        depois de uma reposição. Padrão 8
+    minimo : int, optional
+        Nível mínimo: quando prontos + em produção fica abaixo dele, o
+        balde é completado até `alvo`. Padrão 4
+    processos : int, optional
+        Processos trabalhadores do pool de reposição. Padrão 2
+    seed : int, optional
+        Entropia do SeedSequence de onde sai a semente de cada puzzle
+        encomendado. Padrão None (entropia do sistema)
+    banco : BancoPuzzles, optional
+        Estoque persistente (banco.BancoPuzzles) consultado quando um
+        balde está vazio, antes de esperar o pool. O banco não guarda o
+        método nem as opções do gera_Puzzle (densidade alvo, motor, ...):
+        a consulta casa só tamanho e dificuldade, e só é feita quando o
+        balde tem dificuldade. As consultas passam por uma trava própria
+        da reserva, uma por vez, fora de _cond (uma transação lenta no
+        banco não segura as reposições). Padrão None
+    **kwargs :
+        Opções do gera_Puzzle para todos os puzzles (densidade, motor,
+        max_nos, ...).
+
+    Attributes
+    ----------
+    acertos, faltas : int
+        Retiradas atendidas na hora pela fila / que encontraram o balde
+        vazio.
+    reposicoes, erros : int
+        Puzzles entregues pelo pool / encomendas que falharam.
+
+    Notes
+    -----
+    Um servidor HTTP mínimo em cima da reserva::
+
+        reserva = ReservaPuzzles(processos=4, motor='python')
+        reserva.aquece(15, 15, 'dificil')
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                p = reserva.retira(15, 15, 'dificil', tempo_max=30)
+                ...   # responde p['dicas'] como JSON
+
+        http.server.ThreadingHTTPServer(('127.0.0.1', 8779), Handler)
+    """
+
+    def __init__(self, alvo=8, minimo=4, processos=2, seed=None, banco=None,
+                 **kwargs):
+        self.alvo = alvo
+        self.minimo = minimo
+        self.banco = banco
+        self.kwargs = kwargs
+        self._semente = np.random.SeedSequence(seed)
+        self._baldes = {}
+        self._cond = threading.Condition()
+        self._trava_banco = threading.Lock()
+        self._fechada = False
+        self._pool = concurrent.futures.ProcessPoolExecutor(processos)
+        self.acertos = 0
+        self.faltas = 0
+        self.reposicoes = 0
+        self.erros = 0
+        self._latencia_total = 0.0
+        self._latencia_maxima = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fecha()
+
+    def fecha(self):
+        """Encerra o pool (encomendas ainda na fila são canceladas)."""
+        with self._cond:
+            self._fechada = True
+            self._cond.notify_all()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------------------------------------------------------
+    # Reposição
+    # -------------------------------------------------------------------------
+    def _repoe(self, chave, balde, minimo):
+        """Completa o balde até `alvo` se ele está abaixo de `minimo`
+        (chamar com self._cond adquirido)."""
+        if self._fechada or len(balde.prontos) + balde.pendentes >= minimo:
+            return
+        lin, col, dificuldade, metodo = chave
+        for semente in self._semente.spawn(
+                max(self.alvo, minimo) - len(balde.prontos) - balde.pendentes):
+            futuro = self._pool.submit(_gera_item, lin, col, dificuldade
+                                       ,metodo, semente, self.kwargs)
+            balde.pendentes += 1
+            inicio = time.perf_counter()
+            futuro.add_done_callback(
+                lambda f, inicio=inicio: self._chegou(chave, balde, f, inicio))
+
+    def _chegou(self, chave, balde, futuro, inicio):
+        with self._cond:
+            balde.pendentes -= 1
+            if futuro.cancelled():
+                return
+            erro = futuro.exception()
+            if erro is not None:
+                self.erros += 1
+                balde.erro = erro
+            else:
+                balde.prontos.append(futuro.result())
+                self.reposicoes += 1
+                latencia = time.perf_counter() - inicio
+                self._latencia_total += latencia
+                self._latencia_maxima = max(self._latencia_maxima, latencia)
+            self._cond.notify_all()
+
+    def _balde(self, chave):
+        balde = self._baldes.get(chave)
+        if balde is None:
+            balde = self._baldes[chave] = _Balde()
+        return balde
+
+    def aquece(self, lin, col, dificuldade=None, metodo='guloso'):
+        """Encomenda de uma vez os `alvo` puzzles de um balde (ex.: na
+        subida do servidor), sem esperar por eles."""
+        chave = (lin, col, dificuldade, metodo)
+        with self._cond:
+            self._repoe(chave, self._balde(chave), self.alvo)
+
+    # -------------------------------------------------------------------------
+    # Retirada
+    # -------------------------------------------------------------------------
+    def retira(self, lin, col, dificuldade=None, metodo='guloso',
+               tempo_max=None):
+        """
+        Entrega um puzzle pronto do balde (lin, col, dificuldade, metodo).
+
+        Com o balde cheio, é só tirar o primeiro da fila (O(1)). Com ele
+        vazio (falta), tenta o banco, se houver (só tamanho e dificuldade
+        são conferidos lá), e senão espera o próximo puzzle do pool. Em todo caso o balde é reposto em segundo plano se
+        ficar abaixo do mínimo.
+
+        Parameters
+        ----------
+        lin, col : int
+            Tamanho do tabuleiro (em vértices).
+        dificuldade : str, optional
+            Dificuldade alvo (ver gera_Puzzle); None aceita a estimada.
+            Padrão None
+        metodo : str, optional
+            Método de redução (ver gera_Puzzle). Padrão 'guloso'
+        tempo_max : float, optional
+            Espera máxima, em segundos, numa falta. Padrão None (sem
+            limite)
+
+        Returns
+        -------
+        dict com lin, col, dificuldade, dicas (matriz com -1 nas células
+        sem dica) e solucao (frozenset de ids de aresta), ou None se o
+        tempo acabou (ou a reserva foi fechada) sem puzzle.
+        """
+        chave = (lin, col, dificuldade, metodo)
+        with self._cond:
+            balde = self._balde(chave)
+            if balde.prontos:
+                self.acertos += 1
+                item = balde.prontos.popleft()
+                self._repoe(chave, balde, self.minimo)
+                return item
+            self.faltas += 1
+            self._repoe(chave, balde, max(self.minimo, 1))
+        if self.banco is not None and dificuldade is not None:
+            with self._trava_banco:
+                item = self.banco.sorteia(lin, col, dificuldade)
+            if item is not None:
+                # As mesmas chaves de um item do pool
+                return {k: item[k] for k in _CHAVES_ITEM}
+        with self._cond:
+            self._cond.wait_for(lambda: (balde.prontos or balde.erro
+                                         or self._fechada), tempo_max)
+            if balde.erro is not None and not balde.prontos:
+                erro, balde.erro = balde.erro, None
+                raise erro
+            if not balde.prontos:
+                return None
+            item = balde.prontos.popleft()
+            self._repoe(chave, balde, self.minimo)
+            return item
+
+    def estatisticas(self):
+        """
+        Contadores da reserva: acertos, faltas, reposicoes, erros, a
+        latência das reposições (segundos entre a encomenda e a chegada:
+        media e maxima) e, por balde, (prontos, em produção).
+        """
+        with self._cond:
+            return {'acertos': self.acertos
+                    ,'faltas': self.faltas
+                    ,'reposicoes': self.reposicoes
+                    ,'erros': self.erros
+                    ,'latencia_media': (self._latencia_total
+                                        / max(self.reposicoes, 1))
+                    ,'latencia_maxima': self._latencia_maxima
+                    ,'baldes': {chave: (len(b.prontos), b.pendentes)
+                                for chave, b in self._baldes.items()}}
@@ -28,6 +28,10 @@ Enumeração das arestas (lin x col vértices):
   - verticais   (l,c)-(l+1,c): id = lin*(col-1) + l*col + c
 """
 
+import functools
+import time
+from collections import namedtuple
+
 import numpy as np
 
 DESCONHECIDA = 0
@@ -49,19 +53,159 @@ def id_aresta_vertical(l, c, lin, col):
     return lin*(col-1) + l*col + c
 
 
+Topologia = namedtuple('Topologia', ['lin', 'col', 'nH', 'nE', 'nv'
+                                     ,'vertices_aresta', 'arestas_vertice'
+                                     ,'grau', 'arestas_celula'
+                                     ,'cortes_verticais', 'cortes_horizontais'])
+
+
+# Topologias registradas por registra_topologia (ex.: arrays numa memória
+# compartilhada entre processos, ver compartilhado.py), por (lin, col)
+_topologias_registradas = {}
+
+
+def registra_topologia(topo):
+    """
+    Faz topologia(topo.lin, topo.col) devolver `topo` neste processo, em vez
+    de montar os arrays: usado pelos trabalhadores que enxergam a topologia
+    de uma memória compartilhada (compartilhado.anexa_topologia). Os arrays
+    precisam ser iguais aos que topologia montaria.
+    """
+    _topologias_registradas[(topo.lin, topo.col)] = topo
+    _estrutura.cache_clear()
+
+
+def desregistra_topologia(lin, col):
+    """Desfaz registra_topologia: volta a montar os arrays localmente."""
+    _topologias_registradas.pop((lin, col), None)
+    _estrutura.cache_clear()
+
+
+def topologia(lin, col):
+    """
+    Estrutura estática do grid lin x col na enumeração do Solver, em arrays
+    NumPy (somente leitura), calculada uma vez por dimensão e reaproveitada
+    por todos os oráculos do mesmo tamanho (ou a registrada com
+    registra_topologia):
+
+      - vertices_aresta   (nE,2): os dois vértices de cada aresta;
+      - arestas_vertice   (nv,4): arestas de cada vértice, completadas com -1;
+      - grau              (nv,):  número de arestas de cada vértice;
+      - arestas_celula    ((lin-1)*(col-1),4): as 4 arestas de cada célula
+                          (cima, baixo, esquerda, direita);
+      - cortes_verticais  (col-1,lin): arestas que cruzam cada corte vertical;
+      - cortes_horizontais(lin-1,col): arestas que cruzam cada corte horizontal.
+    """
+    topo = _topologias_registradas.get((lin, col))
+    if topo is not None:
+        return topo
+    return _monta_topologia(lin, col)
+
+
+@functools.lru_cache(maxsize=16)
+def _monta_topologia(lin, col):
+    nH = lin*(col-1)
+    nE = nH + (lin-1)*col
+    nv = lin*col
+
+    # Ids das arestas arrumados nos "planos" horizontal e vertical
+    h = np.arange(nH).reshape(lin, col-1)
+    v = np.arange(nH, nE).reshape(lin-1, col)
+    n = np.arange(nv).reshape(lin, col)
+
+    vertices_aresta = np.empty((nE, 2), dtype=np.int64)
+    vertices_aresta[:nH, 0] = n[:, :-1].ravel()
+    vertices_aresta[:nH, 1] = n[:, 1:].ravel()
+    vertices_aresta[nH:, 0] = n[:-1, :].ravel()
+    vertices_aresta[nH:, 1] = n[1:, :].ravel()
+
+    # Arestas por vértice: direita, esquerda, abaixo, acima (-1 se não há)
+    arestas_vertice = np.full((lin, col, 4), -1, dtype=np.int64)
+    arestas_vertice[:, :-1, 0] = h
+    arestas_vertice[:, 1:, 1] = h
+    arestas_vertice[:-1, :, 2] = v
+    arestas_vertice[1:, :, 3] = v
+    arestas_vertice = arestas_vertice.reshape(nv, 4)
+    # Compacta as arestas válidas à esquerda de cada linha
+    ordem = np.argsort(arestas_vertice < 0, axis=1, kind='stable')
+    arestas_vertice = np.take_along_axis(arestas_vertice, ordem, axis=1)
+    grau = (arestas_vertice >= 0).sum(axis=1)
+
+    arestas_celula = np.stack([h[:-1, :], h[1:, :], v[:, :-1], v[:, 1:]]
+                              ,axis=-1).reshape(-1, 4)
+
+    topo = Topologia(lin, col, nH, nE, nv
+                     ,vertices_aresta, arestas_vertice, grau, arestas_celula
+                     ,np.ascontiguousarray(h.T), v)
+    for a in topo[5:]:
+        a.flags.writeable = False
+    return topo
+
+
+@functools.lru_cache(maxsize=16)
+def _estrutura(lin, col):
+    """
+    A topologia em listas Python, a forma que o laço de propagação do
+    Solver percorre: (arestas_vertice, vertices_aresta, arestas_celula,
+    corte_aresta, arestas_corte), com as arestas de cada vértice em ordem
+    crescente. Montada uma vez por dimensão e compartilhada por todas as
+    instâncias do processo -- ninguém pode alterá-las.
+    """
+    topo = topologia(lin, col)
+    arestas_vertice = [linha[:g] for linha, g
+                       in zip(np.sort(np.where(topo.arestas_vertice < 0
+                                               ,topo.nE
+                                               ,topo.arestas_vertice)
+                                      ,axis=1).tolist()
+                              ,topo.grau.tolist())]
+    vertices_aresta = list(map(tuple, topo.vertices_aresta.tolist()))
+    arestas_corte = (topo.cortes_verticais.tolist()
+                     + topo.cortes_horizontais.tolist())
+    corte_aresta = [0]*topo.nE
+    for ct, arestas in enumerate(arestas_corte):
+        for e in arestas:
+            corte_aresta[e] = ct
+    return (arestas_vertice, vertices_aresta, topo.arestas_celula.tolist()
+            ,corte_aresta, arestas_corte)
+
+
+def planos_de_solucao(lin, col, solucao):
+    """
+    Planos booleanos (h, v) de um conjunto de arestas (ids na enumeração do
+    Solver): h[l,c] é a aresta (l,c)-(l,c+1), matriz lin x (col-1), e
+    v[l,c] é a aresta (l,c)-(l+1,c), matriz (lin-1) x col -- o mesmo
+    formato de Tabuleiro.arestas_h / arestas_v. Como os ids seguem a ordem
+    dos planos achatados, a conversão é só um reshape.
+    """
+    nH = lin*(col-1)
+    bits = np.zeros(nH + (lin-1)*col, dtype=bool)
+    bits[list(solucao)] = True
+    return bits[:nH].reshape(lin, col-1), bits[nH:].reshape(lin-1, col)
+
+
+def solucao_de_planos(h, v):
+    """Conjunto (frozenset) de ids das arestas marcadas nos planos (h, v)."""
+    bits = np.concatenate([np.ravel(h), np.ravel(v)])
+    return frozenset(np.flatnonzero(bits).tolist())
+
+
+def dicas_de_planos(h, v):
+    """
+    Matriz de dicas (lin-1)x(col-1) dos planos de arestas (h, v): cada
+    célula soma as arestas de cima, de baixo, da esquerda e da direita,
+    com quatro somas de fatias.
+    """
+    h = np.asarray(h, dtype=np.int64)
+    v = np.asarray(v, dtype=np.int64)
+    return h[:-1] + h[1:] + v[:, :-1] + v[:, 1:]
+
+
 def arestas_do_tabuleiro(tabuleiro):
     """
     Conjunto (frozenset) com os ids das arestas do caminho do tabuleiro,
     na enumeração usada pelo Solver.
     """
-    lin, col = tabuleiro.lin, tabuleiro.col
-    arestas = set()
-    for a, b in tabuleiro.G.edges:
-        if a.l == b.l:
-            arestas.add(id_aresta_horizontal(a.l, min(a.c, b.c), col))
-        else:
-            arestas.add(id_aresta_vertical(min(a.l, b.l), a.c, lin, col))
-    return frozenset(arestas)
+    return solucao_de_planos(tabuleiro.arestas_h, tabuleiro.arestas_v)
 
 
 def dicas_de_solucao(lin, col, solucao):
@@ -69,16 +213,7 @@ def dicas_de_solucao(lin, col, solucao):
     Matriz de dicas (lin-1)x(col-1) induzida por um conjunto de arestas
     (ids na enumeração do Solver).
     """
-    dicas = np.zeros((lin-1, col-1), dtype=int)
-    for l in range(lin-1):
-        for c in range(col-1):
-            n = 0
-            n += id_aresta_horizontal(l, c, col) in solucao
-            n += id_aresta_horizontal(l+1, c, col) in solucao
-            n += id_aresta_vertical(l, c, lin, col) in solucao
-            n += id_aresta_vertical(l, c+1, lin, col) in solucao
-            dicas[l, c] = n
-    return dicas
+    return dicas_de_planos(*planos_de_solucao(lin, col, solucao))
 
 
 def padroes_fixos(lin, col, dicas):
@@ -145,6 +280,114 @@ def padroes_fixos(lin, col, dicas):
     return out
 
 
+class Cancelado(Exception):
+    """Trabalho interrompido por Controle.cancela()."""
+
+
+class PrazoEsgotado(Cancelado):
+    """Trabalho interrompido porque o prazo do Controle acabou."""
+
+
+Progresso = namedtuple('Progresso', ['fase', 'dicas', 'chamadas', 'nos'
+                                     ,'decorrido'])
+
+
+class Controle:
+    """
+    Ficha de cancelamento, prazo e progresso repassada do gera_Puzzle e dos
+    redutores até o oráculo (Solver ou SolverCpSat).
+
+    É conferida a cada `intervalo` nós da busca do Solver, a cada chamada
+    do oráculo (gerador._novo_oraculo), a cada troca de fase dos redutores
+    e, no CP-SAT, por uma thread que interrompe o Solve em andamento. Cada
+    conferência também avisa ao_progresso. Depois de cancela() (ou com o
+    prazo vencido), a conferência seguinte levanta Cancelado (PrazoEsgotado).
+
+    Parameters
+    ----------
+    ao_progresso : callable, optional
+        Chamada com um Progresso (fase, dicas, chamadas, nos, decorrido) a
+        cada conferência. Pode interromper o trabalho chamando cancela()
+        ou levantando Cancelado. Padrão None
+    intervalo : int, optional
+        Nós da busca do Solver entre duas conferências. Padrão 1024
+    prazo : float, optional
+        Segundos, contados da criação do Controle, até o trabalho ser
+        interrompido. Na redução de dicas o prazo não é um erro: os
+        redutores do gerador param e devolvem o melhor puzzle de solução
+        única obtido até ali (e ligam `truncado`). Padrão None (sem prazo)
+
+    Attributes
+    ----------
+    fase : str
+        Etapa atual: 'tabuleiro', 'mapa' (unicidade do mapa completo),
+        'adicao' (fase de adição do CEGAR), 'minimizacao' ou 'binaria'.
+    dicas : int
+        Dicas do último puzzle mandado ao oráculo (None antes da primeira
+        chamada).
+    chamadas, nos : int
+        Chamadas do oráculo e nós de busca (ramificações, no CP-SAT) até
+        agora.
+    truncado : bool
+        True se o prazo acabou durante uma redução e o redutor devolveu um
+        puzzle ainda não minimizado.
+    """
+
+    def __init__(self, ao_progresso=None, intervalo=1024, prazo=None):
+        self.ao_progresso = ao_progresso
+        self.intervalo = intervalo
+        self.prazo = prazo
+        self.inicio = time.monotonic()
+        self.cancelado = False
+        self.fase = None
+        self.dicas = None
+        self.chamadas = 0
+        self.nos = 0
+        self.truncado = False
+
+    def cancela(self):
+        self.cancelado = True
+
+    def decorrido(self):
+        """Segundos desde a criação do Controle."""
+        return time.monotonic() - self.inicio
+
+    def progresso(self):
+        return Progresso(self.fase, self.dicas, self.chamadas, self.nos
+                         ,self.decorrido())
+
+    def interrompido(self):
+        """True se o trabalho foi cancelado ou o prazo acabou (sem
+        levantar nada; usado pela thread que vigia o CP-SAT)."""
+        return self.cancelado or (self.prazo is not None
+                                  and self.decorrido() > self.prazo)
+
+    def confere(self):
+        """Avisa ao_progresso e levanta Cancelado (PrazoEsgotado) se o
+        trabalho foi interrompido."""
+        if self.ao_progresso is not None:
+            self.ao_progresso(self.progresso())
+        if self.interrompido():
+            if self.cancelado:
+                raise Cancelado()
+            raise PrazoEsgotado('prazo de {} s esgotado'.format(self.prazo))
+
+    def muda_fase(self, fase):
+        self.fase = fase
+        self.confere()
+
+    def chamada(self, dicas):
+        """Registra uma chamada do oráculo com a matriz `dicas`."""
+        self.chamadas += 1
+        self.dicas = int((np.asarray(dicas) >= 0).sum())
+        self.confere()
+
+    def conta_nos(self, n):
+        """Soma `n` nós de busca."""
+        self.nos += n
+        self.confere()
+
+
 class Solver:
     """
     Solver para um tabuleiro lin x col com a matriz de dicas informada.
@@ -154,12 +397,18 @@ class Solver:
 
     Cada instância serve para uma única chamada de conta_solucoes() ou
     resolve() -- o estado interno não é reiniciado entre chamadas.
+
+    Com um `controle` (Controle), a busca soma os nós nele e o confere a
+    cada controle.intervalo nós, parando com Cancelado se ele foi
+    interrompido.
     """
 
-    def __init__(self, lin, col, dicas, max_nos=60000, semear=True):
+    def __init__(self, lin, col, dicas, max_nos=60000, semear=True,
+                 controle=None):
         self.lin = lin
         self.col = col
         self.max_nos = max_nos
+        self.controle = controle
         self.semear = semear   # semear padrões fixos antes de propagar/buscar
         dicas = np.asarray(dicas).astype(int)
         self._dicas = dicas    # guardado p/ derivar os padrões fixos
@@ -169,25 +418,16 @@ class Solver:
         nv = lin*col
         self.nE = nE
 
-        # Estrutura do grafo: arestas por vértice e vértices por aresta
-        arestas_vertice = [[] for _ in range(nv)]
-        vertices_aresta = [None]*nE
-        for l in range(lin):
-            for c in range(col-1):
-                e = l*(col-1) + c
-                v1, v2 = l*col + c, l*col + c + 1
-                arestas_vertice[v1].append(e)
-                arestas_vertice[v2].append(e)
-                vertices_aresta[e] = (v1, v2)
-        for l in range(lin-1):
-            for c in range(col):
-                e = nH + l*col + c
-                v1, v2 = l*col + c, (l+1)*col + c
-                arestas_vertice[v1].append(e)
-                arestas_vertice[v2].append(e)
-                vertices_aresta[e] = (v1, v2)
+        # Estrutura do grafo: arestas por vértice e vértices por aresta,
+        # arestas de cada célula e cortes do tabuleiro (listas estáticas por
+        # dimensão, compartilhadas entre as instâncias). O corte vertical c
+        # é cruzado pelas arestas horizontais (l,c)-(l,c+1); o corte
+        # horizontal l é cruzado pelas arestas verticais (l,c)-(l+1,c).
+        # Pela paridade da curva fechada, cada corte tem um número par de
+        # arestas DENTRO
+        (arestas_vertice, self.vertices_aresta, quatro_arestas
+         ,self.corte_aresta, self.arestas_corte) = _estrutura(lin, col)
         self.arestas_vertice = arestas_vertice
-        self.vertices_aresta = vertices_aresta
 
         # Células com dica
         n_cel = (lin-1)*(col-1)
@@ -195,40 +435,17 @@ class Solver:
         self.arestas_celula = [None]*n_cel
         self.celulas_aresta = [[] for _ in range(nE)]
         self.ids_celulas = []
-        for l in range(lin-1):
-            for c in range(col-1):
-                k = dicas[l, c]
-                if k < 0:
-                    continue
-                cel = l*(col-1) + c
-                quatro = [id_aresta_horizontal(l, c, col)
-                          ,id_aresta_horizontal(l+1, c, col)
-                          ,id_aresta_vertical(l, c, lin, col)
-                          ,id_aresta_vertical(l, c+1, lin, col)]
-                self.dica_celula[cel] = k
-                self.arestas_celula[cel] = quatro
-                self.ids_celulas.append(cel)
-                for e in quatro:
-                    self.celulas_aresta[e].append(cel)
-
-        # Cortes do tabuleiro: o corte vertical c é cruzado pelas arestas
-        # horizontais (l,c)-(l,c+1); o corte horizontal l é cruzado pelas
-        # arestas verticais (l,c)-(l+1,c). Pela paridade da curva fechada,
-        # cada corte tem um número par de arestas DENTRO
+        for cel, k in enumerate(dicas.ravel().tolist()):
+            if k < 0:
+                continue
+            quatro = quatro_arestas[cel]
+            self.dica_celula[cel] = k
+            self.arestas_celula[cel] = quatro
+            self.ids_celulas.append(cel)
+            for e in quatro:
+                self.celulas_aresta[e].append(cel)
+
         n_cortes = (col-1) + (lin-1)
-        self.corte_aresta = [0]*nE
-        self.arestas_corte = [[] for _ in range(n_cortes)]
-        for l in range(lin):
-            for c in range(col-1):
-                e = l*(col-1) + c
-                self.corte_aresta[e] = c
-                self.arestas_corte[c].append(e)
-        for l in range(lin-1):
-            for c in range(col):
-                e = nH + l*col + c
-                ct = (col-1) + l
-                self.corte_aresta[e] = ct
-                self.arestas_corte[ct].append(e)
         self.in_corte = [0]*n_cortes
         self.unk_corte = [len(self.arestas_corte[ct])
                           for ct in range(n_cortes)]
@@ -528,6 +745,8 @@ class Solver:
             # Orçamento de busca estourado: o resultado é inconclusivo
             self.completa = False
             return
+        if self.controle is not None and self.nos % self.controle.intervalo == 0:
+            self.controle.conta_nos(self.controle.intervalo)
         if not self._conectavel():
             return
         e = self._escolhe_aresta()
@@ -564,13 +783,29 @@ class Solver:
         limite) e solucoes é a lista dos conjuntos de ids de arestas de
         cada solução.
         """
+        if not self.decide_por_propagacao():
+            self._busca(limite)
+        if self.controle is not None:
+            self.controle.nos += self.nos % self.controle.intervalo
+        return self.num_solucoes, self.solucoes
+
+    def decide_por_propagacao(self):
+        """
+        Passo barato, sem busca: semeia os padrões fixos (se semear) e
+        propaga as regras locais até o ponto fixo.
+
+        Retorna True se isso já decide o puzzle: houve contradição (0
+        soluções) ou o laço foi fechado -- e então a solução registrada é
+        a ÚNICA, pois toda dedução vale em qualquer solução e um laço
+        fechado só com arestas forçadas é o laço inteiro. Retorna False se
+        a propagação parou sem decidir (o estado fica no ponto fixo, pronto
+        para a busca).
+        """
         # busca esperta: semeia os padrões fixos antes de propagar/buscar
         if self.semear and not self._semeia_padroes():
-            return self.num_solucoes, self.solucoes   # contradição: 0 soluções
+            return True   # contradição: 0 soluções
         self.fila.extend((_CELULA, cel) for cel in self.ids_celulas)
-        if self._propaga():
-            self._busca(limite)
-        return self.num_solucoes, self.solucoes
+        return not self._propaga()
 
     def resolve(self, profundidade=0):
         """
@@ -7,9 +7,15 @@ Modela cada aresta como uma variável booleana com as restrições lineares
 das dicas das células. A restrição de laço ÚNICO usa AddCircuit, a
 restrição nativa de circuito do CP-SAT: cada aresta vira dois arcos
 direcionados (um literal por sentido) e cada vértice ganha um arco-laço
-("self-loop") que o marca como fora do circuito. O AddCircuit exige
-exatamente um circuito cobrindo os vértices não pulados -- exatamente a
-regra do Slitherlink, sem eliminação preguiçosa de subciclos.
+("self-loop") que o marca como fora do circuito (o próprio literal de
+grau do vértice, negado). O AddCircuit exige exatamente um circuito
+cobrindo os vértices não pulados -- exatamente a regra do Slitherlink,
+sem eliminação preguiçosa de subciclos.
+
+O modelo é montado em lote (variáveis sem nome, índices vindos de
+solver.topologia, restrições emitidas por família em formato texto e lidas
+de uma vez pelo protobuf), o que mantém a montagem barata mesmo em
+tabuleiros de 100x100.
 
 A interface (conta_solucoes, num_solucoes, solucoes, completa) é compatível
 com slitherlink.solver.Solver, usando a mesma enumeração de arestas, para
@@ -18,12 +24,13 @@ servir de substituto direto em gerador.reduz_dicas().
 Requer: pip install ortools
 """
 
+import threading
 import time
 
 import numpy as np
 from ortools.sat.python import cp_model
 
-from solver import id_aresta_horizontal, id_aresta_vertical
+from solver import topologia
 
 
 class SolverCpSat:
@@ -48,104 +55,162 @@ class SolverCpSat:
     trabalhadores : int, optional
         Número de threads de busca do CP-SAT. Padrão 8. Com mais de um
         trabalhador o resultado deixa de ser determinístico (a solução
-        alternativa encontrada pode variar entre execuções).
+        alternativa encontrada pode variar entre execuções), a não ser com
+        deterministico=True.
+    deterministico : bool, optional
+        Se True, as soluções devolvidas por conta_solucoes são canônicas:
+        as primeiras em ordem lexicográfica da diferença (XOR) para a
+        solução de referência (o hint; sem hint, o vetor nulo), com a
+        aresta 0 como a mais significativa. A busca continua paralela; as
+        soluções achadas por ela só servem de ponto de partida para uma
+        minimização lexicográfica em blocos de arestas (ver _lexmin). O
+        resultado independe do número de trabalhadores e de execução para
+        execução (o próprio hint, quando é solução, vem sempre primeiro).
+        Padrão False.
+    controle : solver.Controle, optional
+        Ficha de cancelamento/progresso: uma thread a confere durante cada
+        Solve e o interrompe (StopSearch) se ela foi cancelada ou o prazo
+        acabou; as ramificações de cada Solve são somadas em controle.nos.
+        Padrão None
+
+    Attributes
+    ----------
+    tempo_modelo : float
+        Segundos gastos montando o modelo (topologia + restrições).
+    tempo_busca : float
+        Segundos gastos dentro do CP-SAT, somados entre as chamadas de
+        Solve de conta_solucoes.
     """
 
     def __init__(self, lin, col, dicas, max_nos=None, tempo_max=60.0,
-                 solucao_hint=None, trabalhadores=8):
+                 solucao_hint=None, trabalhadores=8, deterministico=False,
+                 controle=None):
+        t0 = time.perf_counter()
         self.lin = lin
         self.col = col
         self.tempo_max = tempo_max
+        self.controle = controle
         self.trabalhadores = trabalhadores
+        self.deterministico = deterministico
         dicas = np.asarray(dicas).astype(int)
 
-        nH = lin*(col-1)
-        nE = nH + (lin-1)*col
+        topo = topologia(lin, col)
+        nE, nv = topo.nE, topo.nv
         self.nE = nE
+        self.vertices_aresta = topo.vertices_aresta
 
-        # Vértices por aresta (mesma enumeração do solver puro-Python)
-        vertices_aresta = [None]*nE
-        for l in range(lin):
-            for c in range(col-1):
-                vertices_aresta[l*(col-1) + c] = (l*col + c, l*col + c + 1)
-        for l in range(lin-1):
-            for c in range(col):
-                vertices_aresta[nH + l*col + c] = (l*col + c, (l+1)*col + c)
-        self.vertices_aresta = vertices_aresta
+        # Montagem em lote: cada família de restrições vira um bloco de
+        # texto (formato texto do protobuf do CP-SAT) gerado de uma vez a
+        # partir dos arrays de topologia, e o modelo inteiro é lido por uma
+        # única chamada em C++ -- em vez de dezenas de milhares de
+        # NewBoolVar/Add com nomes formatados pelo wrapper Python.
+        # Layout das variáveis (sem nomes):
+        #   [0, nE)      x: aresta no laço
+        #   [nE, 2nE)    arco v1 -> v2 da aresta
+        #   [2nE, 3nE)   arco v2 -> v1 da aresta
+        #   [3nE, +nv)   vértice usado pelo laço (grau 2)
+        #   depois       metade do número de arestas de cada corte
+        X, IDA, VOLTA, USA = 0, nE, 2*nE, 3*nE
+        PAR = USA + nv
+        blocos = ['variables { domain: [0, 1] }\n' * PAR]
+        blocos += ['variables { domain: [0, %d] }\n' % (lin//2)] * (col-1)
+        blocos += ['variables { domain: [0, %d] }\n' % (col//2)] * (lin-1)
 
-        m = cp_model.CpModel()
-        x = [m.NewBoolVar('e{}'.format(i)) for i in range(nE)]
+        def lineares(linhas_vars, linhas_coefs, dominios):
+            return ''.join(
+                'constraints { linear { vars: [%s] coeffs: [%s] '
+                'domain: [%d, %d] } }\n'
+                % (', '.join(map(str, vs)), cf, lo, hi)
+                for vs, cf, (lo, hi) in zip(linhas_vars, linhas_coefs
+                                            ,dominios))
+
+        arestas = np.arange(nE)
+
+        # A aresta está no laço se é usada em um dos dois sentidos
+        blocos.append(lineares(
+            np.stack([X+arestas, IDA+arestas, VOLTA+arestas], 1).tolist()
+            ,['1, -1, -1']*nE, [(0, 0)]*nE))
 
         # Um circuito único: cada aresta vira dois arcos direcionados e
-        # cada vértice tem um arco-laço que o tira do circuito
-        arcos = []
-        for e, (v1, v2) in enumerate(vertices_aresta):
-            ida = m.NewBoolVar('a{}_'.format(e))
-            volta = m.NewBoolVar('a_{}'.format(e))
-            arcos.append((v1, v2, ida))
-            arcos.append((v2, v1, volta))
-            # A aresta está no laço se é usada em um dos dois sentidos
-            m.Add(x[e] == ida + volta)
-        for v in range(lin*col):
-            fora = m.NewBoolVar('s{}'.format(v))
-            arcos.append((v, v, fora))
-        m.AddCircuit(arcos)
+        # cada vértice tem um arco-laço que o tira do circuito. O arco-laço
+        # é a negação do literal de grau (vértice fora do laço <=> grau 0),
+        # sem variável própria
+        v1, v2 = topo.vertices_aresta[:, 0], topo.vertices_aresta[:, 1]
+        vs = np.arange(nv)
+        blocos.append('constraints { circuit { tails: [%s] heads: [%s] '
+                      'literals: [%s] } }\n' % (
+            ', '.join(map(str, np.concatenate([v1, v2, vs]).tolist()))
+            ,', '.join(map(str, np.concatenate([v2, v1, vs]).tolist()))
+            ,', '.join(map(str, np.concatenate(
+                [np.arange(IDA, USA), -(USA+vs)-1]).tolist()))))
 
         # Dicas das células
-        for l in range(lin-1):
-            for c in range(col-1):
-                k = dicas[l, c]
-                if k < 0:
-                    continue
-                quatro = [id_aresta_horizontal(l, c, col)
-                          ,id_aresta_horizontal(l+1, c, col)
-                          ,id_aresta_vertical(l, c, lin, col)
-                          ,id_aresta_vertical(l, c+1, lin, col)]
-                m.Add(sum(x[e] for e in quatro) == k)
+        com_dica = np.flatnonzero(dicas.ravel() >= 0)
+        ks = dicas.ravel()[com_dica].tolist()
+        blocos.append(lineares(topo.arestas_celula[com_dica].tolist()
+                               ,['1, 1, 1, 1']*len(ks), zip(ks, ks)))
 
         # O laço é obrigatório (o menor ciclo do grid tem 4 arestas)
-        m.Add(sum(x) >= 4)
+        blocos.append(lineares([arestas.tolist()], [', '.join(['1']*nE)]
+                               ,[(4, nE)]))
 
         # Restrições redundantes (implícitas no circuito, mas fortalecem
         # a propagação do CP-SAT em tabuleiros com poucas dicas):
         # 1) grau de cada vértice: 0 ou 2
-        arestas_vertice = [[] for _ in range(lin*col)]
-        for e, (v1, v2) in enumerate(vertices_aresta):
-            arestas_vertice[v1].append(e)
-            arestas_vertice[v2].append(e)
-        for v, lst in enumerate(arestas_vertice):
-            usa = m.NewBoolVar('g{}'.format(v))
-            m.Add(sum(x[e] for e in lst) == 2*usa)
+        grau = topo.grau.tolist()
+        blocos.append(lineares(
+            [lst[:g] + [USA+v] for v, (lst, g)
+             in enumerate(zip(topo.arestas_vertice.tolist(), grau))]
+            ,[', '.join(['1']*g + ['-2']) for g in grau], [(0, 0)]*nv))
         # 2) paridade dos cortes: o laço cruza cada linha do grid um
         # número par de vezes (curva de Jordan)
-        for c in range(col-1):
-            cruzam = [l*(col-1) + c for l in range(lin)]
-            meio = m.NewIntVar(0, lin//2, 'pc{}'.format(c))
-            m.Add(sum(x[e] for e in cruzam) == 2*meio)
-        for l in range(lin-1):
-            cruzam = [nH + l*col + c for c in range(col)]
-            meio = m.NewIntVar(0, col//2, 'pl{}'.format(l))
-            m.Add(sum(x[e] for e in cruzam) == 2*meio)
-
-        # Palpite inicial: a solução conhecida (se fornecida)
+        cortes = (topo.cortes_verticais.tolist()
+                  + topo.cortes_horizontais.tolist())
+        blocos.append(lineares(
+            [cruzam + [PAR+i] for i, cruzam in enumerate(cortes)]
+            ,[', '.join(['1']*len(cruzam) + ['-2']) for cruzam in cortes]
+            ,[(0, 0)]*len(cortes)))
+
+        # Palpite inicial: a solução conhecida (se fornecida). Também é a
+        # referência da ordem canônica do modo determinístico
+        hint = np.zeros(nE, dtype=np.int64)
         if solucao_hint is not None:
-            for e in range(nE):
-                m.AddHint(x[e], 1 if e in solucao_hint else 0)
+            hint[list(solucao_hint)] = 1
+            blocos.append('solution_hint { vars: [%s] values: [%s] }\n' % (
+                ', '.join(map(str, arestas.tolist()))
+                ,', '.join(map(str, hint.tolist()))))
+
+        m = cp_model.CpModel()
+        m.Proto().merge_text_format(''.join(blocos))
 
         self.modelo = m
-        self.x = x
+        self.referencia = hint
+        # Cópia do modelo antes dos bloqueios de conta_solucoes, base das
+        # minimizações do modo determinístico
+        self._base = m.Clone() if deterministico else None
         self.num_solucoes = 0
         self.solucoes = []
         self.completa = True
+        self.tempo_modelo = time.perf_counter() - t0   # montagem do modelo
+        self.tempo_busca = 0.0                        # soma das chamadas Solve
+
+    @property
+    def x(self):
+        """Variáveis booleanas das arestas (criadas sob demanda)."""
+        return [self.modelo.GetBoolVarFromProtoIndex(e) for e in range(self.nE)]
 
     def conta_solucoes(self, limite=2):
         """
         Conta as soluções do puzzle, parando ao atingir o limite.
-        Mesma interface de solver.Solver.conta_solucoes().
+        Mesma interface de solver.Solver.conta_solucoes(). O tempo gasto
+        dentro do CP-SAT é acumulado em self.tempo_busca (a montagem do
+        modelo fica à parte, em self.tempo_modelo).
+
+        Com deterministico=True, as soluções achadas são trocadas pelas
+        canônicas (ver a docstring da classe) antes de retornar; se o
+        tempo acabar durante a canonização, self.completa fica False.
         """
-        solver = cp_model.CpSolver()
-        solver.parameters.num_search_workers = self.trabalhadores
-        solver.parameters.random_seed = 0
+        solver = self._novo_solver()
 
         t0 = time.monotonic()
         while self.num_solucoes < limite:
@@ -155,19 +220,149 @@ class SolverCpSat:
                 break
             solver.parameters.max_time_in_seconds = restante
 
-            status = solver.Solve(self.modelo)
+            status = self._resolve(solver, self.modelo)
             if status == cp_model.INFEASIBLE:
                 break   # não há mais soluções: contagem completa
             if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
                 self.completa = False
                 break
 
-            sol = frozenset(e for e in range(self.nE)
-                            if solver.Value(self.x[e]))
+            valores = np.asarray(list(solver.ResponseProto().solution))[:self.nE]
+            sol = frozenset(np.flatnonzero(valores).tolist())
             self.solucoes.append(sol)
             self.num_solucoes += 1
             # Bloqueia esta solução: nenhum outro ciclo simples pode
             # conter todas as arestas dela
-            self.modelo.Add(sum(self.x[e] for e in sol) <= len(sol) - 1)
+            ct = self.modelo.Proto().constraints.add().linear
+            ct.vars.extend(sorted(sol))
+            ct.coeffs.extend([1]*len(sol))
+            ct.domain.extend((0, len(sol) - 1))
 
+        if self.deterministico and self.completa and self.solucoes:
+            self.solucoes = self._canoniza(limite, t0 + self.tempo_max)
         return self.num_solucoes, self.solucoes
+
+    def _novo_solver(self):
+        solver = cp_model.CpSolver()
+        solver.parameters.num_search_workers = self.trabalhadores
+        solver.parameters.random_seed = 0
+        return solver
+
+    def _resolve(self, solver, modelo):
+        """
+        solver.Solve(modelo), somando o tempo em self.tempo_busca. Com um
+        controle, uma thread vigia controle.interrompido() enquanto o CP-SAT
+        busca e chama StopSearch; depois do Solve as ramificações entram em
+        controle.nos e a conferência levanta Cancelado se foi o caso.
+        """
+        t_busca = time.perf_counter()
+        if self.controle is None:
+            status = solver.Solve(modelo)
+        else:
+            fim = threading.Event()
+
+            def vigia():
+                while not fim.wait(0.02):
+                    if self.controle.interrompido():
+                        solver.StopSearch()
+                        return
+
+            sentinela = threading.Thread(target=vigia, daemon=True)
+            sentinela.start()
+            try:
+                status = solver.Solve(modelo)
+            finally:
+                fim.set()
+                sentinela.join()
+        self.tempo_busca += time.perf_counter() - t_busca
+        if self.controle is not None:
+            self.controle.conta_nos(solver.ResponseProto().num_branches)
+        return status
+
+    def _chave(self, sol):
+        """Chave da ordem canônica: bits de (sol XOR referência)."""
+        bits = self.referencia.copy()
+        bits[list(sol)] ^= 1
+        return bits.astype(np.uint8).tobytes()
+
+    def _canoniza(self, limite, prazo):
+        """
+        Troca as soluções achadas pelas `limite` primeiras na ordem canônica.
+        Se a busca esgotou o espaço (menos soluções que o limite), basta
+        ordenar. Senão, cada solução canônica sai de _lexmin, partindo de
+        uma solução achada ainda não usada (sempre existe uma: há `limite`
+        soluções achadas e menos que isso canônicas).
+        """
+        achadas = sorted(self.solucoes, key=self._chave)
+        if self.num_solucoes < limite:
+            return achadas
+
+        canonicas = []
+        while len(canonicas) < limite:
+            partida = next(s for s in achadas if s not in canonicas)
+            # O próprio hint (chave nula), se achado, é sempre o primeiro
+            if not self._chave(partida).strip(b'\x00'):
+                sol = partida
+            else:
+                sol = self._lexmin(canonicas, partida, prazo)
+            if sol is None:
+                self.completa = False
+                return achadas
+            canonicas.append(sol)
+        return canonicas
+
+    def _lexmin(self, excluidas, partida, prazo, bloco=48):
+        """
+        Menor solução (na ordem canônica) fora de `excluidas`.
+
+        Minimização lexicográfica em blocos: percorre as arestas em blocos
+        de `bloco` arestas; em cada um minimiza sum 2^k * (x_e XOR ref_e)
+        (pesos decrescentes dentro do bloco) e fixa o bloco no ótimo antes
+        de passar ao seguinte. Blocos em que a solução corrente já coincide
+        com a referência são ótimos por construção e só são fixados, sem
+        chamar o CP-SAT -- como a alternativa costuma diferir do alvo só
+        numa região pequena, poucos blocos são de fato otimizados.
+        O ótimo de cada bloco é único (pesos potências de 2), portanto o
+        resultado não depende da ordem de busca dos trabalhadores.
+
+        Devolve None se o prazo (time.monotonic) estourar.
+        """
+        m = self._base.Clone()
+        p = m.Proto()
+        for sol in excluidas:
+            ct = p.constraints.add().linear
+            ct.vars.extend(sorted(sol))
+            ct.coeffs.extend([1]*len(sol))
+            ct.domain.extend((0, len(sol) - 1))
+
+        ref = self.referencia
+        atual = np.zeros(self.nE, dtype=np.int64)
+        atual[list(partida)] = 1
+        solver = self._novo_solver()
+        for ini in range(0, self.nE, bloco):
+            fim = min(ini + bloco, self.nE)
+            if (atual[ini:fim] != ref[ini:fim]).any():
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    return None
+                solver.parameters.max_time_in_seconds = restante
+                # x XOR ref = x se ref = 0; 1 - x se ref = 1
+                pesos = [1 << (fim - 1 - e) for e in range(ini, fim)]
+                p.clear_objective()
+                p.objective.vars.extend(range(ini, fim))
+                p.objective.coeffs.extend(
+                    [-w if r else w for w, r in zip(pesos, ref[ini:fim])])
+                p.clear_solution_hint()
+                p.solution_hint.vars.extend(range(self.nE))
+                p.solution_hint.values.extend(atual.tolist())
+
+                status = self._resolve(solver, m)
+                if status != cp_model.OPTIMAL:
+                    return None
+                atual = np.asarray(list(solver.ResponseProto().solution)
+                                   [:self.nE])
+            for e in range(ini, fim):
+                dom = p.variables[e].domain
+                dom.clear()
+                dom.extend((int(atual[e]), int(atual[e])))
+        return frozenset(np.flatnonzero(atual).tolist())
@@ -97,4 +97,636 @@ cv2.imwrite("puzzle_10x10_solucao.png", cv2.cvtColor(img_s, cv2.COLOR_RGB2BGR))
 tab3.dicas = dicas_completas
 print("   puzzle_10x10.png / puzzle_10x10_solucao.png gravadas")
 
+print("8) CP-SAT: mesma contagem do solver puro-Python (montagem em lote)")
+rs = np.random.RandomState(8)
+_, tab8, _ = ger.gera_Tabuleiro2(densidade=0.6, lin=9, col=9, seed=8)
+alvo8, sol8 = tab8.dicas.astype(int), sv.arestas_do_tabuleiro(tab8)
+for frac in (0.4, 0.7, 1.0):
+    p = np.where(rs.random_sample(alvo8.shape) < frac, alvo8, -1)
+    s = sc.SolverCpSat(9, 9, p, solucao_hint=sol8)
+    n_cp, sols_cp = s.conta_solucoes(limite=3)
+    n_py, _ = sv.Solver(9, 9, p, max_nos=10**7).conta_solucoes(limite=3)
+    assert n_cp == n_py and sol8 in sols_cp, (n_cp, n_py)
+    print(f"   {int((p >= 0).sum())} dicas: {n_cp} solucao(oes) | montagem"
+          f" {s.tempo_modelo*1000:.1f} ms | busca {s.tempo_busca*1000:.0f} ms")
+s = sc.SolverCpSat(100, 100, np.full((99, 99), -1))
+print(f"   montagem 100x100: {s.tempo_modelo*1000:.0f} ms")
+
+print("9) CP-SAT deterministico: alternativas canonicas em qualquer no. de nucleos")
+p = np.where(np.random.RandomState(9).random_sample(alvo8.shape) < 0.3, alvo8, -1)
+_, todas = sv.Solver(9, 9, p, max_nos=10**7).conta_solucoes(limite=10**6)
+s = sc.SolverCpSat(9, 9, p, solucao_hint=sol8, deterministico=True)
+esperadas = sorted(todas, key=s._chave)[:3]
+for trab in (1, 8):
+    s = sc.SolverCpSat(9, 9, p, solucao_hint=sol8, trabalhadores=trab,
+                       deterministico=True)
+    _, sols = s.conta_solucoes(limite=3)
+    assert s.completa and sols == esperadas, trab
+print(f"   {len(todas)} solucoes; as 3 primeiras na ordem canonica conferem")
+pz_a, pz_b = [ger.gera_Puzzle(densidade=0.5, lin=8, col=8, seed=4,
+                               motor='cpsat', dificuldade='dificil',
+                               metodo='cegar', deterministico=True)[1]
+              for _ in range(2)]
+assert np.array_equal(pz_a, pz_b)
+print(f"   gera_Puzzle(cegar, seed=4) reprodutivel: {int((pz_b >= 0).sum())} dicas")
+
+print("10) Oraculo CP-SAT com atalho (propagacao + busca curta)")
+atalhos = []
+_conta = ger._OraculoComAtalho.conta_solucoes
+def _conta_registra(self, limite=2):
+    r = _conta(self, limite)
+    atalhos.append(self.oraculo is None)
+    return r
+ger._OraculoComAtalho.conta_solucoes = _conta_registra
+p_cp = ger.reduz_guloso(9, 9, alvo8, sol8, 'dificil', motor='cpsat', seed=1)
+ger._OraculoComAtalho.conta_solucoes = _conta
+p_py = ger.reduz_guloso(9, 9, alvo8, sol8, 'dificil', max_nos=10**7,
+                        motor='python', seed=1)
+assert np.array_equal(p_cp, p_py)
+assert sv.Solver(9, 9, p_cp, max_nos=10**7).conta_solucoes(2)[0] == 1
+print(f"   mesmo puzzle dos dois motores; {sum(atalhos)}/{len(atalhos)} "
+      f"chamadas decididas sem CP-SAT")
+# Busca curta contra só a propagação (_NOS_ATALHO = 0): mesmo puzzle, e a
+# busca poupa chamadas ao CP-SAT (e tempo)
+nos_padrao10 = ger._NOS_ATALHO
+cpsat10, tempo10 = {}, {}
+ger._OraculoComAtalho.conta_solucoes = _conta_registra
+for nos10 in (0, nos_padrao10):
+    ger._NOS_ATALHO = nos10
+    atalhos = []
+    t0 = time.perf_counter()
+    p10 = ger.reduz_guloso(9, 9, alvo8, sol8, 'dificil', motor='cpsat', seed=1)
+    tempo10[nos10] = time.perf_counter() - t0
+    cpsat10[nos10] = len(atalhos) - sum(atalhos)
+    assert np.array_equal(p10, p_py)
+ger._NOS_ATALHO = nos_padrao10
+ger._OraculoComAtalho.conta_solucoes = _conta
+assert cpsat10[nos_padrao10] < cpsat10[0], cpsat10
+print(f"   so propagacao: {cpsat10[0]} chamadas ao CP-SAT, {tempo10[0]:.1f} s"
+      f" | busca de {nos_padrao10} nos: {cpsat10[nos_padrao10]}, "
+      f"{tempo10[nos_padrao10]:.1f} s")
+
+print("11) Memoria de vereditos (monotonicidade entre redutores)")
+memo = ger.MemoUnicidade()
+memo.registra(9, 9, sol8, alvo8, True)
+memo.registra(9, 9, sol8, np.full_like(alvo8, -1), False)
+meio = np.where(np.arange(alvo8.size).reshape(alvo8.shape) % 2 == 0, alvo8, -1)
+assert memo.consulta(9, 9, sol8, alvo8) is True
+assert memo.consulta(9, 9, sol8, meio) is None
+memo.registra(9, 9, sol8, meio, False)
+um_quarto = np.where(np.arange(alvo8.size).reshape(alvo8.shape) % 4 == 0,
+                     alvo8, -1)
+assert memo.consulta(9, 9, sol8, um_quarto) is False   # subconjunto ambíguo
+assert memo.consulta(9, 9, sol8, alvo8, (40000, 'python')) is None
+memo = ger.MemoUnicidade()
+t0 = time.time()
+pz = {d: ger.reduz_binaria(9, 9, alvo8, sol8, d, motor='python', seed=2,
+                           memo=memo)
+      for d in ('facil', 'dificil')}
+t1 = time.time()
+pz_b = ger.reduz_binaria(9, 9, alvo8, sol8, 'dificil', motor='python', seed=2)
+assert np.array_equal(pz['dificil'], pz_b)
+print(f"   binaria facil+dificil: {memo.acertos}/{memo.consultas} vereditos"
+      f" sem motor | {t1-t0:.2f} s")
+# Sem `memo`, cada chamada tem a sua memoria: uma reducao semeada nao
+# depende do que rodou antes no processo. Compartilhada, a memoria separa
+# os vereditos por orcamento (max_nos, motor)
+_, tab11, _ = ger.gera_Tabuleiro2(densidade=0.5, seed=7, lin=12, col=12)
+alvo11, sol11 = tab11.dicas.astype(int), sv.arestas_do_tabuleiro(tab11)
+def guloso11(max_nos, seed, **kw):
+    return ger.reduz_guloso(12, 12, alvo11, sol11, 'dificil', max_nos=max_nos,
+                            motor='python', seed=seed, **kw)
+ref11 = guloso11(30, 3)
+memo11 = ger.MemoUnicidade()
+guloso11(1000, 1, memo=memo11)
+assert np.array_equal(guloso11(30, 3), ref11)
+assert np.array_equal(guloso11(30, 3, memo=memo11), ref11)
+print("12) Remocao ordenada pela forca das dicas")
+ordem = ger._ordena_celulas(9, 9, alvo8, [tuple(x) for x in np.argwhere(alvo8 >= 0)],
+                            np.random.RandomState(0), 'forca')
+assert sorted(ordem) == sorted(tuple(x) for x in np.argwhere(alvo8 >= 0))
+# A ordem segue as notas: re-derivaveis primeiro; dentro de cada grupo,
+# dicas fracas (1, 2) antes das fortes (0, 3); depois mais vizinhas antes.
+# No mapa completo tudo e re-derivavel: a conferencia usa 60% das dicas
+parcial12 = np.where(np.random.RandomState(1).random_sample(alvo8.shape) < 0.6,
+                     alvo8, -1)
+ordem = ger._ordena_celulas(9, 9, parcial12,
+                            [tuple(x) for x in np.argwhere(parcial12 >= 0)],
+                            np.random.RandomState(0), 'forca')
+rederiva12, forte12, dens12 = ger._notas_celulas(9, 9, parcial12)
+assert rederiva12.any() and not rederiva12[parcial12 >= 0].all()
+chaves12 = [(not rederiva12[l, c], forte12[l, c], -dens12[l, c])
+            for l, c in ordem]
+assert chaves12 == sorted(chaves12)
+n_rederiva12 = int(rederiva12[parcial12 >= 0].sum())
+assert all(rederiva12[l, c] for l, c in ordem[:n_rederiva12])
+for grupo12 in (ordem[:n_rederiva12], ordem[n_rederiva12:]):
+    fortes12 = [forte12[l, c] for l, c in grupo12]
+    assert fortes12 == sorted(fortes12)
+    assert all(parcial12[l, c] in ((0, 3) if f else (1, 2))
+               for (l, c), f in zip(grupo12, fortes12))
+# Re-derivavel de fato: tirando so a dica da celula, a propagacao decide as
+# 4 arestas dela (com menos dicas removidas ela so deduz mais)
+arestas_celula = sv.topologia(9, 9).arestas_celula
+for l, c in np.argwhere(rederiva12 & (parcial12 >= 0)):
+    s = sv.Solver(9, 9, np.where((np.arange(8)[:, None] == l)
+                                 & (np.arange(8) == c), -1, parcial12))
+    if not s.decide_por_propagacao():
+        assert all(s.estado[a] != sv.DESCONHECIDA
+                   for a in arestas_celula[l*8 + c])
+for o in ('aleatoria', 'forca'):
+    p = ger.reduz_guloso(9, 9, alvo8, sol8, 'dificil', seed=3, ordem=o)
+    n, _ = sv.Solver(9, 9, p, max_nos=10**7).conta_solucoes(limite=2)
+    assert n == 1
+    print(f"   ordem {o}: {int((p >= 0).sum())} dicas")
+print(f"   {n_rederiva12} dicas re-derivaveis na frente, fracas antes das fortes")
+
+print("13) Dicas vetorizadas (planos de arestas <-> ids)")
+h8, v8 = sv.planos_de_solucao(9, 9, sol8)
+assert np.array_equal(h8, tab8.arestas_h) and np.array_equal(v8, tab8.arestas_v)
+assert sv.solucao_de_planos(h8, v8) == sol8
+assert np.array_equal(sv.dicas_de_planos(h8, v8), tab8.dicas)
+assert all(tab8.get_dica(l, c) == tab8.dicas[l, c]
+           for l in range(8) for c in range(8))
+_, tab200, _ = ger.gera_Tabuleiro2(densidade=1.0, lin=200, col=200, seed=1,
+                                   dicas=False)
+t0 = time.perf_counter()
+tab200.preenche_dicas()
+t1 = time.perf_counter()
+assert np.array_equal(tab200.dicas, sv.dicas_de_solucao(
+    200, 200, sv.arestas_do_tabuleiro(tab200)))
+print(f"   preenche_dicas 200x200: {(t1-t0)*1000:.2f} ms")
+
+print("14) Pre-teste local do mapa completo de dicas")
+import main as sl
+amb = sl.Tabuleiro(4, 4)                  # mapa 2/0 de dois lacos distintos
+amb.aplica_ciclo([0, 1, 2, 6, 7, 11, 15, 14, 13, 9, 8, 4])
+amb.preenche_dicas()
+assert not ger.certifica_mapa_completo(amb)
+assert sv.Solver(4, 4, amb.dicas.astype(int)).conta_solucoes(limite=2)[0] == 2
+certificados = 0
+for s in range(20):
+    for dens in (0.5, 1.0):
+        _, tab_c, _ = ger.gera_Tabuleiro2(densidade=dens, lin=10, col=10,
+                                          seed=s, varreduras=5 * (s % 2))
+        if ger.certifica_mapa_completo(tab_c):
+            certificados += 1
+            n, _ = sv.Solver(10, 10, tab_c.dicas.astype(int),
+                             max_nos=10**7).conta_solucoes(limite=2)
+            assert n == 1                  # nunca certifica um mapa ambiguo
+        else:
+            assert dens == 1.0             # regioes sempre decididas
+_, tab_c, _ = ger.gera_Tabuleiro2(densidade=0.6, lin=100, col=100, seed=1)
+t0 = time.perf_counter()
+assert ger.certifica_mapa_completo(tab_c)
+t1 = time.perf_counter()
+print(f"   {certificados}/40 mapas certificados sem solver | 100x100:"
+      f" {(t1-t0)*1000:.1f} ms")
+
+print("15) Lote em pool de processos com retomada")
+import os
+import tempfile
+import lote
+with tempfile.TemporaryDirectory() as pasta:
+    serial = os.path.join(pasta, 'serial.jsonl')
+    pool = os.path.join(pasta, 'pool.jsonl')
+    t0 = time.perf_counter()
+    assert lote.gera_lote(8, 7, 7, saida=serial, seed=5, motor='python') == 8
+    t1 = time.perf_counter()
+    assert lote.gera_lote(8, 7, 7, saida=pool, seed=5, motor='python',
+                          processos=2) == 8
+    def chaves(arq):
+        return sorted((r['indice'], r['dicas'], r['solucao'])
+                      for r in lote._registros(arq))
+    assert chaves(serial) == chaves(pool)      # independe dos processos
+    # Queda no meio da escrita: 3 linhas inteiras e um pedaço da quarta
+    linhas = open(serial).read().split('\n')
+    caido = os.path.join(pasta, 'caido.jsonl')
+    with open(caido, 'w') as f:
+        f.write('\n'.join(linhas[:3]) + '\n' + linhas[3][:40])
+    assert lote.gera_lote(8, 7, 7, saida=caido, seed=5, motor='python') == 5
+    assert chaves(caido) == chaves(serial)
+    assert lote.gera_lote(10, 7, 7, saida=caido, seed=5, motor='python') == 2
+    try:
+        lote.gera_lote(10, 7, 7, saida=caido, seed=5, dificuldade='medio')
+        assert False, 'lote diferente no mesmo arquivo'
+    except ValueError:
+        pass
+    try:                                       # outras opções do gera_Puzzle
+        lote.gera_lote(10, 7, 7, saida=caido, seed=5, motor='python',
+                       max_nos=50)
+        assert False, 'opções diferentes no mesmo arquivo'
+    except ValueError:
+        pass
+    assert all(r['opcoes'] == {'motor': 'python'}
+               for r in lote._registros(caido))
+    for opcao in ({'rng': 3}, {'memo': ger.MemoUnicidade()}):
+        try:                                   # fora da identidade do lote
+            lote.gera_lote(10, 7, 7, saida=caido, seed=5, motor='python',
+                           **opcao)
+            assert False, 'opção {} aceita'.format(opcao)
+        except ValueError:
+            pass
+    for r in lote.le_lote(caido):
+        n, _ = sv.Solver(7, 7, r['dicas']).conta_solucoes(limite=2)
+        assert n == 1 and sv.dicas_de_solucao(7, 7, r['solucao'])[
+            r['dicas'] >= 0].tolist() == r['dicas'][r['dicas'] >= 0].tolist()
+print(f"   8 puzzles 7x7 serial em {t1-t0:.2f} s | pool e retomada conferem")
+
+print("16) Banco SQLite de puzzles: blobs compactos e sorteio sem repeticao")
+import collections
+import threading
+import banco
+for dl, dc in ((6, 6), (7, 9)):                 # numero impar e par de celulas
+    pz = np.random.RandomState(dl).randint(-1, 4, (dl-1, dc-1))
+    assert np.array_equal(banco.desempacota_dicas(
+        banco.empacota_dicas(pz), dl, dc), pz)
+assert banco.desempacota_solucao(banco.empacota_solucao(9, 9, sol8),
+                                 9, 9) == sol8
+with tempfile.TemporaryDirectory() as pasta:
+    arq_lote = os.path.join(pasta, 'lote.jsonl')
+    lote.gera_lote(6, 6, 6, saida=arq_lote, seed=1, motor='python')
+    puzzles = {}
+    for r in lote.le_lote(arq_lote):
+        puzzles[r['dicas'].tobytes()] = r['solucao']
+    with banco.BancoPuzzles(os.path.join(pasta, 'p.db'), rng=0,
+                            tamanho_transacao=4) as bd:
+        assert bd.importa_lote(arq_lote) == 6
+        assert bd.importa_lote(arq_lote) == 0     # repetidos ignorados
+        extra = ger.gera_Puzzle(densidade=0.5, lin=6, col=6, seed=50,
+                                motor='python', dificuldade='facil')
+        assert bd.insere([extra]) == 1
+        assert bd.conta(6, 6) == 7 and bd.conta(6, 6, 'facil') >= 1
+        k = int((extra[1] >= 0).sum())
+        f = bd.sorteia(6, 6, 'facil', n_dicas=(k, k), marca=False)
+        assert f['dificuldade'] == 'facil' and f['n_dicas'] == k
+        assert bd.sorteia(6, 6, n_dicas=(40, 99)) is None
+        # Sem marcar, cada um dos 7 sai ~1/7 das vezes (sem viés de posição)
+        saidas = collections.Counter(bd.sorteia(6, 6, marca=False)['id']
+                                     for _ in range(1400))
+        assert len(saidas) == 7 and 150 < min(saidas.values()) \
+            and max(saidas.values()) < 250
+        vistos = set()
+        while True:
+            x = bd.sorteia(6, 6)
+            if x is None:
+                break
+            assert x['id'] not in vistos
+            vistos.add(x['id'])
+            chave = x['dicas'].tobytes()
+            sol_x = puzzles.get(chave, sv.arestas_do_tabuleiro(extra[0]))
+            assert x['solucao'] == sol_x
+            assert x['n_dicas'] == int((x['dicas'] >= 0).sum())
+            assert abs(x['densidade'] - len(sol_x) / 36) < 1e-12
+        assert len(vistos) == 7 and bd.conta(6, 6, servidos=True) == 7
+    # Várias threads sorteando do mesmo objeto: cada puzzle sai uma vez só
+    with banco.BancoPuzzles(os.path.join(pasta, 'q.db'), rng=1) as bd:
+        assert bd.importa_lote(arq_lote) == 6
+        servidos, erros = [], []
+        def serve():
+            try:
+                for _ in range(300):
+                    bd.sorteia(6, 6, marca=False)
+                while True:
+                    x = bd.sorteia(6, 6)
+                    if x is None:
+                        return
+                    servidos.append(x['id'])
+            except Exception as e:
+                erros.append(e)
+        fios = [threading.Thread(target=serve) for _ in range(8)]
+        for fio in fios:
+            fio.start()
+        for fio in fios:
+            fio.join()
+        assert not erros, erros
+        assert sorted(servidos) == sorted(set(servidos)) \
+            and len(servidos) == 6
+print("   7 puzzles importados/inseridos, servidos uma vez cada")
+
+print("17) Reserva de puzzles prontos com reposicao em segundo plano")
+import reserva
+with reserva.ReservaPuzzles(alvo=3, minimo=2, processos=1, seed=7,
+                            motor='python') as rv:
+    primeiro = rv.retira(6, 6, 'facil')           # falta: espera o pool
+    balde = (6, 6, 'facil', 'guloso')
+    limite = time.perf_counter() + 60
+    while (rv.estatisticas()['baldes'][balde][0] < 2
+           and time.perf_counter() < limite):
+        time.sleep(0.02)
+    t0 = time.perf_counter()
+    retirados = [rv.retira(6, 6, 'facil') for _ in range(2)]
+    t1 = time.perf_counter()
+    est = rv.estatisticas()
+    assert est['faltas'] == 1 and est['acertos'] == 2
+    assert est['reposicoes'] >= 3 and est['latencia_maxima'] > 0
+    assert est['baldes'][balde][0] + est['baldes'][balde][1] >= 2  # repondo
+    for p in [primeiro] + retirados:
+        assert p['dificuldade'] == 'facil'
+        assert sv.Solver(6, 6, p['dicas']).conta_solucoes(limite=2)[0] == 1
+    assert len({p['solucao'] for p in [primeiro] + retirados}) == 3
+# Faltas simultâneas com banco: nenhum puzzle do banco sai duas vezes
+with tempfile.TemporaryDirectory() as pasta:
+    with banco.BancoPuzzles(os.path.join(pasta, 'r.db'), rng=2) as bd, \
+            reserva.ReservaPuzzles(alvo=1, minimo=1, processos=1, seed=8,
+                                   banco=bd, motor='python') as rv:
+        estoque = [ger.gera_Puzzle(densidade=0.5, lin=6, col=6, seed=s,
+                                   motor='python', dificuldade='facil')
+                   for s in range(60, 100)]
+        bd.insere(estoque)
+        do_banco = bd.conta(6, 6, 'facil')
+        itens, erros = [], []
+        def retira():
+            try:
+                for _ in range(5):
+                    itens.append(rv.retira(6, 6, 'facil', tempo_max=60))
+            except Exception as e:
+                erros.append(e)
+        fios = [threading.Thread(target=retira) for _ in range(8)]
+        for fio in fios:
+            fio.start()
+        for fio in fios:
+            fio.join()
+        assert not erros, erros
+        assert len(itens) == 40 and all(p is not None for p in itens)
+        # Banco e pool entregam itens do mesmo formato
+        assert all(sorted(p) == sorted(primeiro) for p in itens)
+        guardados = {pz.tobytes() for _, pz, _ in estoque}
+        do_estoque = [p['dicas'].tobytes() for p in itens
+                      if p['dicas'].tobytes() in guardados]
+        assert len(do_estoque) == len(set(do_estoque))
+        assert bd.conta(6, 6, 'facil') == do_banco - len(do_estoque)
+print(f"   2 acertos em {(t1-t0)*1000:.2f} ms | reposicao media"
+      f" {est['latencia_media']*1000:.0f} ms")
+
+print("18) Arquivo binario compacto com acesso aleatorio por mmap")
+import arquivo
+with tempfile.TemporaryDirectory() as pasta:
+    arq = os.path.join(pasta, 'acervo.slk')
+    saidas = [ger.gera_Puzzle(densidade=0.5, lin=7, col=9, seed=s,
+                              motor='python') for s in range(4)]
+    assert arquivo.grava_puzzles(arq, saidas[:2]) == 2
+    assert arquivo.grava_puzzles(arq, saidas[2:]) == 4     # acrescenta
+    with arquivo.ArquivoPuzzles(arq) as acervo:
+        assert len(acervo) == 4
+        for i, (tab_a, pz_a, dif_a) in enumerate(saidas):
+            t_r, pz_r, dif_r = acervo.gera_puzzle(i)
+            assert t_r == tab_a and np.array_equal(t_r.dicas, tab_a.dicas)
+            assert np.array_equal(pz_r, pz_a) and dif_r == dif_a
+        ultimo = acervo[-1]
+        fim = int(acervo.offsets[-1]) + 5
+    # Queda no meio de uma gravacao: sem indice e com um registro cortado
+    with open(arq, 'r+b') as f:
+        f.truncate(fim)
+    with arquivo.ArquivoPuzzles(arq) as acervo:
+        assert len(acervo) == 3                # indice refeito varrendo
+    assert arquivo.grava_puzzles(arq, [ultimo]) == 4
+    with arquivo.ArquivoPuzzles(arq) as acervo:
+        assert acervo[3]['solucao'] == ultimo['solucao']
+assert arquivo.tamanho_registro(15, 15) == 132
+print(f"   4 puzzles ida e volta | 15x15: "
+      f"{arquivo.tamanho_registro(15, 15) + 8} bytes por puzzle")
+
+print("19) Topologia e dicas em memoria compartilhada (pool de unicidade)")
+import compartilhado
+_, tab19, _ = ger.gera_Tabuleiro2(densidade=0.6, lin=7, col=7, seed=19)
+cheio19 = tab19.dicas.astype(int)
+rs = np.random.RandomState(19)
+puzzles19 = []
+for _ in range(24):
+    p = cheio19.copy()
+    p[rs.rand(*p.shape) < rs.rand()] = -1
+    puzzles19.append(p)
+locais = []
+for p in puzzles19:
+    s = sv.Solver(7, 7, p)
+    locais.append((s.conta_solucoes(limite=2)[0], s.completa))
+t0 = time.perf_counter()
+with compartilhado.PoolUnicidade(7, 7, processos=2, n_slots=3,
+                                 motor='python') as pool:
+    remotos = pool.conta_varios(puzzles19)
+t1 = time.perf_counter()
+assert remotos == locais and {n for n, _ in locais} == {1, 2}
+# No proprio processo: a topologia registrada vale para os Solvers
+topo19 = compartilhado.TopologiaCompartilhada(5, 6)
+assert compartilhado.anexa_topologia(topo19.descritor) is sv.topologia(5, 6)
+assert not sv.topologia(5, 6).arestas_vertice.flags.writeable
+assert sv.Solver(5, 6, np.full((4, 5), 3)).conta_solucoes(limite=2)[0] == 0
+sv.desregistra_topologia(5, 6)
+for bloco in compartilhado._anexados:
+    bloco.close()
+topo19.fecha()
+print(f"   24 puzzles por indice de slot em {(t1-t0)*1000:.0f} ms"
+      f" (2 processos, 3 slots)")
+
+print("20) Cancelamento e progresso (Controle) e API asyncio")
+import asyncio
+import assincrono
+vistos = []
+def ao_progresso(p):
+    vistos.append((p.dicas, p.chamadas))
+    if p.chamadas == 3:
+        controle20.cancela()
+controle20 = sv.Controle(ao_progresso)
+try:
+    ger.gera_Puzzle(densidade=0.5, lin=7, col=7, seed=1, motor='python',
+                    dificuldade='medio', controle=controle20)
+    raise AssertionError('a geracao deveria ter sido cancelada')
+except sv.Cancelado:
+    pass
+chamadas20 = sorted({c for _, c in vistos})
+assert chamadas20 == [0, 1, 2, 3]
+assert max(d for d, _ in vistos if d is not None) > vistos[-1][0]
+ref20 = ger.gera_Puzzle(densidade=0.5, lin=7, col=7, seed=1, motor='python',
+                        dificuldade='medio')
+
+async def _teste_assincrono():
+    ex = assincrono.ExecutorAssincrono(processos=1, intervalo=0.01)
+    try:
+        eventos = []
+        tab, pz, dif = await assincrono.gera_puzzle_async(
+            ao_progresso=eventos.append, executor=ex, densidade=0.5,
+            lin=7, col=7, seed=1, motor='python', dificuldade='medio')
+        assert tab == ref20[0] and np.array_equal(pz, ref20[1])
+        assert eventos and eventos[-1].chamadas > 0
+        assert eventos[-1].fase == 'minimizacao'
+        # Busca sem fim (9x9 sem dicas): cancelar libera o trabalhador
+        tarefa = asyncio.ensure_future(assincrono.conta_solucoes_async(
+            9, 9, np.full((8, 8), -1), limite=10**9, max_nos=10**9,
+            executor=ex))
+        await asyncio.sleep(0.2)
+        tarefa.cancel()
+        try:
+            await tarefa
+            raise AssertionError('a busca deveria ter sido cancelada')
+        except asyncio.CancelledError:
+            pass
+        t0 = time.perf_counter()
+        n, _, completa = await assincrono.conta_solucoes_async(
+            5, 5, np.full((4, 4), -1), limite=3, executor=ex)
+        assert n == 3 and completa
+        return time.perf_counter() - t0
+    finally:
+        ex.fecha()
+
+espera20 = asyncio.run(_teste_assincrono())
+assert espera20 < 5
+print(f"   cancelado apos 3 chamadas do oraculo | trabalhador livre"
+      f" {espera20*1000:.0f} ms depois do cancelamento")
+
+print("21) Controle: fases, nos e prazo (Solver e CP-SAT)")
+eventos21 = []
+controle21 = sv.Controle(eventos21.append, intervalo=256)
+ger.gera_Puzzle(densidade=0.5, lin=8, col=8, seed=2, motor='python',
+                controle=controle21)
+fases21 = [eventos21[0].fase]
+for p in eventos21:
+    if p.fase != fases21[-1]:
+        fases21.append(p.fase)
+assert fases21 == ['tabuleiro', 'mapa', 'adicao', 'minimizacao'], fases21
+assert 0 < eventos21[-1].nos <= controle21.nos
+assert all(a.decorrido <= b.decorrido for a, b in zip(eventos21, eventos21[1:]))
+controle21 = sv.Controle(prazo=0.2)
+t0 = time.perf_counter()
+try:
+    sv.Solver(10, 10, np.full((9, 9), -1), max_nos=10**9,
+              controle=controle21).conta_solucoes(limite=10**9)
+    raise AssertionError('o prazo deveria ter interrompido a busca')
+except sv.PrazoEsgotado:
+    t_py = time.perf_counter() - t0
+assert t_py < 1 and controle21.nos > 0
+try:
+    import solver_cpsat as sc
+    # Dentro de um Solve: a thread do controle chama StopSearch
+    controle21 = sv.Controle(prazo=0.3)
+    t0 = time.perf_counter()
+    try:
+        sc.SolverCpSat(30, 30, np.full((29, 29), -1),
+                       controle=controle21).conta_solucoes(limite=10**6)
+        raise AssertionError('o prazo deveria ter interrompido o CP-SAT')
+    except sv.PrazoEsgotado:
+        t_cp = time.perf_counter() - t0
+    assert t_cp < 2
+    msg_cp = f" | CP-SAT 30x30 parado em {t_cp:.2f} s"
+except ImportError:
+    msg_cp = " | CP-SAT indisponivel"
+print(f"   fases {'>'.join(fases21)} | prazo 0.2 s: busca parada em"
+      f" {t_py:.2f} s{msg_cp}")
+
+print("22) tempo_max: puzzle unico (melhor ate ali) quando o prazo acaba")
+for metodo22, dif22 in (('guloso', 'dificil'), ('binaria', 'dificil'),
+                        ('cegar', 'dificil'), ('guloso', None)):
+    t0 = time.perf_counter()
+    r22 = ger.gera_Puzzle(densidade=0.5, lin=14, col=14, seed=4,
+                          motor='python', dificuldade=dif22, metodo=metodo22,
+                          tempo_max=0.05)
+    t22 = time.perf_counter() - t0
+    assert r22.truncado and t22 < 1.5, (metodo22, t22)
+    s22 = sv.Solver(14, 14, r22[1], max_nos=10**7)
+    assert s22.conta_solucoes(limite=2)[0] == 1 and s22.completa
+# Sem estourar o prazo, o resultado e o mesmo de sem tempo_max
+r22 = ger.gera_Puzzle(densidade=0.5, lin=7, col=7, seed=1, motor='python',
+                      dificuldade='medio', tempo_max=60)
+assert not r22.truncado and np.array_equal(r22[1], ref20[1])
+import pickle
+r22 = pickle.loads(pickle.dumps(r22))
+assert isinstance(r22, ger.ResultadoPuzzle) and not r22.truncado
+# O mesmo Controle em várias chamadas: tempo_max e truncado são da chamada
+c22 = sv.Controle()
+r22 = ger.gera_Puzzle(densidade=0.5, lin=14, col=14, seed=4, motor='python',
+                      dificuldade='dificil', tempo_max=0.05, controle=c22)
+assert r22.truncado and c22.truncado and c22.prazo is None
+r22 = ger.gera_Puzzle(densidade=0.5, lin=7, col=7, seed=1, motor='python',
+                      dificuldade='medio', controle=c22)
+assert not r22.truncado and np.array_equal(r22[1], ref20[1])
+c22.prazo = prazo22 = c22.decorrido() + 30
+ger.gera_Puzzle(densidade=0.5, lin=7, col=7, seed=1, motor='python',
+                dificuldade='medio', tempo_max=60, controle=c22)
+assert c22.prazo == prazo22
+# ... e um checkpoint de redução terminada sem corte é apagado
+c22.prazo = None
+c22.truncado = True
+with tempfile.TemporaryDirectory() as pasta:
+    arq22 = os.path.join(pasta, 'reducao.npz')
+    alvo22 = r22[0].dicas.astype(int)
+    ger.reduz_guloso(7, 7, alvo22, sv.arestas_do_tabuleiro(r22[0]), 'medio',
+                     20000, 'python', seed=3, controle=c22, checkpoint=arq22,
+                     intervalo_checkpoint=0)
+    assert not c22.truncado and not os.path.exists(arq22)
+print(f"   14x14 com tempo_max=0.05 s: puzzles unicos em ~{t22:.2f} s")
+
+print("23) checkpoint: reducao interrompida e retomada = reducao direta")
+_, tab23, _ = ger.gera_Tabuleiro2(densidade=0.5, dicas=True, seed=7,
+                                  lin=9, col=9)
+alvo23 = tab23.dicas.astype(int)
+sol23 = sv.arestas_do_tabuleiro(tab23)
+
+
+def interrompe23(k):
+    """Controle que cancela (simula a queda) na k-esima chamada."""
+    c = sv.Controle()
+    c.ao_progresso = lambda p: p.chamadas >= k and c.cancela()
+    return c
+
+
+with tempfile.TemporaryDirectory() as pasta:
+    arq23 = os.path.join(pasta, 'reducao.npz')
+    casos23 = [
+        ('guloso', lambda **kw: ger.reduz_guloso(
+            9, 9, alvo23, sol23, 'medio', 20000, 'python', seed=3,
+            ordem='forca', **kw), (1, 8)),
+        ('dicas', lambda **kw: ger.reduz_dicas(
+            tab23, motor='python', rng=11, **kw), (2, 12))]
+    for nome23, reduz23, pontos23 in casos23:
+        ref23 = reduz23()
+        # intervalo 0: grava a cada passo; 3600: só na saída, com as listas
+        # já crescidas além da última marca
+        for k23 in pontos23:
+            for intervalo23 in (0, 3600):
+                try:
+                    reduz23(controle=interrompe23(k23), checkpoint=arq23,
+                            intervalo_checkpoint=intervalo23)
+                    raise AssertionError('a reducao deveria ter sido '
+                                         'cancelada')
+                except sv.Cancelado:
+                    pass
+                assert np.array_equal(ger.retoma_reducao(arq23), ref23), \
+                    (nome23, k23, intervalo23)
+                assert not os.path.exists(arq23)
+    # Checkpoint de outra reducao
+    try:
+        ger.reduz_guloso(9, 9, alvo23, sol23, 'medio', 20000, 'python',
+                         seed=3, controle=interrompe23(3), checkpoint=arq23)
+    except sv.Cancelado:
+        pass
+    for outra23 in (dict(dificuldade='facil', seed=3),
+                    dict(dificuldade='medio', seed=5)):
+        try:
+            ger.reduz_guloso(9, 9, alvo23, sol23, max_nos=20000,
+                             motor='python', checkpoint=arq23, **outra23)
+            raise AssertionError('deveria recusar o checkpoint')
+        except ValueError:
+            pass
+    os.remove(arq23)
+    try:
+        ger.reduz_dicas(tab23, motor='python', rng=11,
+                        controle=interrompe23(2), checkpoint=arq23)
+    except sv.Cancelado:
+        pass
+    try:
+        ger.reduz_dicas(tab23, motor='python', rng=12, checkpoint=arq23)
+        raise AssertionError('deveria recusar o checkpoint (outra seed)')
+    except ValueError:
+        pass
+# A marca guarda as tuplas do memo sem copiar: registros novos não as mudam
+memo23 = ger.MemoUnicidade()
+memo23.registra(9, 9, sol23, alvo23, True)
+foto23 = memo23.exporta(9, 9, sol23)
+assert memo23.exporta(9, 9, sol23) is foto23
+memo23.registra(9, 9, sol23, np.where(np.eye(8, dtype=bool), alvo23, -1),
+                False)
+assert foto23 == ((ger.MemoUnicidade._mascara(alvo23),), ())
+assert memo23.exporta(9, 9, sol23)[1] != ()
+print("   guloso e reduz_dicas (fases 1 e 2) retomados bit a bit")
+
 print("OK - todos os testes passaram")
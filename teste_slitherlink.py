@@ -80,4 +80,157 @@ img3 = plota.gera_imagem(tab_old, pad=50, raio_vertice=5, escala_fonte=0.7,
 cv2.imwrite("antigo_20x20.png", cv2.cvtColor(img3, cv2.COLOR_RGB2BGR))
 print("   ham_20x20.png / regiao_20x20.png / antigo_20x20.png gravadas")
 
+print("7) Tabuleiro em arrays: visao de compatibilidade G / caminho")
+t0 = time.perf_counter()
+tab_g = sl.Tabuleiro(lin=100, col=100)
+t1 = time.perf_counter()
+print(f"   Tabuleiro 100x100 vazio: {(t1-t0)*1000:.2f} ms")
+assert all(v is None for v in tab_g._vertices)   # nenhum Vertice criado
+tab_c = sl.Tabuleiro(lin=4, col=4)
+tab_c.aplica_ciclo([0, 1, 2, 6, 5, 4])            # ciclo 2x1 no canto
+assert tab_c.G.has_edge(tab_c.get_verticeN(2), tab_c.get_verticeN(6))
+assert not tab_c.G.has_edge(tab_c.get_verticeN(1), tab_c.get_verticeN(5))
+assert [v.n for v in tab_c.caminho] == [0, 1, 2, 6, 5, 4]
+assert tab_c.get_verticeN(6).ordem == 4 and tab_c.get_verticeN(3).visitado == 0
+assert valida_ciclo(tab_c) == 6
+tab_c.preenche_dicas()
+assert tab_c.dicas[0].tolist() == [3, 3, 1]
+tab_c.G.remove_edge(tab_c.get_verticeN(5), tab_c.get_verticeN(4))
+try:
+    tab_c.G.remove_edge(tab_c.get_verticeN(5), tab_c.get_verticeN(4))
+    assert False, "remover aresta inexistente deveria falhar"
+except nx.NetworkXError:
+    pass
+assert tab_c.G.number_of_edges() == 5
+print("   G.has_edge/add/remove, caminho sob demanda e dicas conferem")
+
+print("8) Passeio aleatorio em arrays planos: reprodutibilidade e tempo")
+np.random.seed(7)
+d_a, tab_a, p_a = ger.gera_Tabuleiro(densidade=0.6, lin=20, col=20,
+                                         seed=3, max_tentativas=100)
+np.random.seed(7)
+d_b, tab_b, p_b = ger.gera_Tabuleiro(densidade=0.6, lin=20, col=20,
+                                         seed=3, max_tentativas=100)
+assert d_a == d_b and p_a == p_b and tab_a == tab_b
+assert valida_ciclo(tab_a) == len(set(tab_a.caminho))
+t0 = time.perf_counter()
+d50, tab50, _ = ger.gera_Tabuleiro(densidade=0.55, lin=50, col=50,
+                                       max_tentativas=300)
+t1 = time.perf_counter()
+assert valida_ciclo(tab50) == len(set(tab50.caminho))
+print(f"   50x50: densidade {d50:.4f} em {t1-t0:.2f} s")
+
+print("9) Tentativas em paralelo: mesmo tabuleiro do caminho serial")
+for dens, mt in ((0.6, 100), (0.99, 40)):   # com e sem atingir o alvo
+    d_s, tab_s, p_s = ger.gera_Tabuleiro(densidade=dens, lin=20, col=20,
+                                         seed=3, max_tentativas=mt)
+    d_p, tab_p, p_p = ger.gera_Tabuleiro(densidade=dens, lin=20, col=20,
+                                         seed=3, max_tentativas=mt,
+                                         processos=2)
+    assert (d_s, p_s, tab_s.seed) == (d_p, p_p, tab_p.seed)
+    assert tab_s == tab_p and np.array_equal(tab_s.dicas, tab_p.dicas)
+print("   processos=2 reproduz o serial (com e sem atingir a densidade)")
+
+print("10) Regiao sem buracos: teste local na vizinhanca-8")
+# Tabuleiros pequenos e alta densidade forcam a regiao a encostar na borda
+# e a fechar gargalos
+for dim, dens in ((6, 0.9), (9, 0.9), (12, 0.8), (30, 0.7)):
+    for s in range(8):
+        _, tab_r, _ = ger.gera_Tabuleiro2(densidade=dens, lin=dim, col=dim,
+                                          seed=s)
+        valida_ciclo(tab_r)
+t0 = time.perf_counter()
+d_r, tab_r, _ = ger.gera_Tabuleiro2(densidade=0.6, lin=60, col=60, seed=1)
+t1 = time.perf_counter()
+valida_ciclo(tab_r)
+print(f"   contornos sempre um ciclo unico | 60x60: densidade {d_r:.4f}"
+      f" em {t1-t0:.2f} s")
+
+print("11) Regiao com fronteira em baldes: tabuleiro grande")
+for dens in (0.6, 0.8):
+    t0 = time.perf_counter()
+    d_g, tab_g, p_g = ger.gera_Tabuleiro2(densidade=dens, lin=300, col=300,
+                                          seed=2, dicas=False)
+    t1 = time.perf_counter()
+    assert d_g >= dens and len(p_g) == tab_g.get_comprimento_caminho()
+    assert np.all(np.isin(tab_g.graus(), (0, 2)))
+    print(f"   300x300 alvo {dens}: densidade {d_g:.4f} em {t1-t0:.2f} s")
+
+print("12) Hamiltoniano sem networkx: planos de arestas em tabuleiro enorme")
+np.random.seed(5)
+t0 = time.perf_counter()
+h_g, v_g = ger.gera_planos_hamiltoniano(1000, 1000)
+t1 = time.perf_counter()
+ordem_g = ger._ordem_do_ciclo(h_g, v_g)
+t2 = time.perf_counter()
+assert h_g.sum() + v_g.sum() == 1000 * 1000
+assert len(np.unique(ordem_g)) == 1000 * 1000      # um unico ciclo
+print(f"   1000x1000: planos {t1-t0:.2f} s | ordem do ciclo {t2-t1:.2f} s")
+
+print("13) Cadeia de Markov de trocas de celulas a partir do gera_Tabuleiro2")
+for dim, dens in ((10, 0.5), (20, 0.7), (41, 0.6)):
+    for s in range(5):
+        d_m, tab_m, p_m = ger.gera_Tabuleiro2(densidade=dens, lin=dim,
+                                              col=dim, seed=s, varreduras=15)
+        assert valida_ciclo(tab_m) == len(p_m)
+        assert abs(len(p_m) - dens * dim * dim) <= 2
+_, tab_0, _ = ger.gera_Tabuleiro2(densidade=0.6, lin=41, col=41, seed=4)
+assert not tab_0 == tab_m                        # a cadeia mudou a forma
+t0 = time.perf_counter()
+d_m, tab_m, p_m = ger.gera_Tabuleiro2(densidade=0.6, lin=300, col=300,
+                                      seed=1, varreduras=20, dicas=False)
+t1 = time.perf_counter()
+print(f"   perimetro no alvo | 300x300 com 20 varreduras em {t1-t0:.2f} s")
+
+print("14) Gerador explicito: sementes independentes em threads")
+from concurrent.futures import ThreadPoolExecutor
+def _gera_com(ss):
+    rng = np.random.default_rng(ss)
+    _, _, p_t = ger.gera_Tabuleiro2(densidade=0.6, lin=15, col=15, rng=rng)
+    _, pz_t, _ = ger.gera_Puzzle(densidade=0.6, lin=6, col=6, rng=rng,
+                                 motor='python')
+    return p_t, pz_t.tolist()
+filhas = sl.sementes_independentes(42, 4)
+serial = [_gera_com(ss) for ss in sl.sementes_independentes(42, 4)]
+np.random.seed(0)
+estado_global = np.random.get_state()[1].copy()
+with ThreadPoolExecutor(max_workers=4) as ex:
+    paralelo = list(ex.map(_gera_com, filhas))
+assert paralelo == serial                      # mesmo resultado por semente
+assert serial[0] != serial[1]                  # fluxos distintos
+assert np.array_equal(np.random.get_state()[1], estado_global)
+_, _, p_a = ger.gera_Tabuleiro2(densidade=0.6, lin=15, col=15, seed=9)
+_, _, p_b = ger.gera_Tabuleiro2(densidade=0.6, lin=15, col=15, rng=9)
+assert p_a == p_b                              # inteiro equivale a seed
+print("   4 threads reproduzem o serial sem tocar no estado global")
+
+print("15) Forma compacta do Tabuleiro: pickle e to_bytes/from_bytes")
+import copy
+import pickle
+def mesmo_estado(a, b):
+    return (a == b and np.array_equal(a.visitado, b.visitado)
+            and np.array_equal(a.ordem, b.ordem)
+            and np.array_equal(a.dicas, b.dicas)
+            and np.array_equal(a.dica_vertice, b.dica_vertice)
+            and [v.n for v in a.caminho] == [v.n for v in b.caminho])
+casos = [ger.gera_Tabuleiro2(densidade=0.6, lin=30, col=30, seed=1)[1],
+         ger.gera_Tabuleiro2(densidade=1.0, lin=20, col=20, rng=1)[1],
+         ger.gera_Tabuleiro(densidade=0.4, lin=10, col=10, seed=3,
+                            max_tentativas=30)[1],
+         sl.Tabuleiro(5, 6)]
+for tab_p in casos:
+    assert mesmo_estado(tab_p, pickle.loads(pickle.dumps(tab_p)))
+    assert mesmo_estado(tab_p, sl.Tabuleiro.from_bytes(tab_p.to_bytes()))
+    assert mesmo_estado(tab_p, copy.deepcopy(tab_p))
+tab_r = pickle.loads(pickle.dumps(casos[1]))
+assert tab_r.rng.randint(10**6) == casos[1].rng.randint(10**6)  # mesmo fluxo
+assert tab_r._caminho is None                      # caminho sob demanda
+_, tab_g, _ = ger.gera_Tabuleiro2(densidade=0.6, lin=300, col=300, seed=1)
+t0 = time.perf_counter()
+b_g = pickle.dumps(tab_g)
+tab_r = pickle.loads(b_g)
+t1 = time.perf_counter()
+assert tab_r == tab_g
+print(f"   300x300: {len(b_g)/1024:.0f} KB, ida e volta em {(t1-t0)*1000:.1f} ms")
+
 print("OK - todos os testes passaram")